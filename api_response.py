@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+fetch_video_detail API 响应解析
+从 API 响应（如 wx_response.json）中提取 data.object_desc.media[] 的 decode_key、url、url_token、
+file_size、md5sum、spec 等字段，并据此生成解密任务。
+
+支持单个响应文件、目录，以及多个响应首尾相接的大型 JSON / JSONL 转储（逐个流式解析，不整体读入内存）。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import json
+
+RESPONSE_EXTENSIONS = ('.json', '.jsonl', '.ndjson')
+
+# 单个 JSON 文档的最大长度，超过后视为格式错误而不是继续缓冲
+MAX_DOCUMENT_CHARS = 64 * 1024 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_documents(f):
+    """
+    逐个解析文件中的 JSON 文档（JSONL、格式化后首尾相接的多个 JSON 均可）
+
+    Args:
+        f: 文本文件对象
+
+    Yields:
+        object: 解析出的 JSON 文档
+
+    Raises:
+        ValueError: 文档格式错误或过大
+    """
+    buffer = ''
+    for line in f:
+        stripped = line.strip()
+        if not buffer:
+            if not stripped:
+                continue
+            # 快速路径：一行一个完整文档（JSONL）
+            try:
+                yield json.loads(stripped)
+                continue
+            except json.JSONDecodeError:
+                pass
+        buffer += line
+        if len(buffer) > MAX_DOCUMENT_CHARS:
+            raise ValueError(f"JSON 文档超过 {MAX_DOCUMENT_CHARS:,} 字符，可能格式错误")
+        # 只在可能是顶层结束的位置尝试解析，避免对大文档反复全量解析
+        if not stripped.endswith(('}', ']')) or (line[:1].isspace() and buffer.strip() != stripped):
+            continue
+        while buffer:
+            start = len(buffer) - len(buffer.lstrip())
+            if start == len(buffer):
+                buffer = ''
+                break
+            try:
+                doc, end = _decoder.raw_decode(buffer, start)
+            except json.JSONDecodeError:
+                break  # 文档尚未结束，继续读取
+            yield doc
+            buffer = buffer[end:]
+    # 文件结束时的残留内容必须是完整文档，否则抛出具体的解析错误
+    while buffer.strip():
+        doc, end = _decoder.raw_decode(buffer, len(buffer) - len(buffer.lstrip()))
+        yield doc
+        buffer = buffer[end:]
+
+
+def _object_desc(doc):
+    """定位 object_desc（兼容 TikHub 包装、原始 data 对象及 object_desc 本身）"""
+    if not isinstance(doc, dict):
+        return None, None
+    data = doc.get('data') if isinstance(doc.get('data'), dict) else doc
+    if isinstance(data.get('object_desc'), dict):
+        return data, data['object_desc']
+    if isinstance(data.get('media'), list):
+        return data, data
+    return None, None
+
+
+def extract_media(doc):
+    """
+    从一个 API 响应中提取媒体信息
+
+    Args:
+        doc: 解析后的 JSON 文档（响应对象或响应列表）
+
+    Returns:
+        list: 每个元素为 dict，包含 feed_id / media_index / decode_key / url / url_token /
+              file_size / md5sum / spec 等字段
+    """
+    if isinstance(doc, list):
+        records = []
+        for item in doc:
+            records.extend(extract_media(item))
+        return records
+
+    data, desc = _object_desc(doc)
+    if desc is None:
+        # 直接给出单个 media 对象
+        if isinstance(doc, dict) and doc.get('decode_key') is not None:
+            return [_media_record({}, {}, doc, 0)]
+        return []
+
+    media = [m for m in desc.get('media') or [] if isinstance(m, dict)]
+    return [_media_record(data, desc, item, index) for index, item in enumerate(media)]
+
+
+def _media_record(data, desc, media, index):
+    return {
+        'feed_id': str(data.get('id') or media.get('feed_id') or ''),
+        'media_index': index,
+        'media_count': len(desc.get('media') or []) or 1,
+        'nickname': data.get('nickname'),
+        'description': desc.get('description'),
+        'decode_key': str(media['decode_key']) if media.get('decode_key') not in (None, '') else None,
+        'url': media.get('url') or None,
+        'url_token': media.get('url_token') or '',
+        'file_size': int(media['file_size']) if media.get('file_size') else None,
+        'md5sum': media.get('md5sum') or None,
+        'spec': media.get('spec') or [],
+        'bitrate': media.get('bitrate'),
+        'width': media.get('width'),
+        'height': media.get('height'),
+        'video_play_len': media.get('video_play_len'),
+    }
+
+
+def iter_response_files(path):
+    """
+    列出响应文件（目录时递归查找 .json / .jsonl / .ndjson）
+
+    Yields:
+        str: 文件路径
+    """
+    if os.path.isdir(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(RESPONSE_EXTENSIONS):
+                    yield os.path.join(dirpath, name)
+    else:
+        yield path
+
+
+def iter_media_records(path):
+    """
+    流式读取一个或多个响应文件中的所有媒体
+
+    Yields:
+        dict: 媒体信息（额外包含 source 字段）；无法解析的文件产出带 error 字段的记录
+    """
+    for filename in iter_response_files(path):
+        try:
+            with open(filename, 'r', encoding='utf-8-sig') as f:
+                for doc in iter_json_documents(f):
+                    for record in extract_media(doc):
+                        record['source'] = filename
+                        yield record
+        except (OSError, ValueError) as e:
+            yield {'source': filename, 'error': f"{os.path.basename(filename)}: {e}"}
+
+
+def first_decode_key(doc):
+    """返回响应中第一个媒体的 decode_key，没有时返回 None"""
+    for record in extract_media(doc):
+        if record['decode_key']:
+            return record['decode_key']
+    return None
+
+
+def media_basename(record):
+    """媒体对应的文件名主干：<feed_id>，同一作品有多个媒体时为 <feed_id>_<序号>"""
+    stem = record.get('feed_id') or record.get('md5sum') or 'media'
+    if record.get('media_count', 1) > 1:
+        stem = f"{stem}_{record['media_index']}"
+    return stem
+
+
+def locate_input(record, input_path=None):
+    """
+    为媒体查找本地的加密视频文件
+
+    查找顺序：input_path 为文件时直接使用；与响应文件同名的 .mp4；
+    input_path（默认为响应文件所在目录）下的 <feed_id>.mp4
+
+    Returns:
+        str: 候选路径（不保证存在）
+    """
+    if input_path and os.path.isfile(input_path):
+        return input_path
+    source = record.get('source')
+    if source and not input_path:
+        sidecar_video = os.path.splitext(source)[0] + '.mp4'
+        if os.path.isfile(sidecar_video):
+            return sidecar_video
+    directory = input_path or (os.path.dirname(source) if source else '.')
+    return os.path.join(directory, media_basename(record) + '.mp4')
+
+
+def build_jobs(path, input_path=None, output_dir=None):
+    """
+    根据响应文件生成解密任务
+
+    Args:
+        path: 响应文件或目录
+        input_path: 加密视频文件（单个媒体时）或所在目录
+        output_dir: 输出目录（默认与输入文件同目录，文件名 <输入>_decrypted.mp4）
+
+    Returns:
+        list: 任务列表（字段见 batch_runner.normalize_job，另含 expected_size / md5sum / url / feed_id /
+              media_index / media_count，以及 spec 等版本信息）
+    """
+    from batch_runner import default_output_path
+
+    jobs = []
+    for record in iter_media_records(path):
+        index = len(jobs) + 1
+        if record.get('error'):
+            jobs.append({'index': index, 'input': record['source'], 'error': record['error']})
+            continue
+        video = locate_input(record, input_path)
+        job = {
+            'index': index,
+            'input': video,
+            'output': default_output_path(video, output_dir),
+            'decode_key': record['decode_key'],
+            'expected_size': record['file_size'],
+            'md5sum': record['md5sum'],
+            'url': record['url'],
+            'url_token': record['url_token'],
+            'feed_id': record['feed_id'],
+            'media_index': record['media_index'],
+            'media_count': record['media_count'],
+            # 供 variant_planner 选择下载版本
+            'spec': record['spec'],
+            'bitrate': record['bitrate'],
+            'width': record['width'],
+            'height': record['height'],
+            'video_play_len': record['video_play_len'],
+        }
+        if not record['decode_key']:
+            job['error'] = f"{os.path.basename(record['source'])}: 响应中缺少 decode_key"
+        jobs.append(job)
+    return jobs
@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+"""
+解密 API 服务（纯 Python）
+与 api-service/server.js 提供相同的 /api/decrypt 和 /api/keystream 接口，但不依赖浏览器：
+密钥流由本地 Isaac64 生成（离线可用），上传的 multipart 数据边接收边写入临时文件，
+只有前 128 KB 在内存中 XOR，其余部分通过 sendfile 直接发回，内存占用与视频大小无关。
+
+    python api_server.py --port 8010
+    curl -F decode_key=2136343393 -F video=@encrypted.mp4 http://localhost:8010/api/decrypt -o out.mp4
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import re
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs
+
+import decrypt_wechat_video_cli as core
+from isaac64 import parse_decode_key, KEYSTREAM_SIZE
+from stream_server import (
+    HTTPError, HTTP_REASONS, MAX_HEADER_BYTES, KEEPALIVE_TIMEOUT,
+    parse_request_head, wants_keep_alive, write_response_head, send_json,
+)
+
+VERSION = '2.0.0'
+DEFAULT_PORT = 8010
+DEFAULT_MAX_UPLOAD = 500 * 1024 * 1024
+# 非文件字段（decode_key 等）与 /api/keystream 的 JSON 请求体上限
+MAX_FIELD_BYTES = 64 * 1024
+MAX_JSON_BYTES = 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+KEYSTREAM_FORMATS = ('hex', 'base64')
+
+DOCS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api-service', 'docs.html')
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET,HEAD,POST,OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Decode-Key',
+    'Access-Control-Expose-Headers': 'Content-Disposition,X-Decrypt-Duration',
+}
+
+ENDPOINTS = ['GET /', 'GET /health', 'POST /api/keystream', 'POST /api/decrypt']
+
+_PARAM_RE = re.compile(r';\s*([\w-]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+
+def _timestamp():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def parse_header_params(value):
+    """
+    解析带参数的请求头（Content-Type / Content-Disposition）
+
+    Returns:
+        tuple: (主值（小写）, 参数 dict（参数名小写）)
+    """
+    main, _, rest = (value or '').partition(';')
+    params = {}
+    for name, raw in _PARAM_RE.findall(';' + rest):
+        raw = raw.strip()
+        if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+            raw = re.sub(r'\\(.)', r'\1', raw[1:-1])
+        params[name.lower()] = raw
+    return main.strip().lower(), params
+
+
+class MultipartReader:
+    """
+    流式 multipart/form-data 解析器
+
+    只在内存中保留一个读取块和分隔符长度的尾部，文件内容按块交给调用方。
+
+    Args:
+        reader: asyncio.StreamReader
+        boundary: Content-Type 中的 boundary
+        length: 请求体长度（Content-Length）
+    """
+
+    def __init__(self, reader, boundary, length):
+        self._reader = reader
+        self._remaining = length
+        self._buf = bytearray()
+        self._delimiter = b'\r\n--' + boundary.encode('latin-1')
+        self._finished = False
+        self._started = False
+
+    @property
+    def finished(self):
+        """是否已读到结束分隔符"""
+        return self._finished
+
+    async def _fill(self):
+        if self._remaining <= 0:
+            raise HTTPError(400, "multipart 请求体不完整")
+        data = await asyncio.wait_for(self._reader.read(min(READ_CHUNK_SIZE, self._remaining)), KEEPALIVE_TIMEOUT)
+        if not data:
+            raise HTTPError(400, "multipart 请求体不完整")
+        self._remaining -= len(data)
+        self._buf += data
+
+    async def _read_until(self, token, limit):
+        while True:
+            index = self._buf.find(token)
+            if index >= 0:
+                data = bytes(self._buf[:index])
+                del self._buf[:index + len(token)]
+                return data
+            if len(self._buf) > limit:
+                raise HTTPError(400, "multipart 分段头过大")
+            await self._fill()
+
+    async def _after_delimiter(self):
+        """分隔符之后：'--' 表示结束，'\\r\\n' 表示下一个分段"""
+        while len(self._buf) < 2:
+            await self._fill()
+        marker = bytes(self._buf[:2])
+        del self._buf[:2]
+        if marker == b'--':
+            self._finished = True
+        elif marker != b'\r\n':
+            raise HTTPError(400, "无效的 multipart 分隔符")
+
+    async def next_part(self):
+        """
+        读取下一个分段的头部
+
+        Returns:
+            dict: 分段头（名称小写），没有更多分段时返回 None
+        """
+        if not self._started:
+            # 第一个分隔符前没有 CRLF，补上后与后续分隔符统一处理
+            self._buf[:0] = b'\r\n'
+            self._started = True
+            await self._read_until(self._delimiter, len(self._delimiter) + 1024)
+            await self._after_delimiter()
+        if self._finished:
+            return None
+        head = await self._read_until(b'\r\n\r\n', MAX_HEADER_BYTES)
+        headers = {}
+        for line in head.decode('utf-8', 'replace').split('\r\n'):
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return headers
+
+    async def iter_data(self):
+        """逐块产出当前分段的内容（直到下一个分隔符）"""
+        keep = len(self._delimiter) - 1
+        while True:
+            index = self._buf.find(self._delimiter)
+            if index >= 0:
+                if index:
+                    yield bytes(self._buf[:index])
+                del self._buf[:index + len(self._delimiter)]
+                await self._after_delimiter()
+                return
+            # 尾部可能是分隔符的前半部分，先保留
+            if len(self._buf) > keep:
+                n = len(self._buf) - keep
+                yield bytes(self._buf[:n])
+                del self._buf[:n]
+            await self._fill()
+
+    async def drain(self):
+        """丢弃结束分隔符之后剩余的请求体"""
+        self._buf.clear()
+        while self._remaining > 0:
+            data = await asyncio.wait_for(self._reader.read(min(READ_CHUNK_SIZE, self._remaining)), KEEPALIVE_TIMEOUT)
+            if not data:
+                raise HTTPError(400, "请求体不完整")
+            self._remaining -= len(data)
+
+
+class DecryptAPIServer:
+    """
+    解密 API 服务
+
+    Args:
+        max_upload: 上传视频的大小上限（字节）
+        tmp_dir: 上传数据的临时目录（默认为系统临时目录）
+        chunk_size: 写入临时文件的块大小
+        verbose: 是否输出访问日志
+    """
+
+    def __init__(self, max_upload=DEFAULT_MAX_UPLOAD, tmp_dir=None, chunk_size=core.DEFAULT_CHUNK_SIZE,
+                 verbose=True):
+        self.max_upload = max_upload
+        self.tmp_dir = tmp_dir
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        self.stats = {'requests': 0, 'active': 0, 'decrypted': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def log(self, message):
+        if self.verbose:
+            print(message, flush=True)
+
+    # ------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------
+
+    async def handle(self, reader, writer):
+        """处理一个连接（HTTP/1.1 keep-alive）"""
+        self.stats['active'] += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send_error(writer, HTTPError(400, "请求头过大"), False)
+                    break
+                keep_alive = await self._handle_request(head, reader, writer)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.stats['active'] -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(self, head, reader, writer):
+        self.stats['requests'] += 1
+        try:
+            method, target, version, headers = parse_request_head(head)
+        except ValueError:
+            await self._send_error(writer, HTTPError(400, "无效的请求"), False)
+            return False
+
+        keep_alive = wants_keep_alive(version, headers)
+        parts = urlsplit(target)
+        path = parts.path.rstrip('/') or '/'
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        # 请求体没有读完时不能继续复用连接
+        request = {'method': method, 'path': path, 'query': query, 'headers': headers, 'body_read': False}
+
+        try:
+            if 'chunked' in headers.get('transfer-encoding', '').lower():
+                raise HTTPError(411, "不支持分块传输编码，请提供 Content-Length")
+            if method == 'OPTIONS':
+                write_response_head(writer, 204, dict(CORS_HEADERS, **{'Content-Length': 0}), keep_alive)
+                await writer.drain()
+                return keep_alive
+            route = self._route(method, path)
+            await route(request, reader, writer, keep_alive)
+        except HTTPError as e:
+            keep_alive = keep_alive and (request['body_read'] or headers.get('content-length', '0').strip() == '0')
+            await self._send_error(writer, e, keep_alive, path, method)
+        except (ConnectionError, asyncio.TimeoutError):
+            return False
+        except Exception as e:
+            await self._send_error(writer, HTTPError(500, f"{type(e).__name__}: {e}"), False, path, method)
+            return False
+        return keep_alive
+
+    def _route(self, method, path):
+        routes = {
+            ('GET', '/'): self._docs,
+            ('GET', '/health'): self._health,
+            ('GET', '/api/info'): self._info,
+            ('POST', '/api/keystream'): self._keystream,
+            ('POST', '/api/decrypt'): self._decrypt,
+        }
+        if method == 'HEAD':
+            method = 'GET'
+        route = routes.get((method, path))
+        if route is None:
+            raise HTTPError(404)
+        return route
+
+    async def _send_error(self, writer, error, keep_alive, path=None, method='GET'):
+        """发送 JSON 错误响应（HEAD 请求只发送响应头）"""
+        if error.status == 404 and not error.message:
+            body = {'error': '接口不存在', 'path': path, 'available': ENDPOINTS}
+        elif error.status == 413:
+            body = {'error': '文件过大', 'limit': f"{self.max_upload // (1024 * 1024)}MB"}
+        else:
+            body = {'error': error.message or HTTP_REASONS.get(error.status, '')}
+        await send_json(writer, error.status, body, keep_alive, method, CORS_HEADERS)
+
+    @staticmethod
+    def _content_length(headers):
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "无效的 Content-Length")
+        if length < 0:
+            raise HTTPError(400, "无效的 Content-Length")
+        return length
+
+    @staticmethod
+    async def _continue(request, writer):
+        """客户端发送了 Expect: 100-continue 时先确认（curl 上传大文件时会等待）"""
+        if request['headers'].get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+
+    # ------------------------------------------------------------
+    # 接口
+    # ------------------------------------------------------------
+
+    async def _docs(self, request, reader, writer, keep_alive):
+        if not os.path.isfile(DOCS_FILE):
+            return await self._info(request, reader, writer, keep_alive)
+        with open(DOCS_FILE, 'rb') as f:
+            body = f.read()
+        write_response_head(writer, 200, dict(CORS_HEADERS, **{
+            'Content-Type': 'text/html; charset=utf-8', 'Content-Length': len(body)}), keep_alive)
+        if request['method'] != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+
+    async def _health(self, request, reader, writer, keep_alive):
+        await send_json(writer, 200, {
+            'status': 'ok',
+            'service': 'wechat-decrypt-api',
+            'version': VERSION,
+            'engine': 'python',
+            'xor_backend': core.get_xor_backend(),
+            'stats': dict(self.stats),
+            'timestamp': _timestamp(),
+        }, keep_alive, request['method'], CORS_HEADERS)
+
+    async def _info(self, request, reader, writer, keep_alive):
+        await send_json(writer, 200, {
+            'service': 'WeChat Channels Video Decryption API',
+            'version': VERSION,
+            'engine': 'Python + Isaac64',
+            'author': 'Evil0ctal',
+            'github': 'https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption',
+            'endpoints': {
+                'health': 'GET /health',
+                'decrypt': 'POST /api/decrypt',
+                'keystream': 'POST /api/keystream',
+            },
+        }, keep_alive, request['method'], CORS_HEADERS)
+
+    async def _load_keystream(self, decode_key):
+        """本地生成密钥流（命中磁盘缓存时直接读取）"""
+        try:
+            parse_decode_key(decode_key)
+        except ValueError as e:
+            raise HTTPError(400, f"无效的 decode_key: {e}")
+        loop = asyncio.get_running_loop()
+        keystream = await loop.run_in_executor(None, core.read_keystream_from_decode_key, str(decode_key), False)
+        if not keystream:
+            raise HTTPError(500, "密钥流生成失败")
+        return keystream
+
+    async def _keystream(self, request, reader, writer, keep_alive):
+        length = self._content_length(request['headers'])
+        if length > MAX_JSON_BYTES:
+            raise HTTPError(413, "请求体过大")
+        await self._continue(request, writer)
+        body = await asyncio.wait_for(reader.readexactly(length), KEEPALIVE_TIMEOUT) if length else b''
+        request['body_read'] = True
+
+        try:
+            params = json.loads(body) if body.strip() else {}
+        except ValueError:
+            raise HTTPError(400, "无效的 JSON 请求体")
+        if not isinstance(params, dict):
+            raise HTTPError(400, "无效的 JSON 请求体")
+
+        decode_key = params.get('decode_key')
+        fmt = params.get('format', 'hex')
+        if not decode_key:
+            raise HTTPError(400, "缺少 decode_key 参数")
+        if fmt not in KEYSTREAM_FORMATS:
+            await send_json(writer, 400, {'error': '无效的 format 参数', 'valid_formats': list(KEYSTREAM_FORMATS)},
+                            keep_alive, headers=CORS_HEADERS)
+            return
+
+        start = time.perf_counter()
+        keystream = await self._load_keystream(decode_key)
+        duration = int((time.perf_counter() - start) * 1000)
+        encoded = keystream.hex() if fmt == 'hex' else base64.b64encode(keystream).decode('ascii')
+        self.log(f"🔑 /api/keystream decode_key={decode_key} format={fmt} {duration}ms")
+        await send_json(writer, 200, {
+            'decode_key': decode_key,
+            'keystream': encoded,
+            'format': fmt,
+            'size': KEYSTREAM_SIZE,
+            'duration_ms': duration,
+            'timestamp': _timestamp(),
+        }, keep_alive, headers=CORS_HEADERS)
+
+    async def _decrypt(self, request, reader, writer, keep_alive):
+        headers = request['headers']
+        ctype, params = parse_header_params(headers.get('content-type'))
+        if ctype != 'multipart/form-data' or not params.get('boundary'):
+            raise HTTPError(400, "请求必须是 multipart/form-data")
+        if 'content-length' not in headers:
+            raise HTTPError(411, "缺少 Content-Length")
+        length = self._content_length(headers)
+        if length > self.max_upload + MAX_JSON_BYTES:
+            raise HTTPError(413)
+        await self._continue(request, writer)
+
+        start = time.perf_counter()
+        with tempfile.TemporaryFile(prefix='wx-upload-', dir=self.tmp_dir) as spool:
+            fields, upload = await self._receive(MultipartReader(reader, params['boundary'], length), spool)
+            request['body_read'] = True
+            self.stats['bytes_in'] += length
+
+            # decode_key 也可以放在查询参数或 X-Decode-Key 请求头中（分段顺序不限）
+            decode_key = fields.get('decode_key') or request['query'].get('decode_key') or headers.get('x-decode-key')
+            if not decode_key:
+                raise HTTPError(400, "缺少 decode_key 参数")
+            if upload is None:
+                raise HTTPError(400, "缺少视频文件")
+
+            keystream = await self._load_keystream(decode_key)
+            loop = asyncio.get_running_loop()
+            size = upload['size']
+            head = await loop.run_in_executor(None, self._read_head, spool, keystream, size)
+            if head[4:8] != b'ftyp':
+                raise HTTPError(500, "解密失败：未找到 MP4 ftyp 签名，请检查 decode_key")
+
+            duration = int((time.perf_counter() - start) * 1000)
+            write_response_head(writer, 200, dict(CORS_HEADERS, **{
+                'Content-Type': 'video/mp4',
+                'Content-Length': size,
+                'Content-Disposition': f'attachment; filename="decrypted_{int(time.time() * 1000)}.mp4"',
+                'X-Decrypt-Duration': duration,
+            }), keep_alive)
+            writer.write(head)
+            if size > len(head):
+                await writer.drain()
+                # 未加密的尾部从临时文件直接发送（不支持 sendfile 时 asyncio 会自动回退为读写）
+                await loop.sendfile(writer.transport, spool, len(head), size - len(head))
+            await writer.drain()
+
+        self.stats['decrypted'] += 1
+        self.stats['bytes_out'] += size
+        self.log(f"📹 /api/decrypt {upload['filename'] or '-'} ({size:,} bytes) decode_key={decode_key} "
+                 f"{time.perf_counter() - start:.2f}s")
+
+    async def _receive(self, multipart, spool):
+        """
+        接收 multipart 请求体：普通字段收集到 dict，第一个 video 文件分段写入 spool
+
+        Returns:
+            tuple: (字段 dict, 上传文件信息 dict 或 None)
+        """
+        loop = asyncio.get_running_loop()
+        fields = {}
+        upload = None
+        while True:
+            part = await multipart.next_part()
+            if part is None:
+                break
+            _, disposition = parse_header_params(part.get('content-disposition'))
+            name = disposition.get('name', '')
+
+            if 'filename' not in disposition:
+                value = bytearray()
+                async for chunk in multipart.iter_data():
+                    value += chunk
+                    if len(value) > MAX_FIELD_BYTES:
+                        raise HTTPError(400, f"字段过大: {name}")
+                fields.setdefault(name, value.decode('utf-8', 'replace').strip())
+                continue
+
+            if name != 'video' or upload is not None:
+                async for _ in multipart.iter_data():
+                    pass  # 其他文件分段直接丢弃
+                continue
+
+            upload = {'filename': disposition.get('filename'), 'size': 0}
+            pending = bytearray()
+            async for chunk in multipart.iter_data():
+                upload['size'] += len(chunk)
+                if upload['size'] > self.max_upload:
+                    raise HTTPError(413)
+                pending += chunk
+                if len(pending) >= self.chunk_size:
+                    await loop.run_in_executor(None, spool.write, pending)
+                    pending = bytearray()
+            if pending:
+                await loop.run_in_executor(None, spool.write, pending)
+            await loop.run_in_executor(None, spool.flush)
+
+        await multipart.drain()
+        return fields, upload
+
+    @staticmethod
+    def _read_head(spool, keystream, size):
+        """读取并解密文件头（加密区域）"""
+        spool.seek(0)
+        head = bytearray(spool.read(min(len(keystream), size)))
+        core.xor_inplace(head, memoryview(keystream)[:len(head)])
+        return head
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """启动服务（阻塞直到被取消）"""
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        addresses = ', '.join(f"http://{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+        self.log(f"🚀 解密 API 服务: {addresses}")
+        self.log(f"   POST /api/decrypt    (multipart: video, decode_key)")
+        self.log(f"   POST /api/keystream  (JSON: decode_key, format)")
+        self.log(f"   XOR 后端: {core.get_xor_backend()}，上传上限: {self.max_upload // (1024 * 1024)} MB")
+        async with server:
+            await server.serve_forever()
+
+
+def run_api_server(host='127.0.0.1', port=DEFAULT_PORT, max_upload=DEFAULT_MAX_UPLOAD, tmp_dir=None,
+                   chunk_size=core.DEFAULT_CHUNK_SIZE, verbose=True):
+    """启动解密 API 服务（Ctrl+C 退出）"""
+    server = DecryptAPIServer(max_upload, tmp_dir, chunk_size, verbose)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='微信视频号解密 API 服务（纯 Python，离线可用）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python api_server.py                          # 监听 127.0.0.1:8010
+  python api_server.py --host 0.0.0.0 --port 3000
+  curl -F decode_key=2136343393 -F video=@encrypted.mp4 http://localhost:8010/api/decrypt -o out.mp4
+  curl -H 'Content-Type: application/json' -d '{"decode_key": "2136343393"}' http://localhost:8010/api/keystream
+"""
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', DEFAULT_PORT)),
+                        help=f'监听端口（默认: 环境变量 PORT 或 {DEFAULT_PORT}）')
+    parser.add_argument('--max-upload', type=int, default=DEFAULT_MAX_UPLOAD // (1024 * 1024), metavar='MB',
+                        help='上传视频的大小上限，单位 MB（默认: 500）')
+    parser.add_argument('--tmp-dir', help='上传数据的临时目录（默认: 系统临时目录）')
+    parser.add_argument('--xor-backend', choices=sorted(core.XOR_BACKENDS), help='XOR 后端（默认自动选择）')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不输出访问日志')
+    args = parser.parse_args()
+
+    if args.xor_backend:
+        core.set_xor_backend(args.xor_backend)
+    run_api_server(args.host, args.port, args.max_upload * 1024 * 1024, args.tmp_dir, verbose=not args.quiet)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,657 @@
+#!/usr/bin/env python3
+"""
+批量解密 - 清单驱动
+读取 JSONL / CSV 清单，每行描述一个解密任务（输入、密钥流来源、输出），
+使用进程池或线程池并行执行，最后输出汇总统计（文件/秒、MB/秒、失败列表）
+
+清单字段:
+    input            加密视频文件路径（必填，相对路径以清单所在目录为基准）
+    output           输出文件路径（可选，默认 <输入文件名>_decrypted.mp4）
+    keystream_file   密钥流文件路径（十六进制文本或 .ksb）
+    keystream_hex    十六进制密钥流字符串
+    decode_key       decode_key（使用内置 Isaac64 生成密钥流）
+    in_place         是否原地解密（可选，true/false）
+    expected_size    加密文件的预期大小（可选，不符时直接判为失败，不做任何解密）
+    md5sum / sha256  预期摘要（可选，解密时顺带计算并校验，对象见 digest_source）
+    digest_source    摘要对象：output（默认）/ input / both
+    faststart        是否把 moov 移到 mdat 之前（可选，true/false；不适用于原地解密）
+    feed_id          作品 id（可选，使用输出库 --store 时登记 feed_id → 内容哈希，再次出现时直接链接）
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import decrypt_wechat_video_cli as core
+from keystream_cache import configure_default_cache
+from job_ledger import JobLedger, CLAIMED, SKIP_BUSY
+from metrics import StageMetrics, MetricsRegistry
+from content_store import (
+    get_store, job_names, store_digest_options, STORE_DIGEST, STORE_HIT, STORE_NEW, STORE_DUPLICATE
+)
+
+# run_job 的 skipped 字段：输出库中已有相同内容，直接链接
+SKIP_STORE = 'store'
+
+JOB_FIELDS = ('input', 'output', 'keystream_file', 'keystream_hex', 'decode_key', 'in_place', 'expected_size',
+              'md5sum', 'sha256', 'digest_source', 'faststart', 'feed_id')
+KEYSTREAM_FIELDS = ('keystream_file', 'keystream_hex', 'decode_key')
+DEFAULT_OUTPUT_SUFFIX = '_decrypted'
+
+# 每个工作进程内复用已加载的密钥流（同一清单中经常重复使用同一个 decode_key）
+_KEYSTREAM_MEMO_SIZE = 64
+_keystream_memo = {}
+_keystream_memo_lock = threading.Lock()
+
+
+def _is_true(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def default_output_path(input_path, output_dir=None):
+    """
+    默认输出路径：<输入文件名>_decrypted<扩展名>
+
+    Args:
+        input_path: 输入文件路径
+        output_dir: 输出目录（None 表示与输入文件同目录）
+    """
+    stem, ext = os.path.splitext(os.path.basename(input_path))
+    name = f"{stem}{DEFAULT_OUTPUT_SUFFIX}{ext or '.mp4'}"
+    return os.path.join(output_dir or os.path.dirname(input_path), name)
+
+
+def normalize_job(row, base_dir=None, defaults=None, output_dir=None):
+    """
+    规范化一行清单为任务字典
+
+    Args:
+        row: 原始行（dict）
+        base_dir: 相对路径的基准目录
+        defaults: 未提供密钥流来源时使用的默认值（如命令行的 -k/-H/-d）
+        output_dir: 未提供 output 时的输出目录
+
+    Returns:
+        dict: 任务
+
+    Raises:
+        ValueError: 缺少 input
+    """
+    job = {}
+    for field in JOB_FIELDS:
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            job[field] = value
+
+    if 'input' not in job:
+        raise ValueError("缺少 input 字段")
+
+    if not any(field in job for field in KEYSTREAM_FIELDS) and defaults:
+        for field in KEYSTREAM_FIELDS:
+            if defaults.get(field):
+                job[field] = defaults[field]
+                break
+
+    def resolve(path):
+        return path if base_dir is None or os.path.isabs(path) else os.path.join(base_dir, path)
+
+    job['input'] = resolve(job['input'])
+    if 'keystream_file' in job:
+        job['keystream_file'] = resolve(job['keystream_file'])
+    if 'output' in job:
+        job['output'] = resolve(job['output'])
+    elif not _is_true(job.get('in_place')):
+        job['output'] = default_output_path(job['input'], output_dir)
+    job['in_place'] = _is_true(job.get('in_place'))
+    if 'faststart' in job:
+        job['faststart'] = _is_true(job['faststart'])
+    if 'expected_size' in job:
+        try:
+            job['expected_size'] = int(job['expected_size'])
+        except (TypeError, ValueError):
+            raise ValueError(f"expected_size 不是整数: {job['expected_size']!r}") from None
+    return job
+
+
+def iter_manifest_rows(path):
+    """
+    逐行读取清单（.csv 按 CSV 解析，其余按 JSONL 解析；# 开头的行为注释）
+
+    Yields:
+        tuple: (行号, dict 或解析错误 ValueError)
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            lines = (line for line in f if line.strip() and not line.lstrip().startswith('#'))
+            for lineno, row in enumerate(csv.DictReader(lines), 2):
+                yield lineno, row
+        else:
+            for lineno, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    row = ValueError(f"JSON 解析失败: {e.msg}")
+                else:
+                    if not isinstance(row, dict):
+                        row = ValueError("每行必须是 JSON 对象")
+                yield lineno, row
+
+
+def load_manifest(path, defaults=None, output_dir=None):
+    """
+    读取清单文件
+
+    无法解析的行同样作为任务返回（带 error 字段），执行时直接记为失败。
+
+    Args:
+        path: 清单路径（.jsonl / .csv）
+        defaults: 默认密钥流来源
+        output_dir: 默认输出目录
+
+    Returns:
+        list: 任务列表
+    """
+    jobs = []
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for lineno, row in iter_manifest_rows(path):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            job = normalize_job(row, base_dir, defaults, output_dir)
+        except ValueError as e:
+            job = {'input': f"{os.path.basename(path)}:{lineno}", 'error': f"第 {lineno} 行: {e}"}
+        job['index'] = len(jobs) + 1
+        jobs.append(job)
+    return jobs
+
+
+def _keystream_memo_key(job):
+    if job.get('keystream_file'):
+        return ('file', os.path.abspath(job['keystream_file']))
+    if job.get('keystream_hex'):
+        return ('hex', hashlib.sha1(job['keystream_hex'].encode('utf-8')).hexdigest())
+    if job.get('decode_key') is not None:
+        return ('decode_key', str(job['decode_key']).strip())
+    return None
+
+
+def load_job_keystream(job):
+    """
+    加载任务的密钥流（进程内复用，磁盘缓存由 CLI 读取函数处理）
+
+    Returns:
+        bytes: 密钥流数据，失败返回 None
+    """
+    key = _keystream_memo_key(job)
+    if key is None:
+        return None
+    with _keystream_memo_lock:
+        keystream = _keystream_memo.get(key)
+    if keystream is not None:
+        return keystream
+
+    kind, _ = key
+    if kind == 'file':
+        keystream = core.read_keystream_from_file(job['keystream_file'], verbose=False)
+    elif kind == 'hex':
+        keystream = core.read_keystream_from_string(job['keystream_hex'], verbose=False)
+    else:
+        keystream = core.read_keystream_from_decode_key(job['decode_key'], verbose=False)
+
+    if keystream:
+        with _keystream_memo_lock:
+            if len(_keystream_memo) >= _KEYSTREAM_MEMO_SIZE:
+                _keystream_memo.pop(next(iter(_keystream_memo)))
+            _keystream_memo[key] = keystream
+    return keystream
+
+
+def _timed_keystream(job, stages, result):
+    """加载任务的密钥流并计入 keystream 阶段"""
+    with stages.measure('keystream') as timing:
+        keystream = load_job_keystream(job)
+        timing['bytes'] = len(keystream) if keystream else 0
+    result['stages'] = stages.to_dict()
+    return keystream
+
+
+def check_expected_size(actual, expected):
+    """
+    检查文件大小是否与 API 给出的 file_size 一致
+
+    Returns:
+        str: 不一致时返回错误说明，一致或未提供时返回 None
+    """
+    if not expected or actual == expected:
+        return None
+    if actual < expected:
+        return f"文件不完整（可能下载中断）: {actual:,} / {expected:,} bytes"
+    return f"文件大小与 file_size 不符: {actual:,} / {expected:,} bytes"
+
+
+def job_digest_options(job):
+    """
+    任务的摘要参数：命令行给出的 hashes / expected 加上清单或 API 响应中的 md5sum / sha256
+
+    API 响应中的 md5sum 未说明是加密文件还是明文的摘要，未指定 digest_source 时两者都计算，任一匹配即通过。
+
+    Returns:
+        dict: hashes / expected / digest_source
+    """
+    expected = dict(job.get('expected') or {})
+    for name in ('md5', 'sha256'):
+        value = job.get('md5sum' if name == 'md5' else name)
+        if value:
+            expected.setdefault(name, str(value).strip().lower())
+    source = job.get('digest_source')
+    if not source:
+        source = 'both' if job.get('md5sum') and job.get('feed_id') else 'output'
+    return {'hashes': job.get('hashes') or (), 'expected': expected, 'digest_source': source}
+
+
+def run_job(job, chunk_size=core.DEFAULT_CHUNK_SIZE, ledger=None, store=None, store_link='hardlink'):
+    """
+    执行单个解密任务（可在工作进程中调用）
+
+    Args:
+        job: 任务
+        chunk_size: 复制未加密部分时的块大小
+        ledger: 任务账本路径（可选）。已完成且输入未变化的任务直接跳过，
+                其他进程正在处理的任务也会跳过；输出在重命名前刷新到磁盘
+        store: 内容寻址输出库目录（可选，见 content_store.py）。feed_id / md5sum 已登记的任务直接链接，
+               其他任务解密后按明文 SHA-256 去重
+        store_link: 输出库的链接方式（hardlink / reflink / copy）
+
+    Returns:
+        dict: index / input / output / ok / bytes / seconds / error / digests / verified / skipped /
+              stages（各阶段耗时与字节数，见 metrics.StageMetrics.to_dict）/
+              store（使用输出库时为 hash / status / link）
+    """
+    start = time.perf_counter()
+    result = new_result(job)
+    book = None
+    try:
+        proceed, book, content = begin_job(job, result, ledger, store, store_link)
+        if proceed:
+            _execute_job(job, result, chunk_size, fsync=book is not None, store=content)
+    except Exception as e:
+        result['ok'] = False
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        finish_job(job, result, book, start)
+    return result
+
+
+def new_result(job):
+    """任务结果的初始值（字段见 run_job）"""
+    return {
+        'index': job.get('index'),
+        'input': job['input'],
+        'output': job.get('output') or job['input'],
+        'ok': False,
+        'bytes': 0,
+        'seconds': 0.0,
+        'error': None,
+        'digests': None,
+        'verified': None,
+        'skipped': None,
+        'stages': None,
+        'store': None,
+    }
+
+
+def begin_job(job, result, ledger=None, store=None, store_link='hardlink'):
+    """
+    解密前的检查：任务本身的错误、账本认领、输出库查找
+
+    Returns:
+        tuple: (是否需要继续解密, 认领成功时的账本或 None, 输出库或 None)；
+               不需要继续时结果已写入 result，认领成功的账本仍需交给 finish_job
+    """
+    if job.get('error'):
+        result['error'] = job['error']
+        return False, None, None
+    book = None
+    if ledger:
+        state, row = get_ledger(ledger).claim(job)
+        if state == SKIP_BUSY:
+            # 其他进程、主机或线程正在处理：本次没有完成，单独计数，不算作成功
+            result.update(skipped=state, error="其他进程或线程正在处理（租约未过期）")
+            return False, None, None
+        if state != CLAIMED:
+            result.update(ok=True, skipped=state)
+            return False, None, None
+        book = get_ledger(ledger)
+    content = None
+    try:
+        content = get_store(store, store_link) if store else None
+        if content is not None and not job.get('in_place') and link_from_store(job, result, content):
+            return False, book, content
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        return False, book, content
+    return True, book, content
+
+
+def finish_job(job, result, book, start):
+    """记录账本结果与总耗时"""
+    if book is not None:
+        try:
+            book.complete(job, result['ok'], result['error'])
+        except Exception as e:
+            result.update(ok=False, error=f"无法写入任务账本: {type(e).__name__}: {e}")
+    result['seconds'] = time.perf_counter() - start
+
+
+def link_from_store(job, result, store):
+    """解密前查找输出库：命中时把已有内容链接到输出路径，返回 True"""
+    digest = store.lookup(job)
+    if digest is None:
+        return False
+    method = store.materialize(digest, job['output'])
+    store.record(job_names(job, include_md5=False), digest)
+    result.update(ok=True, skipped=SKIP_STORE, bytes=os.path.getsize(job['output']),
+                  store={'hash': digest, 'status': STORE_HIT, 'link': method})
+    return True
+
+
+def ingest_output(job, result, store, outcome):
+    """解密成功后把输出登记到输出库（内容已存在时输出被替换为链接）"""
+    digest = (outcome.digests.get('output') or {}).get(STORE_DIGEST)
+    if not digest:
+        return
+    status, method = store.ingest(result['output'], digest, job, verified=outcome.verified)
+    result['store'] = {'hash': digest, 'status': status, 'link': method}
+
+
+def _execute_job(job, result, chunk_size, fsync=False, store=None):
+    """执行解密并把结果写入 result"""
+    if job.get('download'):
+        return _run_download_job(job, result, chunk_size, fsync, store)
+    if not check_input(job, result):
+        return result
+
+    stages = StageMetrics()
+    keystream = _timed_keystream(job, stages, result)
+    if not keystream:
+        result['error'] = "无法读取密钥流"
+        return result
+    return decrypt_job(job, keystream, result, stages, chunk_size, fsync, store)
+
+
+def check_input(job, result):
+    """检查本地输入文件是否存在、大小是否与 expected_size 相符，不符时写入 result['error'] 并返回 False"""
+    if not os.path.isfile(job['input']):
+        result['error'] = "输入文件不存在"
+        return False
+    result['bytes'] = os.path.getsize(job['input'])
+    size_error = check_expected_size(result['bytes'], job.get('expected_size'))
+    if size_error:
+        result['error'] = size_error
+        return False
+    return True
+
+
+def decrypt_job(job, keystream, result, stages, chunk_size=core.DEFAULT_CHUNK_SIZE, fsync=False, store=None):
+    """
+    用已加载的密钥流解密本地文件并把结果写入 result（使用输出库时登记输出）
+
+    Args:
+        stages: 记录各阶段耗时的 StageMetrics
+    """
+    if job.get('output'):
+        os.makedirs(os.path.dirname(os.path.abspath(job['output'])), exist_ok=True)
+
+    digest = job_digest_options(job)
+    if store is not None:
+        digest = store_digest_options(digest)
+    if job.get('in_place'):
+        outcome = core.decrypt_video_inplace(job['input'], keystream, rename_to=job.get('output'),
+                                             verbose=False, chunk_size=chunk_size, metrics=stages, **digest)
+    else:
+        outcome = core.decrypt_video(job['input'], keystream, job['output'], verbose=False,
+                                     chunk_size=chunk_size, fsync=fsync, faststart=bool(job.get('faststart')),
+                                     metrics=stages, **digest)
+    result['stages'] = stages.to_dict()
+
+    result['ok'] = bool(outcome)
+    result['digests'] = outcome.digests or None
+    result['verified'] = outcome.verified
+    if not outcome:
+        result['error'] = outcome.error
+    elif store is not None:
+        ingest_output(job, result, store, outcome)
+    return result
+
+
+def _run_download_job(job, result, chunk_size, fsync=False, store=None):
+    """边下载边解密的任务（来自 API 响应中的 url）"""
+    from stream_download import download_and_decrypt
+
+    keystream = _timed_keystream(job, StageMetrics(), result)
+    if not keystream:
+        result['error'] = "无法读取密钥流"
+        return result
+    os.makedirs(os.path.dirname(os.path.abspath(job['output'])), exist_ok=True)
+    digest = job_digest_options(job)
+    if store is not None:
+        digest = store_digest_options(digest)
+    outcome = download_and_decrypt(
+        job['url'], keystream, job['output'], url_token=job.get('url_token') or '', verbose=False,
+        chunk_size=chunk_size, expected_size=job.get('expected_size'), fsync=fsync, **digest
+    )
+    result.update(ok=bool(outcome), bytes=outcome.bytes, digests=outcome.digests or None,
+                  verified=outcome.verified, error=None if outcome else outcome.error)
+    if outcome and store is not None:
+        ingest_output(job, result, store, outcome)
+    return result
+
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(path):
+    """返回本进程内 path 对应的任务账本（首次使用时创建表）"""
+    with _ledgers_lock:
+        if path not in _ledgers:
+            _ledgers[path] = JobLedger(path)
+        return _ledgers[path]
+
+
+def _init_worker(options):
+    """工作进程初始化：同步主进程的 XOR 后端与缓存配置"""
+    if options.get('xor_backend'):
+        core.set_xor_backend(options['xor_backend'])
+    cache = options.get('cache')
+    if cache is not None:
+        configure_default_cache(cache.get('directory'), cache.get('max_bytes'), cache.get('enabled', True))
+
+
+def run_batch(jobs, workers=None, executor='process', verbose=True, chunk_size=core.DEFAULT_CHUNK_SIZE,
+              worker_options=None, on_result=None, ledger=None, store=None, store_link='hardlink',
+              stage_workers=None, stage_queue=None):
+    """
+    并行执行批量任务
+
+    Args:
+        jobs: 任务列表（见 normalize_job）
+        workers: 并发数（默认 CPU 核数；流水线执行器中为下载阶段的默认并发数）
+        executor: 'process'（进程池）、'thread'（线程池）或 'pipeline'（三段流水线，见 pipeline.py）
+        verbose: 是否逐个输出任务结果
+        chunk_size: 复制未加密部分时的块大小
+        worker_options: 传给工作进程的配置（xor_backend / cache）
+        on_result: 每完成一个任务时的回调 on_result(result)
+        ledger: 任务账本路径（可选，见 run_job）
+        store / store_link: 内容寻址输出库目录与链接方式（可选，见 run_job）
+        stage_workers / stage_queue: 流水线执行器各阶段 (keystream, fetch, decrypt) 的并发数与队列容量
+
+    Returns:
+        dict: 汇总统计（流水线执行器另含 pipeline：各阶段利用率，见 pipeline.StageStats.to_dict）
+    """
+    options = worker_options or {}
+    pipeline = None
+    if executor == 'pipeline':
+        from pipeline import PipelineExecutor, default_stage_workers
+
+        _init_worker(options)
+        pipeline = PipelineExecutor(stage_workers or default_stage_workers(workers), stage_queue,
+                                    chunk_size=chunk_size, ledger=ledger, store=store, store_link=store_link)
+        workers = sum(pipeline.workers)
+        completed = pipeline.run(jobs)
+    else:
+        workers = max(1, workers or os.cpu_count() or 1)
+        completed = _run_pool(jobs, workers, executor, options, chunk_size, ledger, store, store_link)
+
+    results = []
+    start = time.perf_counter()
+    for result in completed:
+        results.append(result)
+        if verbose:
+            _print_result(result, len(results), len(jobs))
+        if on_result:
+            on_result(result)
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda r: r['index'] or 0)
+    summary = summarize(results, elapsed, workers)
+    if pipeline is not None:
+        summary['pipeline'] = pipeline.stage_stats(elapsed)
+    return summary
+
+
+def _run_pool(jobs, workers, executor, options, chunk_size, ledger, store, store_link):
+    """在进程池或线程池中执行任务，按完成顺序产出结果"""
+    if executor == 'process':
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,))
+    else:
+        _init_worker(options)
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+    with pool:
+        futures = {pool.submit(run_job, job, chunk_size, ledger, store, store_link): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {
+                    'index': job.get('index'), 'input': job['input'], 'output': job.get('output'),
+                    'ok': False, 'bytes': 0, 'seconds': 0.0, 'error': f"{type(e).__name__}: {e}",
+                }
+
+
+def summarize(results, elapsed, workers=1):
+    """
+    汇总任务结果
+
+    Returns:
+        dict: total / succeeded / skipped / busy / failed / bytes / elapsed / files_per_sec / mb_per_sec / failures /
+              results / metrics（各阶段耗时直方图，MetricsRegistry）/ deduplicated / bytes_deduplicated（输出库中已有的内容）；
+              busy 为账本中正由其他进程处理、本次未完成的任务，不计入成功或失败
+    """
+    skipped = [r for r in results if r['ok'] and r.get('skipped')]
+    busy = [r for r in results if r.get('skipped') == SKIP_BUSY]
+    succeeded = [r for r in results if r['ok'] and not r.get('skipped')]
+    total_bytes = sum(r['bytes'] for r in succeeded)
+    deduplicated = [r for r in results
+                    if r['ok'] and (r.get('store') or {}).get('status') not in (None, STORE_NEW)]
+    metrics = MetricsRegistry()
+    for r in results:
+        if not r.get('skipped'):
+            metrics.observe(r.get('stages'), r['ok'])
+    return {
+        'total': len(results),
+        'succeeded': len(succeeded),
+        'skipped': len(skipped),
+        'busy': len(busy),
+        'failed': len(results) - len(succeeded) - len(skipped) - len(busy),
+        'bytes': total_bytes,
+        'elapsed': elapsed,
+        'workers': workers,
+        'files_per_sec': len(succeeded) / elapsed if elapsed > 0 else 0.0,
+        'mb_per_sec': total_bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0.0,
+        'failures': [r for r in results if not r['ok'] and r.get('skipped') != SKIP_BUSY],
+        'results': results,
+        'metrics': metrics,
+        'deduplicated': len(deduplicated),
+        'bytes_deduplicated': sum(r['bytes'] for r in deduplicated),
+    }
+
+
+def _print_result(result, done, total):
+    size_mb = result['bytes'] / 1024 / 1024
+    if result.get('skipped'):
+        if result['skipped'] == SKIP_STORE:
+            print(f"   ♻️  [{done}/{total}] {result['input']} → {result['output']}: 输出库中已有相同内容"
+                  f"（{result['store']['link']}）")
+            return
+        if result['skipped'] == SKIP_BUSY:
+            print(f"   ⏳ [{done}/{total}] {result['input']}: 其他进程或线程正在处理，本次未处理")
+            return
+        print(f"   ⏭️  [{done}/{total}] {result['input']}: 跳过（已完成）")
+    elif result['ok']:
+        duplicate = ''
+        if (result.get('store') or {}).get('status') == STORE_DUPLICATE:
+            duplicate = '，内容已存在，输出已替换为链接'
+        print(f"   ✅ [{done}/{total}] {result['input']} → {result['output']} "
+              f"({size_mb:.2f} MB, {result['seconds'] * 1000:.1f} ms{duplicate})")
+    else:
+        print(f"   ❌ [{done}/{total}] {result['input']}: {result['error']}")
+
+
+def print_summary(summary):
+    """打印汇总统计"""
+    print()
+    print("=" * 70)
+    print("📊 批量解密汇总")
+    print("=" * 70)
+    print(f"   任务总数: {summary['total']}  (并发: {summary['workers']})")
+    print(f"   ✅ 成功: {summary['succeeded']}")
+    if summary.get('skipped'):
+        print(f"   ⏭️  跳过: {summary['skipped']}（账本中已完成或输出库中已有）")
+    if summary.get('busy'):
+        print(f"   ⏳ 进行中: {summary['busy']}（正由其他进程或线程处理，本次未完成）")
+    if summary.get('deduplicated'):
+        print(f"   ♻️  去重: {summary['deduplicated']}（节省 {summary['bytes_deduplicated'] / 1024 / 1024:.2f} MB）")
+    print(f"   ❌ 失败: {summary['failed']}")
+    print(f"   📦 数据量: {summary['bytes']:,} bytes ({summary['bytes'] / 1024 / 1024:.2f} MB)")
+    print(f"   ⏱️  总耗时: {summary['elapsed']:.2f} s")
+    print(f"   ⚡ 吞吐: {summary['files_per_sec']:.2f} 文件/秒, {summary['mb_per_sec']:.2f} MB/秒")
+    if summary.get('metrics'):
+        print_stage_totals(summary['metrics'])
+    if summary.get('pipeline'):
+        from pipeline import print_pipeline_stats
+        print_pipeline_stats(summary['pipeline'])
+    if summary['failures']:
+        print()
+        print("失败列表:")
+        for r in summary['failures']:
+            print(f"   [{r['index']}] {r['input']}: {r['error']}")
+    print()
+
+
+def print_stage_totals(metrics):
+    """打印各阶段累计耗时及占比（用于判断瓶颈在磁盘、CPU 还是密钥流生成）"""
+    stages = metrics.to_dict()['stages']
+    total = sum(values['seconds'] for values in stages.values())
+    if not total:
+        return
+    print("   ⏱️  各阶段累计耗时:")
+    for stage, values in stages.items():
+        speed = f", {values['mb_per_sec']:.1f} MB/秒" if values['mb_per_sec'] else ''
+        print(f"      {stage:<9} {values['seconds']:9.3f} s ({values['seconds'] / total:5.1%}, "
+              f"平均 {values['mean_seconds'] * 1000:.2f} ms{speed})")
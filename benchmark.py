@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+性能基准测试
+生成带随机密钥流的合成加密 MP4（1 MB 到数 GB），分别测量各阶段的耗时、吞吐量与峰值内存：
+
+    keystream   Isaac64 生成、十六进制文本 / .ksb 文件 / 十六进制字符串解析
+    xor         各 XOR 后端处理 128 KB 文件头
+    decrypt     decrypt_video 端到端（各尾部复制方式）、decrypt_video_inplace
+    import      CLI 模块与 GUI 模块的冷启动导入时间
+
+每个测试在独立的子进程中运行，峰值 RSS 互不影响。结果输出为 JSON，可在不同提交、不同主机之间比较：
+
+    python benchmark.py --sizes 1M,64M,1G -o before.json
+    python benchmark.py --sizes 1M,64M,1G -o after.json
+    python benchmark.py --compare before.json after.json
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import struct
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录峰值内存
+    resource = None
+
+SCHEMA_VERSION = 1
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = '1M,16M,256M'
+DEFAULT_REPEAT = 3
+KEYSTREAM_SIZE = 131072
+# 生成 mdat 负载时重复使用的随机块（避免为数 GB 的文件调用 os.urandom）
+_FILL_BLOCK_SIZE = 4 * 1024 * 1024
+_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(text):
+    """'64M' / '1G' / '1048576' → 字节数"""
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    for unit in ('G', 'M', 'K'):
+        if size >= _UNITS[unit] and size % _UNITS[unit] == 0:
+            return f"{size // _UNITS[unit]}{unit}"
+    return str(size)
+
+
+def peak_rss_kb():
+    """当前进程的峰值 RSS（KB），无法获取时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # macOS 单位为字节
+
+
+# ============================================================
+# 合成数据
+# ============================================================
+
+def _box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def write_synthetic_mp4(path, size, keystream):
+    """
+    写出 size 字节的合成加密 MP4：ftyp + mdat（随机负载）+ moov（结构完整，可通过 box 检查）
+
+    Returns:
+        str: path
+    """
+    ftyp = _box(b'ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2avc1mp41')
+    moov = _box(b'moov', _box(b'mvhd', bytes(100)) + _box(b'trak', _box(b'tkhd', bytes(84))))
+    mdat_size = size - len(ftyp) - len(moov)
+    if mdat_size < 8:
+        raise ValueError(f"文件过小: {size}")
+
+    block = os.urandom(_FILL_BLOCK_SIZE)
+    head = bytearray(ftyp + struct.pack('>I4s', mdat_size, b'mdat'))
+    with open(path, 'wb') as f:
+        remaining = mdat_size - 8
+        # 文件头（前 len(keystream) 字节）需要加密，先在内存中拼好
+        first = min(remaining, max(len(keystream) - len(head), 0))
+        head += block[:first]
+        remaining -= first
+        n = min(len(keystream), len(head))
+        for i in range(n):
+            head[i] ^= keystream[i]
+        f.write(head)
+        while remaining > 0:
+            chunk = block[:min(len(block), remaining)]
+            f.write(chunk)
+            remaining -= len(chunk)
+        tail = moov
+        if len(head) >= len(keystream):
+            f.write(tail)
+        else:
+            # 文件小于密钥流时 moov 也在加密范围内
+            f.write(bytes(b ^ keystream[len(head) + i] if len(head) + i < len(keystream) else b
+                          for i, b in enumerate(tail)))
+    return path
+
+
+def prepare_inputs(workdir, sizes, seed=None):
+    """
+    生成随机密钥流（十六进制文本、.ksb）与各尺寸的加密文件
+
+    Returns:
+        dict: keystream_hex_file / keystream_ksb_file / videos {size: path}
+    """
+    sys.path.insert(0, REPO_DIR)
+    from keystream_format import write_keystream_binary
+
+    keystream = os.urandom(KEYSTREAM_SIZE) if seed is None else _seeded_bytes(seed, KEYSTREAM_SIZE)
+    hex_file = os.path.join(workdir, 'keystream.txt')
+    with open(hex_file, 'w') as f:
+        f.write(keystream.hex())
+    ksb_file = os.path.join(workdir, 'keystream.ksb')
+    write_keystream_binary(ksb_file, keystream)
+
+    videos = {}
+    for size in sizes:
+        videos[size] = write_synthetic_mp4(os.path.join(workdir, f"input_{format_size(size)}.mp4"), size, keystream)
+    return {'keystream_hex_file': hex_file, 'keystream_ksb_file': ksb_file, 'videos': videos}
+
+
+def _seeded_bytes(seed, n):
+    import random
+    return random.Random(seed).randbytes(n)
+
+
+def _drop_page_cache(path):
+    """尽量把文件移出页缓存，使下一次读取来自磁盘（不支持时忽略）"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+# ============================================================
+# 各阶段（在子进程中执行）
+# ============================================================
+
+def _timed(func, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def _stage_keystream(params):
+    import decrypt_wechat_video_cli as core
+    from isaac64 import generate_keystream
+
+    core.configure_default_cache(enabled=False)
+    name, repeat = params['name'], params['repeat']
+    if name == 'isaac64':
+        runs = _timed(lambda: generate_keystream(2136343393), repeat)
+    elif name == 'hex_file':
+        runs = _timed(lambda: core.read_keystream_from_file(params['path'], verbose=False, use_cache=False), repeat)
+    elif name == 'ksb_file':
+        runs = _timed(lambda: core.read_keystream_from_file(params['path'], verbose=False, use_cache=False), repeat)
+    elif name == 'hex_string':
+        with open(params['path']) as f:
+            text = f.read()
+        runs = _timed(lambda: core.read_keystream_from_string(text, verbose=False), repeat)
+    else:
+        raise ValueError(name)
+    return {'runs': runs, 'bytes': KEYSTREAM_SIZE}
+
+
+def _stage_xor(params):
+    import decrypt_wechat_video_cli as core
+
+    keystream = os.urandom(KEYSTREAM_SIZE)
+    buf = bytearray(os.urandom(KEYSTREAM_SIZE))
+    loops = params['loops']
+
+    def run():
+        for _ in range(loops):
+            core.xor_inplace(buf, keystream, backend=params['name'])
+    return {'runs': _timed(run, params['repeat']), 'bytes': KEYSTREAM_SIZE * loops}
+
+
+def _stage_decrypt(params):
+    import decrypt_wechat_video_cli as core
+
+    keystream = core.read_keystream_from_file(params['keystream_file'], verbose=False, use_cache=False)
+    src, out = params['input'], params['output']
+    runs = []
+    cold = []
+    copy_method = None
+    for _ in range(params['repeat']):
+        if params['name'] == 'inplace':
+            shutil.copyfile(src, out)
+            target = out
+        else:
+            target = src
+        if params['cold']:
+            cold.append(_drop_page_cache(target))
+        start = time.perf_counter()
+        if params['name'] == 'inplace':
+            result = core.decrypt_video_inplace(out, keystream, verbose=False)
+        else:
+            result = core.decrypt_video(src, keystream, out, verbose=False, copy_method=params['copy_method'],
+                                        fsync=params['fsync'])
+        runs.append(time.perf_counter() - start)
+        if not result:
+            raise RuntimeError(f"解密失败: {result.error}")
+        copy_method = result.copy_method
+    os.remove(out)
+    return {'runs': runs, 'bytes': os.path.getsize(src), 'copy_method': copy_method, 'cold': all(cold) if cold else False}
+
+
+_STAGES = {'keystream': _stage_keystream, 'xor': _stage_xor, 'decrypt': _stage_decrypt}
+
+
+def _run_stage(stage, params):
+    """子进程入口：执行一个测试并附上峰值 RSS"""
+    sys.path.insert(0, REPO_DIR)
+    baseline = peak_rss_kb()
+    result = _STAGES[stage](params)
+    result['peak_rss_kb'] = peak_rss_kb()
+    result['baseline_rss_kb'] = baseline
+    return result
+
+
+def run_isolated(stage, params):
+    """在全新的子进程（spawn）中执行测试，峰值 RSS 只反映该测试本身"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_run_stage, stage, params).result()
+
+
+def measure_import(module, repeat, prelude=''):
+    """
+    冷启动导入时间：每次启动新的解释器，只计 import 语句本身
+
+    Returns:
+        dict: runs / error
+    """
+    code = (f"import time\n{prelude}\nstart = time.perf_counter()\nimport {module}\n"
+            f"print(time.perf_counter() - start)")
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {'runs': [], 'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+        runs.append(float(proc.stdout.strip().splitlines()[-1]))
+    return {'runs': runs}
+
+
+# ============================================================
+# 汇总与输出
+# ============================================================
+
+def _summarize(stage, name, outcome, size=None, extra=None):
+    runs = outcome.get('runs') or []
+    entry = {'stage': stage, 'name': name}
+    if size is not None:
+        entry['size'] = size
+    if runs:
+        median = statistics.median(runs)
+        entry.update(seconds=median, min_seconds=min(runs), max_seconds=max(runs), runs=runs)
+        if outcome.get('bytes'):
+            entry['bytes'] = outcome['bytes']
+            entry['mb_per_sec'] = outcome['bytes'] / 1024 / 1024 / median if median > 0 else None
+    for key in ('peak_rss_kb', 'baseline_rss_kb', 'copy_method', 'cold', 'error'):
+        if outcome.get(key) is not None:
+            entry[key] = outcome[key]
+    entry.update(extra or {})
+    return entry
+
+
+def _git_commit():
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True)
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def host_info():
+    return {
+        'hostname': socket.gethostname(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def _print_entry(entry):
+    label = f"{entry['stage']}/{entry['name']}"
+    if 'size' in entry:
+        label += f" [{format_size(entry['size'])}]"
+    if 'error' in entry:
+        print(f"   ⚠️  {label:<36} {entry['error']}", file=sys.stderr)
+        return
+    speed = f"{entry['mb_per_sec']:10.1f} MB/s" if entry.get('mb_per_sec') else ' ' * 15
+    rss = f"{entry['peak_rss_kb'] / 1024:8.1f} MB RSS" if entry.get('peak_rss_kb') else ''
+    print(f"   {label:<36} {entry['seconds'] * 1000:10.2f} ms {speed} {rss}", file=sys.stderr)
+
+
+def run_benchmarks(sizes, repeat=DEFAULT_REPEAT, workdir=None, keep=False, cold=False, fsync=False,
+                   stages=('import', 'keystream', 'xor', 'decrypt'), seed=None):
+    """
+    执行基准测试
+
+    Args:
+        sizes: 合成文件大小列表（字节）
+        repeat: 每项重复次数（取中位数）
+        workdir: 合成文件目录（默认为临时目录，结束后删除）
+        keep: 保留合成文件
+        cold: 每次解密前尝试把输入移出页缓存
+        fsync: 解密时在重命名前 fsync
+        stages: 要执行的阶段
+        seed: 随机种子（固定后密钥流可复现）
+
+    Returns:
+        dict: JSON 报告
+    """
+    sys.path.insert(0, REPO_DIR)
+    import decrypt_wechat_video_cli as core
+
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='wx-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    generate_seconds = None
+    started = time.perf_counter()
+
+    def record(entry):
+        results.append(entry)
+        _print_entry(entry)
+
+    try:
+        if 'import' in stages:
+            print("⏱️  冷启动导入", file=sys.stderr)
+            record(_summarize('import', 'cli', measure_import('decrypt_wechat_video_cli', repeat)))
+            record(_summarize('import', 'gui', measure_import('decrypt_wechat_video_gui', repeat)))
+            # GUI 启动时 tkinter 已加载，单独计 GUI 对 CLI 模块的导入
+            record(_summarize('import', 'cli_from_gui', measure_import(
+                'decrypt_wechat_video_cli', repeat, prelude='import tkinter, tkinter.ttk')))
+
+        print("🧪 生成合成数据...", file=sys.stderr)
+        gen_start = time.perf_counter()
+        inputs = prepare_inputs(workdir, sizes if 'decrypt' in stages else [], seed)
+        generate_seconds = time.perf_counter() - gen_start
+
+        if 'keystream' in stages:
+            print("🔑 密钥流", file=sys.stderr)
+            for name, path in (('isaac64', None), ('hex_file', inputs['keystream_hex_file']),
+                               ('ksb_file', inputs['keystream_ksb_file']),
+                               ('hex_string', inputs['keystream_hex_file'])):
+                outcome = run_isolated('keystream', {'name': name, 'path': path, 'repeat': repeat})
+                record(_summarize('keystream', name, outcome))
+
+        if 'xor' in stages:
+            print("⊕  XOR 后端", file=sys.stderr)
+            for backend in sorted(core.XOR_BACKENDS):
+                outcome = run_isolated('xor', {'name': backend, 'loops': 64, 'repeat': repeat})
+                record(_summarize('xor', backend, outcome))
+
+        if 'decrypt' in stages:
+            print("🔓 端到端解密", file=sys.stderr)
+            methods = ['auto', 'read'] + [m for m in ('copy_file_range', 'sendfile') if hasattr(os, m)]
+            for size, path in inputs['videos'].items():
+                for name in list(dict.fromkeys(methods)) + ['inplace']:
+                    params = {
+                        'name': name, 'input': path, 'output': os.path.join(workdir, 'output.mp4'),
+                        'keystream_file': inputs['keystream_ksb_file'], 'repeat': repeat, 'cold': cold,
+                        'fsync': fsync, 'copy_method': name,
+                    }
+                    try:
+                        outcome = run_isolated('decrypt', params)
+                    except Exception as e:
+                        outcome = {'error': f"{type(e).__name__}: {e}"}
+                    record(_summarize('decrypt', name, outcome, size=size))
+    finally:
+        if own_dir and not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    total_peak = None
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if sys.platform == 'darwin':
+            children //= 1024
+        total_peak = max(peak_rss_kb() or 0, children)
+
+    return {
+        'schema': SCHEMA_VERSION,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'host': host_info(),
+        'config': {
+            'sizes': sizes, 'repeat': repeat, 'cold': cold, 'fsync': fsync, 'stages': list(stages),
+            'xor_backend': core.get_xor_backend(), 'workdir': workdir if keep or not own_dir else None,
+        },
+        'results': results,
+        'total': {
+            'seconds': time.perf_counter() - started,
+            'generate_seconds': generate_seconds,
+            'peak_rss_kb': total_peak,
+        },
+    }
+
+
+def _result_key(entry):
+    return entry['stage'], entry['name'], entry.get('size')
+
+
+def compare_reports(base, new):
+    """
+    比较两份报告（按 stage/name/size 对齐）
+
+    Returns:
+        list: [(标签, 基准秒数, 新秒数, 比值)]，比值 < 1 表示变快
+    """
+    baseline = {_result_key(e): e for e in base['results'] if 'seconds' in e}
+    rows = []
+    for entry in new['results']:
+        old = baseline.get(_result_key(entry))
+        if old is None or 'seconds' not in entry:
+            continue
+        label = f"{entry['stage']}/{entry['name']}"
+        if entry.get('size') is not None:
+            label += f" [{format_size(entry['size'])}]"
+        ratio = entry['seconds'] / old['seconds'] if old['seconds'] > 0 else None
+        rows.append((label, old['seconds'], entry['seconds'], ratio))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='微信视频号解密工具 - 性能基准测试（结果输出为 JSON）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  python benchmark.py                                 # 默认 1M,16M,256M，输出到标准输出
+  python benchmark.py --sizes 1M,1G,4G -o bench.json  # 大文件（需要足够的磁盘空间）
+  python benchmark.py --stages keystream,xor          # 只测密钥流与 XOR
+  python benchmark.py --cold --fsync                  # 每次解密前移出页缓存，并在重命名前 fsync
+  python benchmark.py --compare before.json after.json
+"""
+    )
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'合成文件大小，逗号分隔（默认: {DEFAULT_SIZES}）')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help=f'每项重复次数，取中位数（默认: {DEFAULT_REPEAT}）')
+    parser.add_argument('--stages', default='import,keystream,xor,decrypt',
+                        help='要执行的阶段（默认: import,keystream,xor,decrypt）')
+    parser.add_argument('--workdir', help='合成文件目录（默认: 临时目录，结束后删除）')
+    parser.add_argument('--keep', action='store_true', help='保留合成文件')
+    parser.add_argument('--cold', action='store_true', help='每次解密前尝试把输入文件移出页缓存（posix_fadvise）')
+    parser.add_argument('--fsync', action='store_true', help='解密时在重命名前 fsync 输出')
+    parser.add_argument('--seed', type=int, help='随机种子（固定密钥流）')
+    parser.add_argument('-o', '--output', help='JSON 报告输出路径（默认: 标准输出）')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='比较两份 JSON 报告')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            new = json.load(f)
+        print(f"基准: {base.get('commit')} @ {base['host']['hostname']}   新: {new.get('commit')} @ {new['host']['hostname']}")
+        for label, old, cur, ratio in compare_reports(base, new):
+            mark = '🟢' if ratio is not None and ratio < 0.95 else '🔴' if ratio is not None and ratio > 1.05 else '⚪'
+            print(f"{mark} {label:<40} {old * 1000:10.2f} ms → {cur * 1000:10.2f} ms  ×{ratio:.2f}")
+        return 0
+
+    try:
+        sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+    except ValueError:
+        parser.error(f"无效的 --sizes: {args.sizes}")
+    stages = tuple(s.strip() for s in args.stages.split(',') if s.strip())
+    unknown = set(stages) - {'import', 'keystream', 'xor', 'decrypt'}
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(sizes, args.repeat, args.workdir, args.keep, args.cold, args.fsync, stages, args.seed)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"📝 已写出: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    peak = report['total']['peak_rss_kb']
+    print(f"📊 总耗时 {report['total']['seconds']:.2f} s"
+          + (f", 峰值 RSS {peak / 1024:.1f} MB" if peak else ''), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+内容寻址的输出库
+每次调用 fetch_video_detail 都会返回新的 url 和 decode_key，同一个视频因此会被反复下载、解密。
+输出库按解密结果（明文）的 SHA-256 保存每份内容，同一内容只占一份磁盘空间：
+
+    <库目录>/objects/ab/abcdef....mp4   内容对象（文件名为明文 SHA-256）
+    <库目录>/index.db                   名称 → 内容哈希的索引（SQLite）
+
+索引只有一张表，名称为 'feed:<feed_id>'（同一作品有多个媒体时为 'feed:<feed_id>_<序号>'，
+下载的是 spec 中的转码版本时再加上 '@<file_format>'，见 variant_planner.py）
+或 'md5:<API 响应中的 md5sum>'（仅在解密时校验通过后记录）。
+
+    - 解密前：任务的 feed_id 或 md5sum 已在索引中且对象存在时，直接把对象链接到输出路径，不下载也不解密
+    - 解密后：按解密时顺带计算的 SHA-256 查找对象；已存在时把输出替换为指向该对象的链接，否则把输出登记为新对象
+
+链接方式（link_mode）:
+    hardlink    硬链接（默认；不支持时依次退回 reflink、复制）。输出与对象共用同一份数据，不要原地修改输出文件
+    reflink     写时复制克隆（Btrfs / XFS 等，FICLONE），输出与对象互不影响；不支持时退回复制
+    copy        直接复制（库目录与输出不在同一文件系统时的兜底方式）
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import sys
+import time
+import errno
+import shutil
+import argparse
+import threading
+
+from sqlite_connection import connect
+from variant_planner import VARIANT_ORIGINAL
+
+INDEX_NAME = 'index.db'
+OBJECTS_DIR = 'objects'
+OBJECT_SUFFIX = '.mp4'
+LINK_MODES = ('hardlink', 'reflink', 'copy')
+STORE_DIGEST = 'sha256'
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# 库中对象的状态（写入任务结果的 store.status）
+STORE_HIT = 'hit'              # 解密前命中，直接链接
+STORE_NEW = 'new'              # 新内容，输出登记为对象
+STORE_DUPLICATE = 'duplicate'  # 解密后发现内容已存在，输出替换为链接
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (
+    name       TEXT PRIMARY KEY,
+    hash       TEXT NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+_FALLBACKS = {
+    'hardlink': ('hardlink', 'reflink', 'copy'),
+    'reflink': ('reflink', 'copy'),
+    'copy': ('copy',),
+}
+
+
+def reflink(src, dst):
+    """
+    以写时复制方式克隆文件（FICLONE）
+
+    Raises:
+        OSError: 文件系统或平台不支持
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "当前平台不支持 reflink") from None
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+
+def link_file(src, dst, mode='hardlink'):
+    """
+    按 mode 把 src 链接（或复制）为 dst，dst 不能已存在；不支持时按 hardlink → reflink → copy 的顺序退回
+
+    Returns:
+        str: 实际使用的方式
+    """
+    if mode not in _FALLBACKS:
+        raise ValueError(f"未知的链接方式: {mode} (可用: {', '.join(LINK_MODES)})")
+    for method in _FALLBACKS[mode]:
+        try:
+            if method == 'hardlink':
+                os.link(src, dst)
+            elif method == 'reflink':
+                reflink(src, dst)
+            else:
+                shutil.copyfile(src, dst)
+            return method
+        except FileExistsError:
+            raise
+        except OSError:
+            if method == 'copy':
+                raise
+    raise AssertionError("unreachable")
+
+
+def feed_name(feed_id, media_index=None, media_count=None, variant=None):
+    """feed_id 在索引中的名称（同一作品有多个媒体时带序号，与 api_response.media_basename 一致；转码版本带版本名）"""
+    stem = str(feed_id)
+    if media_count and media_count > 1 and media_index is not None:
+        stem = f"{stem}_{media_index}"
+    if variant and variant != VARIANT_ORIGINAL:
+        stem = f"{stem}@{variant}"
+    return f"feed:{stem}"
+
+
+def job_names(job, include_md5=True):
+    """
+    任务在索引中的名称
+
+    Args:
+        job: 任务（feed_id / media_index / media_count / variant / md5sum）
+        include_md5: 是否包含 md5sum（登记时只有校验通过的 md5sum 才可信）
+
+    Returns:
+        list: 名称列表
+    """
+    names = []
+    if job.get('feed_id'):
+        names.append(feed_name(job['feed_id'], job.get('media_index'), job.get('media_count'), job.get('variant')))
+    if job.get('md5sum') and include_md5:
+        names.append(f"md5:{job['md5sum'].lower()}")
+    return names
+
+
+def store_digest_options(digest):
+    """在任务的摘要参数中加入输出库需要的明文 SHA-256（只计算输入时改为两者都计算）"""
+    digest = dict(digest)
+    digest['hashes'] = list(dict.fromkeys(list(digest.get('hashes') or ()) + [STORE_DIGEST]))
+    if digest.get('digest_source') == 'input':
+        digest['digest_source'] = 'both'
+    return digest
+
+
+class ContentStore:
+    """
+    内容寻址的输出库（可在进程池、线程池中直接使用；多个进程同时写入同一内容时只保留一份对象）
+
+    Args:
+        directory: 库目录（应与输出目录位于同一文件系统，否则只能退回复制）
+        link_mode: 链接方式，见 LINK_MODES
+    """
+
+    def __init__(self, directory, link_mode='hardlink'):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"未知的链接方式: {link_mode} (可用: {', '.join(LINK_MODES)})")
+        self.directory = directory
+        self.link_mode = link_mode
+        os.makedirs(os.path.join(directory, OBJECTS_DIR), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def _connect(self):
+        return connect(self.index_path)
+
+    def object_path(self, digest):
+        """内容对象的路径"""
+        return os.path.join(self.directory, OBJECTS_DIR, digest[:2], digest + OBJECT_SUFFIX)
+
+    def has(self, digest):
+        return os.path.isfile(self.object_path(digest))
+
+    def resolve(self, name):
+        """按名称（'feed:...' / 'md5:...'）查找内容哈希，不存在时返回 None"""
+        with self._connect() as conn:
+            row = conn.fetchone("SELECT hash FROM names WHERE name = ?", (name,))
+        return row['hash'] if row else None
+
+    def lookup(self, job):
+        """
+        解密前的查找：任务的 feed_id 或 md5sum 已登记且对象仍然存在时返回内容哈希
+
+        Returns:
+            str: 内容哈希，未命中时返回 None
+        """
+        names = job_names(job)
+        if not names:
+            return None
+        placeholders = ', '.join('?' * len(names))
+        with self._connect() as conn:
+            rows = conn.fetchall(f"SELECT name, hash FROM names WHERE name IN ({placeholders})", names)
+        for row in sorted(rows, key=lambda r: names.index(r['name'])):
+            if self.has(row['hash']):
+                return row['hash']
+        return None
+
+    def materialize(self, digest, output):
+        """
+        把对象链接到输出路径（先链接为临时文件再原子替换，已有的输出会被覆盖）
+
+        Returns:
+            str: 实际使用的链接方式
+        """
+        source = self.object_path(digest)
+        directory = os.path.dirname(os.path.abspath(output))
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(output) and os.path.samefile(source, output):
+            return 'hardlink'
+        tmp_path = f"{output}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            method = link_file(source, tmp_path, self.link_mode)
+            os.replace(tmp_path, output)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return method
+
+    def ingest(self, output, digest, job=None, verified=None):
+        """
+        登记解密结果：内容已存在时把输出替换为指向对象的链接，否则把输出加入库中
+
+        Args:
+            output: 已写好的输出文件
+            digest: 输出的 SHA-256（十六进制）
+            job: 任务（用于登记 feed_id / md5sum）
+            verified: 摘要校验结果（md5sum 只在为 True 时登记）
+
+        Returns:
+            tuple: (STORE_NEW / STORE_DUPLICATE, 实际使用的链接方式)
+        """
+        digest = digest.lower()
+        target = self.object_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        status = STORE_NEW
+        tmp_path = f"{target}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            method = link_file(output, tmp_path, self.link_mode)
+            self._publish(tmp_path, target)
+        except FileExistsError:
+            status = STORE_DUPLICATE
+        finally:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        if status == STORE_DUPLICATE:
+            if os.path.getsize(target) != os.path.getsize(output):
+                raise ValueError(f"内容库中的对象与输出大小不一致: {target}")
+            method = self.materialize(digest, output)
+
+        self.record(job_names(job or {}, include_md5=verified is True), digest)
+        return status, method
+
+    def _publish(self, tmp_path, target):
+        """
+        把临时文件发布为对象，不覆盖已有对象：并发写入同一内容时只有一个进程成功
+
+        hardlink 模式用 os.link（本身不覆盖）；reflink / copy 模式或文件系统不支持硬链接时，
+        在索引的写锁内检查对象不存在后再原子重命名，不依赖硬链接。
+
+        Raises:
+            FileExistsError: 对象已存在
+        """
+        # 与其他进程（包括共享库目录的其他主机）串行化，检查与重命名之间不会有别的写入者
+        with self._connect():
+            if self.link_mode == 'hardlink':
+                try:
+                    os.link(tmp_path, target)
+                    return
+                except FileExistsError:
+                    raise
+                except OSError:
+                    pass  # EPERM / EOPNOTSUPP 等：库目录不支持硬链接，改为重命名
+            if os.path.lexists(target):
+                raise FileExistsError(errno.EEXIST, "对象已存在", target)
+            os.replace(tmp_path, target)
+
+    def record(self, names, digest):
+        """登记名称 → 内容哈希（已有的名称会被更新）"""
+        if not names:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            for name in names:
+                conn.execute(
+                    "INSERT INTO names (name, hash, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET hash = excluded.hash, updated_at = excluded.updated_at",
+                    (name, digest, now)
+                )
+
+    def stats(self):
+        """
+        Returns:
+            dict: objects / bytes / names / linked（对象之外还有其他硬链接的数量）
+        """
+        objects = total = linked = 0
+        root = os.path.join(self.directory, OBJECTS_DIR)
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if not name.endswith(OBJECT_SUFFIX):
+                    continue
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                objects += 1
+                total += st.st_size
+                linked += st.st_nlink > 1
+        with self._connect() as conn:
+            names = conn.fetchone("SELECT COUNT(*) AS n FROM names")['n']
+        return {'objects': objects, 'bytes': total, 'names': names, 'linked': linked}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(directory, link_mode='hardlink'):
+    """返回本进程内 directory 对应的输出库（首次使用时创建目录和索引）"""
+    key = (os.path.abspath(directory), link_mode)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ContentStore(directory, link_mode)
+        return _stores[key]
+
+
+def main():
+    """命令行入口：查看输出库统计，按 feed_id / md5sum 查找内容"""
+    parser = argparse.ArgumentParser(description="微信视频号解密工具 - 内容寻址输出库")
+    parser.add_argument('directory', help='输出库目录（即 --store 的参数）')
+    parser.add_argument('--feed', action='append', default=[], metavar='FEED_ID', help='按 feed_id 查找（可重复）')
+    parser.add_argument('--md5', action='append', default=[], metavar='MD5SUM', help='按 md5sum 查找（可重复）')
+    args = parser.parse_args()
+
+    if not os.path.isfile(os.path.join(args.directory, INDEX_NAME)):
+        print(f"❌ 不是输出库目录（缺少 {INDEX_NAME}）: {args.directory}")
+        return 1
+    store = ContentStore(args.directory)
+    stats = store.stats()
+    print(f"🗄️  输出库: {args.directory}")
+    print(f"   对象: {stats['objects']} 个, {stats['bytes']:,} bytes ({stats['bytes'] / 1024 / 1024:.2f} MB)")
+    print(f"   名称: {stats['names']} 个, 被链接的对象: {stats['linked']} 个")
+
+    missing = 0
+    for name in [feed_name(f) for f in args.feed] + [f"md5:{m.lower()}" for m in args.md5]:
+        digest = store.resolve(name)
+        if digest and store.has(digest):
+            print(f"   ✅ {name} → {store.object_path(digest)}")
+        else:
+            print(f"   ❌ {name}: 未找到")
+            missing += 1
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
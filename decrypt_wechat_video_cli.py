@@ -8,20 +8,360 @@ GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
 """
 import sys
 import os
+import errno
+import mmap
+import hashlib
+import signal
+import threading
 import argparse
 from pathlib import Path
 
+from isaac64 import generate_keystream, parse_decode_key, KEYSTREAM_SIZE
+from keystream_cache import (
+    get_default_cache,
+    configure_default_cache,
+    decode_key_cache_key,
+    file_cache_key,
+)
+from keystream_format import is_binary_keystream, load_keystream_binary
+from mp4_boxes import check_structure, overlay_reader, file_reader, describe, plan_faststart
+from metrics import StageMetrics, MetricsRegistry, METRICS_FORMATS, print_stages
+from content_store import LINK_MODES
+from variant_planner import DEFAULT_BANDWIDTH_MBPS
 
-def read_keystream_from_file(filename, verbose=True):
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+try:
+    import xxhash
+except ImportError:  # xxhash 为可选依赖
+    xxhash = None
+
+
+# ============================================================
+# XOR 后端
+# ============================================================
+#
+# 每个后端都是 func(buf, keystream, n)：将 keystream 的前 n 字节原地
+# XOR 到可写缓冲区 buf（bytearray / memoryview / mmap）的前 n 字节上。
+# 按 XOR_BACKEND_PRIORITY 的顺序，在导入时选出第一个可用的后端。
+
+def _xor_inplace_bigint(buf, keystream, n):
+    """大整数后端：整块转换为 int 后一次性 XOR，无需额外依赖"""
+    view = memoryview(buf)
+    value = int.from_bytes(view[:n], 'little') ^ int.from_bytes(memoryview(keystream)[:n], 'little')
+    view[:n] = value.to_bytes(n, 'little')
+
+
+def _xor_inplace_numpy(buf, keystream, n):
+    """NumPy 后端：直接在缓冲区上向量化 XOR，不产生中间副本"""
+    target = np.frombuffer(buf, dtype=np.uint8, count=n)
+    source = np.frombuffer(keystream, dtype=np.uint8, count=n)
+    np.bitwise_xor(target, source, out=target)
+
+
+XOR_BACKENDS = {'bigint': _xor_inplace_bigint}
+if np is not None:
+    XOR_BACKENDS['numpy'] = _xor_inplace_numpy
+
+XOR_BACKEND_PRIORITY = ('numpy', 'bigint')
+
+
+def register_xor_backend(name, func, preferred=False):
+    """
+    注册自定义 XOR 后端
+
+    Args:
+        name: 后端名称
+        func: func(buf, keystream, n)，原地 XOR 前 n 字节
+        preferred: 是否立即设为默认后端
+    """
+    XOR_BACKENDS[name] = func
+    if preferred:
+        set_xor_backend(name)
+
+
+def set_xor_backend(name=None):
+    """
+    选择默认 XOR 后端
+
+    Args:
+        name: 后端名称，None 或 'auto' 表示自动选择最快的可用后端
+
+    Returns:
+        str: 实际生效的后端名称
+    """
+    global XOR_BACKEND
+    if name in (None, 'auto'):
+        name = next(b for b in XOR_BACKEND_PRIORITY if b in XOR_BACKENDS)
+    if name not in XOR_BACKENDS:
+        raise ValueError(f"未知的 XOR 后端: {name} (可用: {', '.join(sorted(XOR_BACKENDS))})")
+    XOR_BACKEND = name
+    return name
+
+
+def get_xor_backend():
+    """返回当前默认的 XOR 后端名称"""
+    return XOR_BACKEND
+
+
+def xor_inplace(buf, keystream, backend=None):
+    """
+    将密钥流原地 XOR 到缓冲区上
+
+    Args:
+        buf: 可写缓冲区（bytearray / memoryview / mmap）
+        keystream: 密钥流数据（bytes-like）
+        backend: 后端名称，None 表示使用默认后端
+
+    Returns:
+        str: 实际使用的后端名称
+    """
+    backend = backend or XOR_BACKEND
+    n = min(len(buf), len(keystream))
+    if n:
+        XOR_BACKENDS[backend](buf, keystream, n)
+    return backend
+
+
+def xor_bytes(data, keystream, backend=None):
+    """
+    XOR 解密数据并返回新的 bytes
+
+    Args:
+        data: 加密数据（bytes-like），只处理与密钥流重叠的部分
+        keystream: 密钥流数据（bytes-like）
+        backend: 后端名称，None 表示使用默认后端
+
+    Returns:
+        bytes: 解密后的数据（长度为 min(len(data), len(keystream))）
+    """
+    n = min(len(data), len(keystream))
+    buf = bytearray(memoryview(data)[:n])
+    xor_inplace(buf, keystream, backend)
+    return bytes(buf)
+
+
+XOR_BACKEND = set_xor_backend(os.environ.get('WX_XOR_BACKEND'))
+
+
+# ============================================================
+# 摘要校验
+# ============================================================
+#
+# 摘要在解密的读写循环中顺带计算（每个字节只读一次），不需要解密完成后
+# 再完整读取一遍输出文件。可以对输出（明文）或输入（加密文件）计算，
+# 两者只有文件头不同，尾部共用同一次读取。
+
+HASH_ALGORITHMS = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+}
+if xxhash is not None:
+    HASH_ALGORITHMS.update({
+        'xxh64': xxhash.xxh64,
+        'xxh3_64': xxhash.xxh3_64,
+        'xxh128': xxhash.xxh3_128,
+    })
+
+# 只给出十六进制摘要时按长度推断算法
+_DIGEST_LENGTHS = {32: 'md5', 40: 'sha1', 64: 'sha256', 16: 'xxh64'}
+
+DIGEST_SOURCES = ('output', 'input', 'both')
+
+
+def parse_digest_spec(spec):
+    """
+    解析预期摘要，格式为 "算法:十六进制" 或只有十六进制（按长度推断算法）
+
+    Returns:
+        tuple: (算法, 小写十六进制摘要)
+
+    Raises:
+        ValueError: 格式错误或算法不可用
+    """
+    algorithm, sep, value = str(spec).strip().rpartition(':')
+    value = value.strip().lower()
+    if not sep:
+        algorithm = _DIGEST_LENGTHS.get(len(value))
+        if algorithm is None:
+            raise ValueError(f"无法根据长度推断摘要算法: {spec}（请使用 算法:摘要 格式）")
+    algorithm = algorithm.strip().lower()
+    if algorithm not in HASH_ALGORITHMS:
+        hint = '（需要安装 xxhash）' if algorithm.startswith('xxh') else ''
+        raise ValueError(f"不支持的摘要算法: {algorithm}{hint} (可用: {', '.join(HASH_ALGORITHMS)})")
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        raise ValueError(f"摘要不是有效的十六进制: {spec}") from None
+    return algorithm, value
+
+
+class DigestSet:
+    """
+    一组随解密过程更新的摘要
+
+    Args:
+        algorithms: 需要计算的算法
+        expected: 预期摘要 {算法: 十六进制}，其中的算法会自动加入计算
+        source: 'output'（解密结果）/ 'input'（加密文件）/ 'both'（两者，任一匹配即视为通过）
+    """
+
+    def __init__(self, algorithms=(), expected=None, source='output'):
+        if source not in DIGEST_SOURCES:
+            raise ValueError(f"未知的摘要对象: {source} (可用: {', '.join(DIGEST_SOURCES)})")
+        self.expected = {k: v.lower() for k, v in (expected or {}).items()}
+        names = list(dict.fromkeys(list(algorithms) + list(self.expected)))
+        for name in names:
+            if name not in HASH_ALGORITHMS:
+                raise ValueError(f"不支持的摘要算法: {name} (可用: {', '.join(HASH_ALGORITHMS)})")
+        sources = ('output', 'input') if source == 'both' else (source,)
+        self.hashers = {src: {name: HASH_ALGORITHMS[name]() for name in names} for src in sources}
+
+    def __bool__(self):
+        return any(self.hashers.values())
+
+    def update_head(self, source, data):
+        """更新文件头部分（输入与输出不同）"""
+        for h in self.hashers.get(source, {}).values():
+            h.update(data)
+
+    def update(self, data):
+        """更新未加密部分（输入与输出相同）"""
+        for hashers in self.hashers.values():
+            for h in hashers.values():
+                h.update(data)
+
+    def hexdigests(self):
+        """
+        Returns:
+            dict: {对象: {算法: 十六进制摘要}}
+        """
+        return {src: {name: h.hexdigest() for name, h in hashers.items()}
+                for src, hashers in self.hashers.items()}
+
+
+class DecryptResult:
+    """
+    解密结果
+
+    可以直接当作 bool 使用（解密成功且摘要校验未失败时为真），兼容旧的返回值。
+
+    Attributes:
+        output: 输出文件路径
+        valid_mp4: 是否找到 'ftyp' 签名
+        boxes: 顶层 box 的描述（见 mp4_boxes.describe）
+        structure_errors: MP4 结构错误（box 被截断、缺少 moov 等）
+        saved: 输出是否写入成功
+        bytes: 文件大小
+        copy_method: 尾部复制方式
+        stages: 各阶段耗时与字节数（StageMetrics，见 metrics.py）
+        digests: {对象: {算法: 十六进制摘要}}
+        expected: 预期摘要 {算法: 十六进制}
+        error: 失败原因
+    """
+
+    def __init__(self, output=None):
+        self.output = output
+        self.valid_mp4 = False
+        self.boxes = ''
+        self.structure_errors = []
+        self.saved = False
+        self.bytes = 0
+        self.copy_method = None
+        self.stages = StageMetrics()
+        self.digests = {}
+        self.expected = {}
+        self.error = None
+
+    @property
+    def mismatches(self):
+        """与预期不符的算法列表"""
+        return [name for name, value in self.expected.items()
+                if not any(d.get(name) == value for d in self.digests.values())]
+
+    @property
+    def verified(self):
+        """摘要校验结果：未提供预期摘要时为 None"""
+        if not self.expected or not self.digests:
+            return None
+        return not self.mismatches
+
+    @property
+    def ok(self):
+        return self.valid_mp4 and not self.structure_errors and self.saved and self.verified is not False
+
+    def check_structure(self, read_at, file_size, verbose=False):
+        """
+        检查 MP4 顶层结构（只读取 box 头部），结果记录到 boxes / structure_errors
+
+        Returns:
+            list: 顶层 Box 列表
+        """
+        boxes, self.structure_errors = check_structure(read_at, file_size)
+        self.boxes = describe(boxes)
+        if self.structure_errors:
+            self.error = f"MP4 结构异常: {self.structure_errors[0]}"
+        if verbose:
+            if self.boxes:
+                print(f"   📦 顶层 box: {self.boxes}")
+            for error in self.structure_errors:
+                print(f"   ❌ MP4 结构异常: {error}")
+        return boxes
+
+    def __bool__(self):
+        return self.ok
+
+    def record_digests(self, digests, verbose=False):
+        """记录 DigestSet 的结果并与预期比较"""
+        if not digests:
+            return
+        self.digests = digests.hexdigests()
+        self.expected = dict(digests.expected)
+        if verbose:
+            for src, values in self.digests.items():
+                for name, value in values.items():
+                    print(f"   🔏 {name} ({'输出' if src == 'output' else '输入'}): {value}")
+        if self.verified is False:
+            self.error = f"摘要不匹配: {', '.join(self.mismatches)}"
+            if verbose:
+                print(f"   ❌ {self.error}")
+        elif self.verified and verbose:
+            print(f"   ✅ 摘要校验通过: {', '.join(self.expected)}")
+
+    def to_dict(self):
+        return {
+            'output': self.output,
+            'ok': self.ok,
+            'valid_mp4': self.valid_mp4,
+            'boxes': self.boxes,
+            'structure_errors': self.structure_errors,
+            'bytes': self.bytes,
+            'copy_method': self.copy_method,
+            'stages': self.stages.to_dict(),
+            'digests': self.digests,
+            'verified': self.verified,
+            'error': self.error,
+        }
+
+
+def read_keystream_from_file(filename, verbose=True, use_cache=True):
     """
     从导出的文件读取密钥流
 
+    自动识别格式：二进制密钥流（见 keystream_format.py）通过 mmap 零拷贝加载，
+    十六进制文本则解析后写入缓存。
+
     Args:
         filename: 密钥流文件路径
         verbose: 是否显示详细信息
+        use_cache: 是否优先读取密钥流缓存（文件内容变化后缓存自动失效）
 
     Returns:
-        bytes: 密钥流数据，失败返回 None
+        bytes: 密钥流数据（二进制格式时为只读 memoryview），失败返回 None
     """
     if verbose:
         print(f"📂 读取密钥流文件: {filename}")
@@ -31,6 +371,26 @@ def read_keystream_from_file(filename, verbose=True):
             print(f"❌ 文件不存在: {filename}")
         return None
 
+    if is_binary_keystream(filename):
+        try:
+            keystream = load_keystream_binary(filename)
+        except (OSError, ValueError) as e:
+            if verbose:
+                print(f"❌ 读取二进制密钥流失败: {e}")
+            return None
+        if verbose:
+            print(f"✅ 二进制密钥流大小: {len(keystream):,} bytes ({len(keystream) / 1024:.2f} KB)")
+        return keystream
+
+    cache = get_default_cache() if use_cache else None
+    cache_key = file_cache_key(filename) if cache else None
+    if cache_key:
+        keystream = cache.get(cache_key)
+        if keystream is not None:
+            if verbose:
+                print(f"✅ 命中密钥流缓存，大小: {len(keystream):,} bytes ({len(keystream) / 1024:.2f} KB)")
+            return keystream
+
     with open(filename, 'r', encoding='utf-8') as f:
         hex_string = f.read().strip()
 
@@ -42,6 +402,8 @@ def read_keystream_from_file(filename, verbose=True):
         keystream = bytes.fromhex(hex_string)
         if verbose:
             print(f"✅ 密钥流大小: {len(keystream):,} bytes ({len(keystream) / 1024:.2f} KB)")
+        if cache_key:
+            cache.put(cache_key, keystream)
         return keystream
     except ValueError as e:
         if verbose:
@@ -78,86 +440,506 @@ def read_keystream_from_string(hex_string, verbose=True):
         return None
 
 
-def decrypt_video(encrypted_file, keystream, output_file, verbose=True):
+def read_keystream_from_decode_key(decode_key, verbose=True, use_cache=True):
+    """
+    由 decode_key 直接生成密钥流（纯 Python Isaac64，无需浏览器）
+
+    Args:
+        decode_key: API 响应中的 decode_key
+        verbose: 是否显示详细信息
+        use_cache: 是否使用密钥流缓存
+
+    Returns:
+        bytes: 密钥流数据，失败返回 None
+    """
+    if verbose:
+        print(f"🔑 由 decode_key 生成密钥流: {decode_key}")
+
+    try:
+        seed = parse_decode_key(decode_key)
+    except ValueError as e:
+        if verbose:
+            print(f"❌ 生成密钥流失败: {e}")
+        return None
+
+    cache = get_default_cache() if use_cache else None
+    if cache:
+        keystream = cache.get(decode_key_cache_key(seed))
+        if keystream is not None and len(keystream) == KEYSTREAM_SIZE:
+            if verbose:
+                print(f"✅ 命中密钥流缓存，大小: {len(keystream):,} bytes ({len(keystream) / 1024:.2f} KB)")
+            return keystream
+
+    keystream = generate_keystream(seed, KEYSTREAM_SIZE)
+    if cache:
+        cache.put(decode_key_cache_key(seed), keystream, seed)
+
+    if verbose:
+        print(f"✅ 密钥流大小: {len(keystream):,} bytes ({len(keystream) / 1024:.2f} KB)")
+    return keystream
+
+
+# 流式复制未加密尾部时使用的块大小
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# copy_file_range / sendfile 不可用时回退到普通读写的错误码
+_COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+    getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL),
+}
+
+
+def _write_all(dst, data):
+    """循环写入，处理非缓冲文件对象的部分写入"""
+    view = memoryview(data)
+    while view:
+        written = dst.write(view)
+        view = view[written:]
+
+
+def _read_exact(src, size):
+    """读取 size 字节（文件较短时返回实际读到的内容）"""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = src.readinto(view[got:])
+        if not n:
+            break
+        got += n
+    del view
+    if got < size:
+        del buf[got:]
+    return buf
+
+
+def copy_file_tail(src, dst, src_offset, dst_offset, count, chunk_size=DEFAULT_CHUNK_SIZE, method='auto',
+                   digests=None, progress=None):
+    """
+    将 src 中从 src_offset 开始的 count 字节复制到 dst 的 dst_offset 处
+
+    优先使用内核零拷贝（copy_file_range，其次 sendfile），不支持时回退到
+    固定大小的分块读写，因此内存占用与文件大小无关。需要计算摘要时数据
+    必须经过用户态，直接使用分块读写并在同一循环中更新摘要。
+
+    Args:
+        src: 源文件对象（需支持 fileno）
+        dst: 目标文件对象（需支持 fileno）
+        src_offset: 源文件起始偏移
+        dst_offset: 目标文件起始偏移
+        count: 复制的字节数
+        chunk_size: 分块读写时的块大小
+        method: 'auto' / 'copy_file_range' / 'sendfile' / 'read'
+        digests: DigestSet（可选），复制的数据会同时更新到其中
+        progress: 进度回调 progress(n)，每复制一块后以该块的字节数调用；
+                  提供时内核复制也按 chunk_size 分块进行，以便及时报告进度
+
+    Returns:
+        str: 实际使用的复制方式
+    """
+    done = 0
+    used = 'read'
+    in_fd, out_fd = src.fileno(), dst.fileno()
+    if digests:
+        method = 'read'
+    step = chunk_size if progress else count
+
+    if method in ('auto', 'copy_file_range') and hasattr(os, 'copy_file_range'):
+        try:
+            while done < count:
+                n = os.copy_file_range(in_fd, out_fd, min(step, count - done), src_offset + done, dst_offset + done)
+                if n == 0:
+                    break
+                done += n
+                if progress:
+                    progress(n)
+            used = 'copy_file_range'
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+
+    if done < count and method in ('auto', 'sendfile') and hasattr(os, 'sendfile'):
+        try:
+            os.lseek(out_fd, dst_offset + done, os.SEEK_SET)
+            while done < count:
+                n = os.sendfile(out_fd, in_fd, src_offset + done, min(step, count - done))
+                if n == 0:
+                    break
+                done += n
+                if progress:
+                    progress(n)
+            used = 'sendfile'
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+
+    if done < count:
+        src.seek(src_offset + done)
+        dst.seek(dst_offset + done)
+        buf = bytearray(min(chunk_size, count - done))
+        view = memoryview(buf)
+        while done < count:
+            n = src.readinto(view[:min(len(buf), count - done)])
+            if not n:
+                break
+            if digests:
+                digests.update(view[:n])
+            _write_all(dst, view[:n])
+            done += n
+            if progress:
+                progress(n)
+        used = 'read'
+
+    return used
+
+
+def _write_faststart(src, dst, head, plan, file_size, chunk_size=DEFAULT_CHUNK_SIZE, method='auto', digests=None,
+                     progress=None):
+    """
+    按 faststart 布局写出：ftyp + moov' + 原 ftyp 与 moov 之间的部分 + 原 moov 之后的部分
+
+    head 为已解密的文件头（必须在 moov 之前结束），其余部分仍按块或由内核从 src 复制。
+    输入摘要按原文件顺序、输出摘要按新布局的顺序更新。
+
+    Returns:
+        str: 尾部复制方式
+    """
+    moov_len = len(plan.moov_data)
+    ftyp, middle = memoryview(head)[:plan.ftyp_end], memoryview(head)[plan.ftyp_end:]
+    if digests:
+        digests.update_head('output', ftyp)
+        digests.update_head('output', plan.moov_data)
+        digests.update_head('output', middle)
+    _write_all(dst, ftyp)
+    _write_all(dst, plan.moov_data)
+    _write_all(dst, middle)
+    if progress:
+        progress(len(head) + moov_len)
+
+    used = 'read'
+    if plan.moov.offset > len(head):
+        used = copy_file_tail(src, dst, len(head), len(head) + moov_len, plan.moov.offset - len(head),
+                              chunk_size, method, digests, progress)
+    if digests:
+        digests.update_head('input', plan.original)
+    if plan.moov.end < file_size:
+        used = copy_file_tail(src, dst, plan.moov.end, plan.moov.offset + moov_len, file_size - plan.moov.end,
+                              chunk_size, method, digests, progress)
+    return used
+
+
+def temp_output_path(output_file):
+    """输出文件的临时路径（同目录，按进程和线程区分，便于原子重命名）"""
+    return f"{output_file}.part-{os.getpid()}-{threading.get_ident()}"
+
+
+def discard_temp(path):
+    """删除临时文件（不存在时忽略）"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def decrypt_video(encrypted_file, keystream, output_file, verbose=True, chunk_size=DEFAULT_CHUNK_SIZE,
+                  copy_method='auto', hashes=(), expected=None, digest_source='output', fsync=False,
+                  faststart=False, metrics=None, on_progress=None):
     """
-    解密视频文件
+    解密视频文件（流式）
+
+    只读取并 XOR 前 len(keystream) 字节，未加密的尾部直接按块（或由内核）
+    复制到输出文件，峰值内存与视频大小无关。
 
     Args:
         encrypted_file: 加密视频文件路径
         keystream: 密钥流数据（bytes）
         output_file: 输出文件路径
         verbose: 是否显示详细信息
+        chunk_size: 复制未加密部分时的块大小
+        copy_method: 尾部复制方式（见 copy_file_tail）
+        hashes: 在写入过程中顺带计算的摘要算法（见 HASH_ALGORITHMS）
+        expected: 预期摘要 {算法: 十六进制}，不匹配时解密视为失败
+        digest_source: 摘要对象，'output' / 'input' / 'both'
+        fsync: 重命名前是否将输出刷新到磁盘（断电后仍保证输出完整）
+        faststart: moov 位于 mdat 之后时，在同一次写入中把 moov 移到前面（修正 stco/co64 块偏移），
+                   播放器无需先下载文件末尾即可开始播放
+        metrics: 记录各阶段耗时的 StageMetrics（可选，调用方可先记入密钥流加载时间），结果见 result.stages
+        on_progress: 写入进度回调 on_progress(已写入字节数, 输出总字节数)，按 chunk_size 分块调用（可能在工作线程中）
 
     Returns:
-        bool: 解密是否成功
+        DecryptResult: 解密结果（可直接当作 bool 使用）
     """
+    result = DecryptResult(output_file)
+    if metrics is not None:
+        result.stages = metrics
+    stages = result.stages
+    digests = DigestSet(hashes, expected, digest_source) if (hashes or expected) else None
+
     if verbose:
         print(f"\n📁 读取加密文件: {encrypted_file}")
 
     if not os.path.exists(encrypted_file):
+        result.error = "输入文件不存在"
         if verbose:
             print(f"❌ 文件不存在: {encrypted_file}")
-        return False
+        return result
 
-    # 读取加密文件
-    with open(encrypted_file, 'rb') as f:
-        encrypted_data = f.read()
+    with open(encrypted_file, 'rb', buffering=0) as src:
+        file_size = os.fstat(src.fileno()).st_size
+        result.bytes = file_size
+        if verbose:
+            print(f"   文件大小: {file_size:,} bytes ({file_size / 1024 / 1024:.2f} MB)")
 
-    file_size = len(encrypted_data)
-    if verbose:
-        print(f"   文件大小: {file_size:,} bytes ({file_size / 1024 / 1024:.2f} MB)")
+        # 确定需要解密的长度
+        decrypt_len = min(len(keystream), file_size)
+        if verbose:
+            print(f"\n🔓 开始解密...")
+            print(f"   解密长度: {decrypt_len:,} bytes ({decrypt_len / 1024:.2f} KB)")
+
+        # 只读取文件头（至少 32 字节用于签名校验）
+        with stages.measure('read') as timing:
+            head = _read_exact(src, min(file_size, max(decrypt_len, 32)))
+            timing['bytes'] = len(head)
+        if digests:
+            with stages.measure('verify', len(head)):
+                digests.update_head('input', head)
+
+        # XOR 解密前 decrypt_len 字节
+        if verbose:
+            print(f"   进行 XOR 运算 (后端: {get_xor_backend()})...")
 
-    # 确定需要解密的长度
-    decrypt_len = min(len(keystream), len(encrypted_data))
-    if verbose:
-        print(f"\n🔓 开始解密...")
-        print(f"   解密长度: {decrypt_len:,} bytes ({decrypt_len / 1024:.2f} KB)")
+        with stages.measure('xor', decrypt_len):
+            xor_inplace(memoryview(head)[:decrypt_len], keystream)
+
+        # 验证解密
+        if verbose:
+            print(f"\n🔍 验证解密结果...")
+            print(f"   前 32 字节: {' '.join(f'{b:02x}' for b in head[:32])}")
+
+        # 检查 MP4 文件签名
+        if b'ftyp' in head[:32]:
+            ftyp_offset = head[:32].find(b'ftyp')
+            result.valid_mp4 = True
+            if verbose:
+                print(f"   ✅✅✅ 找到 MP4 签名 'ftyp' @ 偏移 {ftyp_offset}")
+            # 尾部未加密，与输出相同：用内存中的文件头 + 输入文件即可检查输出的 box 结构
+            with stages.measure('verify'):
+                boxes = result.check_structure(overlay_reader(head, src), file_size, verbose)
+            if verbose and not result.structure_errors:
+                print(f"   🎬 这是一个有效的 MP4 文件！")
+        else:
+            result.error = "未找到 'ftyp' 签名（密钥流可能与视频不匹配）"
+            if verbose:
+                print(f"   ⚠️  未找到 'ftyp' 签名")
+                print(f"   可能需要检查密钥流是否正确")
+
+        plan = None
+        if faststart and result.valid_mp4 and not result.structure_errors:
+            try:
+                plan = plan_faststart(boxes, overlay_reader(head, src))
+            except ValueError as e:
+                if verbose:
+                    print(f"   ⚠️  无法 faststart（{e}），按原布局输出")
+            if plan and plan.moov.offset < len(head):
+                plan = None  # 文件很小，moov 落在加密区域内，不值得移动
+            if verbose:
+                if plan:
+                    print(f"   ⏩ faststart: moov ({len(plan.moov_data):,} bytes) 移到 mdat 之前")
+                else:
+                    print(f"   ℹ️  moov 已在 mdat 之前（或不适用），无需 faststart")
+
+        # 保存解密后的文件
+        if verbose:
+            print(f"\n💾 保存解密文件: {output_file}")
+
+        progress = None
+        if on_progress:
+            total = file_size - plan.moov.size + len(plan.moov_data) if plan else file_size
+            written = [0]
+
+            def progress(n):
+                written[0] += n
+                on_progress(written[0], total)
+
+        # 先写入同目录下的临时文件，完成后原子重命名，中断时不会留下不完整的输出
+        tmp_path = temp_output_path(output_file)
+        try:
+            with open(tmp_path, 'wb', buffering=0) as dst:
+                with stages.measure('write') as timing:
+                    if plan:
+                        result.copy_method = _write_faststart(src, dst, head, plan, file_size, chunk_size,
+                                                              copy_method, digests, progress)
+                    else:
+                        if digests:
+                            digests.update_head('output', head)
+                        _write_all(dst, head)
+                        if progress:
+                            progress(len(head))
+                        tail_len = file_size - len(head)
+                        if tail_len > 0:
+                            result.copy_method = copy_file_tail(
+                                src, dst, len(head), len(head), tail_len, chunk_size, copy_method, digests, progress
+                            )
+                            if verbose:
+                                print(f"   复制未加密部分: {tail_len:,} bytes (方式: {result.copy_method})")
+                    timing['bytes'] = os.fstat(dst.fileno()).st_size
+                if fsync:
+                    with stages.measure('fsync', timing['bytes']):
+                        os.fsync(dst.fileno())
+            if plan:
+                # 重新检查新布局的 box 结构（只读取 box 头部）
+                with stages.measure('verify'), open(tmp_path, 'rb') as f:
+                    result.check_structure(file_reader(f), file_size - plan.moov.size + len(plan.moov_data))
+                if result.structure_errors:
+                    raise ValueError(result.error)
+                if verbose:
+                    print(f"   📦 输出 box: {result.boxes}")
+            # 摘要已在写入循环中算完，先校验再发布：不匹配的输出不会出现在最终路径上
+            result.record_digests(digests, verbose)
+            if result.verified is False:
+                discard_temp(tmp_path)
+                return result
+            os.replace(tmp_path, output_file)
+
+            saved_size = os.path.getsize(output_file)
+            result.saved = True
+            if verbose:
+                print(f"   ✅ 保存成功!")
+                print(f"   文件大小: {saved_size:,} bytes ({saved_size / 1024 / 1024:.2f} MB)")
+        except Exception as e:
+            discard_temp(tmp_path)
+            result.error = f"保存失败: {e}"
+            if verbose:
+                print(f"   ❌ 保存失败: {e}")
+            return result
 
-    # XOR 解密前 decrypt_len 字节
     if verbose:
-        print(f"   进行 XOR 运算...")
+        print_stages(stages)
+    return result
 
-    decrypted_chunk = bytes(a ^ b for a, b in zip(encrypted_data[:decrypt_len], keystream))
 
-    # 拼接未加密的部分
-    decrypted_full = decrypted_chunk + encrypted_data[decrypt_len:]
+def decrypt_video_inplace(encrypted_file, keystream, rename_to=None, verbose=True,
+                          hashes=(), expected=None, digest_source='output', chunk_size=DEFAULT_CHUNK_SIZE,
+                          metrics=None):
+    """
+    原地解密视频文件
 
-    # 验证解密
-    if verbose:
-        print(f"\n🔍 验证解密结果...")
-        print(f"   前 32 字节: {' '.join(f'{b:02x}' for b in decrypted_full[:32])}")
-
-    # 检查 MP4 文件签名
-    is_valid_mp4 = False
-    if b'ftyp' in decrypted_full[:32]:
-        ftyp_offset = decrypted_full[:32].find(b'ftyp')
-        is_valid_mp4 = True
-        if verbose:
-            print(f"   ✅✅✅ 找到 MP4 签名 'ftyp' @ 偏移 {ftyp_offset}")
-            print(f"   🎬 这是一个有效的 MP4 文件！")
-    else:
-        if verbose:
-            print(f"   ⚠️  未找到 'ftyp' 签名")
-            print(f"   可能需要检查密钥流是否正确")
+    通过 mmap 映射文件头，直接在映射区域上 XOR 并刷新到磁盘，不再写出
+    第二份完整副本，单个文件的 I/O 只有文件头大小。若解密结果没有
+    MP4 签名，会再次 XOR 恢复原始内容；文件头已经是明文时不做任何修改。
+    需要计算摘要时会额外读取一遍未加密的尾部。
 
-    # 保存解密后的文件
-    if verbose:
-        print(f"\n💾 保存解密文件: {output_file}")
+    Args:
+        encrypted_file: 加密视频文件路径（会被直接修改）
+        keystream: 密钥流数据（bytes）
+        rename_to: 解密完成后重命名为该路径（可选）
+        verbose: 是否显示详细信息
+        hashes: 需要计算的摘要算法
+        expected: 预期摘要 {算法: 十六进制}
+        digest_source: 摘要对象，'output' / 'input' / 'both'
+        chunk_size: 计算摘要时读取尾部的块大小
+        metrics: 记录各阶段耗时的 StageMetrics（可选，见 decrypt_video）
 
-    try:
-        with open(output_file, 'wb') as f:
-            f.write(decrypted_full)
+    Returns:
+        DecryptResult: 解密结果（可直接当作 bool 使用）
+    """
+    result = DecryptResult(rename_to or encrypted_file)
+    if metrics is not None:
+        result.stages = metrics
+    stages = result.stages
+    digests = DigestSet(hashes, expected, digest_source) if (hashes or expected) else None
+
+    if verbose:
+        print(f"\n📁 原地解密文件: {encrypted_file}")
 
-        saved_size = os.path.getsize(output_file)
+    if not os.path.exists(encrypted_file):
+        result.error = "输入文件不存在"
         if verbose:
-            print(f"   ✅ 保存成功!")
-            print(f"   文件大小: {saved_size:,} bytes ({saved_size / 1024 / 1024:.2f} MB)")
+            print(f"❌ 文件不存在: {encrypted_file}")
+        return result
 
-        return is_valid_mp4
-    except Exception as e:
+    with open(encrypted_file, 'r+b') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        result.bytes = file_size
+        decrypt_len = min(len(keystream), file_size)
         if verbose:
-            print(f"   ❌ 保存失败: {e}")
-        return False
+            print(f"   文件大小: {file_size:,} bytes ({file_size / 1024 / 1024:.2f} MB)")
+            print(f"   解密长度: {decrypt_len:,} bytes ({decrypt_len / 1024:.2f} KB)")
+
+        if decrypt_len == 0:
+            result.error = "文件为空"
+            if verbose:
+                print(f"   ⚠️  文件为空，无需解密")
+            return result
+
+        with mmap.mmap(f.fileno(), decrypt_len, access=mmap.ACCESS_WRITE) as mm:
+            if b'ftyp' in mm[:32]:
+                if verbose:
+                    print(f"   ℹ️  文件头已包含 'ftyp' 签名，视为已解密，跳过")
+                result.valid_mp4 = True
+                with stages.measure('verify', decrypt_len):
+                    result.check_structure(overlay_reader(mm, f), file_size, verbose)
+                    if digests:
+                        digests.update_head('input', mm)
+                        digests.update_head('output', mm)
+            else:
+                if digests:
+                    with stages.measure('verify', decrypt_len):
+                        digests.update_head('input', mm)
+                if verbose:
+                    print(f"   进行 XOR 运算 (后端: {get_xor_backend()})...")
+                with stages.measure('xor', decrypt_len):
+                    xor_inplace(mm, keystream)
+
+                result.valid_mp4 = b'ftyp' in mm[:32]
+                if verbose:
+                    print(f"   前 32 字节: {' '.join(f'{b:02x}' for b in mm[:32])}")
+                if result.valid_mp4:
+                    if verbose:
+                        print(f"   ✅✅✅ 找到 MP4 签名 'ftyp' @ 偏移 {mm[:32].find(b'ftyp')}")
+                    with stages.measure('verify', decrypt_len):
+                        if digests:
+                            digests.update_head('output', mm)
+                        result.check_structure(overlay_reader(mm, f), file_size, verbose)
+                else:
+                    # 密钥不匹配时恢复原始内容，避免破坏加密文件
+                    with stages.measure('xor', decrypt_len):
+                        xor_inplace(mm, keystream)
+                    result.error = "未找到 'ftyp' 签名（密钥流可能与视频不匹配）"
+                    if verbose:
+                        print(f"   ⚠️  未找到 'ftyp' 签名，已恢复原始文件内容")
+                        print(f"   可能需要检查密钥流是否正确")
+                with stages.measure('write', decrypt_len):
+                    mm.flush()
+        result.saved = True
+
+        if digests and result.valid_mp4:
+            with stages.measure('verify', file_size - decrypt_len):
+                f.seek(decrypt_len)
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    digests.update(chunk)
+
+    if result.valid_mp4:
+        result.record_digests(digests, verbose)
+    if result.valid_mp4 and rename_to and os.path.abspath(rename_to) != os.path.abspath(encrypted_file):
+        if result.verified is False:
+            # 摘要不匹配时不重命名，避免以“已解密”的名字发布错误的内容
+            result.output = encrypted_file
+            if verbose:
+                print(f"   ⚠️  摘要不匹配，未重命名: {encrypted_file}")
+        else:
+            os.replace(encrypted_file, rename_to)
+            if verbose:
+                print(f"   📝 已重命名为: {rename_to}")
+
+    if verbose and result:
+        print(f"   ✅ 原地解密成功!")
+        print_stages(stages)
+
+    return result
 
 
 def interactive_mode():
@@ -177,8 +959,9 @@ def interactive_mode():
         print("请选择输入方式：")
         print("1. 输入密钥流文件路径")
         print("2. 直接粘贴十六进制密钥流")
-        print("3. 退出")
-        choice = input("\n请选择 (1/2/3): ").strip()
+        print("3. 输入 decode_key 直接生成密钥流")
+        print("4. 退出")
+        choice = input("\n请选择 (1/2/3/4): ").strip()
 
         if choice == "1":
             keystream_file = input("请输入密钥流文件路径: ").strip()
@@ -195,6 +978,9 @@ def interactive_mode():
                 with open(keystream_file, 'w') as f:
                     f.write(hex_string)
                 print(f"✅ 已将密钥流保存到: {keystream_file}")
+        elif choice == "3":
+            decode_key = input("请输入 decode_key: ").strip()
+            keystream = read_keystream_from_decode_key(decode_key)
         else:
             print("❌ 用户取消操作")
             return
@@ -255,19 +1041,466 @@ def interactive_mode():
     print()
 
 
-def cli_mode(args):
-    """命令行模式"""
+def apply_runtime_options(args):
+    """
+    应用缓存与 XOR 后端等运行时选项
+
+    Returns:
+        dict: 需要同步给工作进程的配置（xor_backend / cache）
+    """
+    cache = None
+    if args.no_cache:
+        configure_default_cache(enabled=False)
+        cache = {'enabled': False}
+    elif args.cache_dir or args.cache_size is not None:
+        cache = {
+            'directory': args.cache_dir,
+            'max_bytes': int(args.cache_size * 1024 * 1024) if args.cache_size is not None else None,
+        }
+        configure_default_cache(**cache)
+
+    if args.xor_backend:
+        try:
+            set_xor_backend(args.xor_backend)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+    return {'xor_backend': get_xor_backend(), 'cache': cache}
+
+
+def digest_options(args):
+    """
+    解析摘要相关的命令行参数
+
+    Returns:
+        dict: hashes / expected / digest_source（未指定 --digest-of 时为 None）
+    """
+    expected = {}
+    try:
+        for spec in args.verify or ():
+            algorithm, value = parse_digest_spec(spec)
+            expected[algorithm] = value
+        hashes = []
+        for name in args.hash or ():
+            name = name.strip().lower()
+            if name not in HASH_ALGORITHMS:
+                parse_digest_spec(f"{name}:")  # 统一的错误提示
+            hashes.append(name)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    return {'hashes': hashes, 'expected': expected, 'digest_source': args.digest_of}
+
+
+def _print_mode_banner(title):
     print("=" * 70)
-    print("🎬 微信视频号解密工具")
+    print(f"🎬 微信视频号解密工具 - {title}")
     print("=" * 70)
     print()
 
-    # 读取密钥流
+
+def _run_jobs(args, jobs, options, label):
+    """并行执行任务列表并打印汇总，有失败任务时以状态码 1 退出"""
+    from batch_runner import run_batch, print_summary
+
+    digest = digest_options(args)
+    for job in jobs:
+        if args.in_place:
+            job['in_place'] = True
+            job.pop('output', None)
+        if digest['hashes']:
+            job['hashes'] = digest['hashes']
+        if digest['expected']:
+            job['expected'] = digest['expected']
+        if digest['digest_source']:
+            job['digest_source'] = digest['digest_source']
+        if args.faststart:
+            job['faststart'] = True
+
+    if not args.quiet:
+        if args.executor == 'pipeline':
+            from pipeline import default_stage_workers
+            workers = '/'.join(str(n) for n in args.stage_workers or default_stage_workers(args.jobs))
+            print(f"📋 {label}  ({len(jobs)} 个任务, 流水线并发 keystream/fetch/decrypt = {workers})")
+        else:
+            print(f"📋 {label}  ({len(jobs)} 个任务, 并发 {args.jobs or os.cpu_count()}, {args.executor})")
+        print()
+
+    summary = run_batch(
+        jobs,
+        workers=args.jobs,
+        executor=args.executor,
+        verbose=not args.quiet,
+        chunk_size=args.chunk_size,
+        worker_options=options,
+        ledger=args.ledger,
+        store=args.store,
+        store_link=args.store_link,
+        stage_workers=args.stage_workers,
+        stage_queue=args.stage_queue,
+    )
+
+    if not args.quiet or summary['failed']:
+        print_summary(summary)
+    if args.metrics:
+        summary['metrics'].write(args.metrics, args.metrics_file)
+
+    if summary['failed']:
+        sys.exit(1)
+
+
+def batch_mode(args):
+    """批量模式：按清单并行解密"""
+    from batch_runner import load_manifest
+
+    if not args.quiet:
+        _print_mode_banner("批量模式")
+
+    options = apply_runtime_options(args)
+
+    defaults = {
+        'keystream_file': args.keystream_file,
+        'keystream_hex': args.keystream_hex,
+        'decode_key': args.decode_key,
+    }
+    try:
+        jobs = load_manifest(args.batch, defaults=defaults, output_dir=args.output)
+    except OSError as e:
+        print(f"❌ 无法读取清单: {e}")
+        sys.exit(1)
+
+    _run_jobs(args, jobs, options, f"清单: {args.batch}")
+
+
+def response_mode(args):
+    """响应模式：直接读取 fetch_video_detail 的 API 响应，按其中的 decode_key 解密"""
+    from api_response import build_jobs
+
+    if not args.quiet:
+        _print_mode_banner("API 响应模式")
+
+    if not os.path.exists(args.response):
+        print(f"❌ 响应文件不存在: {args.response}")
+        sys.exit(1)
+
+    options = apply_runtime_options(args)
+    jobs = build_jobs(args.response, input_path=args.input, output_dir=args.output)
+    if args.download:
+        # 直接从响应中的 url 边下载边解密，不需要本地的加密文件
+        for job in jobs:
+            if job.get('error') or 'url' not in job:
+                continue
+            if not job['url']:
+                job['error'] = "响应中缺少 url"
+                continue
+            job['download'] = True
+            job['input'] = job['url'].split('?')[0]
+            if not args.input:
+                job['output'] = os.path.join(args.output or '.', os.path.basename(job['output']))
+    if not jobs:
+        print(f"❌ 响应中没有找到媒体信息（data.object_desc.media）: {args.response}")
+        sys.exit(1)
+
+    if _variant_requested(args):
+        _plan_variants(args, jobs)
+        if args.plan:
+            return
+
+    # 只有一个媒体且 -i 为文件时，-o 可以直接指定输出文件
+    if len(jobs) == 1 and args.output and args.input and os.path.isfile(args.input) \
+            and os.path.splitext(args.output)[1]:
+        jobs[0]['output'] = args.output
+
+    _run_jobs(args, jobs, options, f"响应: {args.response}")
+
+
+def _variant_requested(args):
+    """是否指定了版本选择或预算"""
+    return bool(args.variant or args.plan or args.max_size is not None or args.max_bitrate is not None
+                or args.codec or args.budget is not None)
+
+
+def _plan_variants(args, jobs):
+    """按 spec 为下载任务选择版本并打印整批估算（--plan 时逐个列出后返回）"""
+    from variant_planner import plan_jobs, parse_variants, describe_variant, print_plan, VARIANT_AUTO, VARIANT_ORIGINAL
+
+    mb = 1024 * 1024
+    budgeted = args.max_size is not None or args.max_bitrate is not None or args.codec or args.budget is not None
+    plan = plan_jobs(
+        jobs,
+        variant=args.variant or (VARIANT_AUTO if budgeted else VARIANT_ORIGINAL),
+        max_bytes=int(args.max_size * mb) if args.max_size is not None else None,
+        max_kbps=args.max_bitrate,
+        codec=args.codec,
+        budget=int(args.budget * mb) if args.budget is not None else None,
+    )
+    if args.plan:
+        for job in jobs:
+            name = job.get('feed_id') or job['input']
+            if job.get('error'):
+                print(f"   ❌ [{job['index']}] {name}: {job['error']}")
+                continue
+            print(f"   [{job['index']}] {name}")
+            for variant in parse_variants(job):
+                marker = '→' if variant['format'] == job.get('variant') else ' '
+                print(f"      {marker} {describe_variant(variant)}")
+        print()
+    if args.plan or not args.quiet:
+        print_plan(plan, args.bandwidth, int(args.budget * mb) if args.budget is not None else None)
+
+
+def match_mode(args):
+    """配对模式：按文件头为一批加密视频从密钥池中找出对应的密钥（不做完整解密）"""
+    import json
+    from keystream_match import match_files, result_to_job, key_label, MATCHED, AMBIGUOUS
+
+    if not args.quiet:
+        _print_mode_banner("配对模式")
+
+    options = apply_runtime_options(args)
+    defaults = {
+        'keystream_file': args.keystream_file,
+        'keystream_hex': args.keystream_hex,
+        'decode_key': args.decode_key,
+    }
+    results, index = match_files(args.match, args.keys or [], defaults)
+
+    for error in index.errors:
+        print(f"⚠️  {error}")
+    if not index.keys:
+        print("❌ 密钥池为空（使用 --keys 指定响应文件、密钥流文件或 .key 文件）")
+        sys.exit(1)
+
+    used = set()
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        name = result['input']
+        if result['status'] == MATCHED:
+            used.add(id(result['key']))
+            if not args.quiet:
+                print(f"✅ {name} ← {key_label(result['key'])} [{result['brand']}]")
+        elif result['status'] == AMBIGUOUS:
+            print(f"❓ {name}: {len(result['candidates'])} 个密钥都能匹配: "
+                  f"{', '.join(key_label(k) for k in result['candidates'])}")
+        else:
+            print(f"❌ {name}: {result.get('error') or '密钥池中没有匹配的密钥'}")
+
+    if not args.quiet:
+        print()
+        print(f"📊 视频: {len(results)}, 密钥: {index.keys}, 配对成功: {counts.get(MATCHED, 0)}, "
+              f"有歧义: {counts.get(AMBIGUOUS, 0)}, 未配对: {len(results) - counts.get(MATCHED, 0) - counts.get(AMBIGUOUS, 0)}, "
+              f"未使用的密钥: {index.keys - len(used)}")
+
+    jobs = [result_to_job(r, args.output) for r in results if r['status'] == MATCHED]
+    if args.manifest:
+        with open(args.manifest, 'w', encoding='utf-8') as f:
+            for job in jobs:
+                f.write(json.dumps(job, ensure_ascii=False) + '\n')
+        if not args.quiet:
+            print(f"📝 已写出清单: {args.manifest}（可用 --batch 执行）")
+
+    if args.output and jobs:
+        # 给出 -o 时直接解密配对成功的视频
+        if not args.quiet:
+            print()
+        for i, job in enumerate(jobs, 1):
+            job['index'] = i
+        _run_jobs(args, jobs, options, f"配对结果 → {args.output}")
+    elif len(jobs) < len(results):
+        sys.exit(1)
+
+
+def audit_mode(args):
+    """检查模式：并行检查已解密视频的 MP4 box 结构，报告吞吐量和每个失败的文件"""
+    from mp4_boxes import audit
+
+    if not args.quiet:
+        _print_mode_banner("结构检查")
+
+    def report(result):
+        if not result['ok']:
+            print(f"❌ {result['path']}: {'; '.join(result['errors'])}")
+
+    summary = audit(args.audit, workers=args.jobs, executor=args.executor, on_result=report)
+
+    if not args.quiet or summary['failed']:
+        print()
+        print(f"📊 文件: {summary['files']}, ✅ 完整: {summary['ok']}, ❌ 异常: {len(summary['failed'])}")
+        print(f"   覆盖数据量: {summary['bytes']:,} bytes ({summary['bytes'] / 1024 / 1024 / 1024:.2f} GB), "
+              f"耗时: {summary['seconds']:.2f} s (并发 {summary['workers']}, {args.executor})")
+        print(f"   ⚡ 吞吐: {summary['files_per_sec']:.1f} 文件/秒, {summary['mb_per_sec']:.1f} MB/秒")
+    if not summary['files']:
+        print(f"❌ 没有找到视频文件: {', '.join(args.audit)}")
+        sys.exit(1)
+    if summary['failed']:
+        sys.exit(1)
+
+
+def stdout_mode(args):
+    """输出到标准输出（-o -）：边读边解密写入管道，供 ffmpeg 等直接消费，不写出解密副本"""
+    import shutil
+    from decrypting_reader import open_decrypted
+
+    apply_runtime_options(args)
+
+    keystream = None
+    if args.keystream_file:
+        keystream = read_keystream_from_file(args.keystream_file, verbose=False)
+    elif args.keystream_hex:
+        keystream = read_keystream_from_string(args.keystream_hex, verbose=False)
+    elif args.decode_key:
+        keystream = read_keystream_from_decode_key(args.decode_key, verbose=False)
+    if not keystream:
+        print("❌ 无法读取密钥流", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        with open_decrypted(args.input, keystream, buffering=args.chunk_size) as f:
+            if b'ftyp' not in f.peek(32)[:32]:
+                print("❌ 未找到 'ftyp' 签名（密钥流可能与视频不匹配）", file=sys.stderr)
+                sys.exit(1)
+            shutil.copyfileobj(f, sys.stdout.buffer, args.chunk_size)
+        sys.stdout.buffer.flush()
+    except BrokenPipeError:
+        # 下游提前退出（例如 ffprobe 只读取文件头）
+        sys.stderr.close()
+    except OSError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def serve_mode(args):
+    """流媒体服务模式：GET /video/<id> 返回实时解密的视频，支持 Range"""
+    from stream_server import run_server
+
+    _print_mode_banner("流媒体服务")
+    apply_runtime_options(args)
+
+    if not os.path.isdir(args.serve):
+        print(f"❌ 目录不存在: {args.serve}")
+        sys.exit(1)
+
+    defaults = {
+        'keystream_file': args.keystream_file,
+        'keystream_hex': args.keystream_hex,
+        'decode_key': args.decode_key,
+    }
+    server = run_server(args.serve, args.host, args.port, defaults, args.chunk_size, verbose=not args.quiet)
+    print()
+    print(f"📊 请求数: {server.stats['requests']}, XOR 发送: {server.stats['bytes_xor']:,} bytes, "
+          f"sendfile 发送: {server.stats['bytes_sendfile']:,} bytes")
+
+
+def url_mode(args):
+    """URL 模式：边下载边解密，不在磁盘上保存加密文件"""
+    from stream_download import download_and_decrypt
+
+    if not args.quiet:
+        _print_mode_banner("边下载边解密")
+
+    apply_runtime_options(args)
+
     keystream = None
     if args.keystream_file:
         keystream = read_keystream_from_file(args.keystream_file, verbose=not args.quiet)
     elif args.keystream_hex:
         keystream = read_keystream_from_string(args.keystream_hex, verbose=not args.quiet)
+    elif args.decode_key:
+        keystream = read_keystream_from_decode_key(args.decode_key, verbose=not args.quiet)
+
+    if not keystream:
+        print("❌ 无法读取密钥流")
+        sys.exit(1)
+
+    digest = digest_options(args)
+    digest['digest_source'] = digest['digest_source'] or 'output'
+    output = args.output or "wx_decrypted.mp4"
+    result = download_and_decrypt(
+        args.url,
+        keystream,
+        output,
+        url_token=args.url_token or '',
+        verbose=not args.quiet,
+        chunk_size=args.chunk_size,
+        **digest
+    )
+
+    if not result:
+        if args.quiet:
+            print(f"❌ {result.error}")
+        sys.exit(1)
+    if not args.quiet:
+        print()
+        print("=" * 70)
+        print("🎉 解密完成！")
+        print("=" * 70)
+        print()
+        print(f"📂 解密文件: {output}")
+        print(f"📍 完整路径: {os.path.abspath(output)}")
+        print()
+
+
+def watch_mode(args):
+    """监视模式：自动解密投放目录中新写入的视频"""
+    from watch_folder import WatchDaemon
+
+    _print_mode_banner("监视模式")
+
+    apply_runtime_options(args)
+
+    if not os.path.isdir(args.watch):
+        print(f"❌ 目录不存在: {args.watch}")
+        sys.exit(1)
+
+    daemon = WatchDaemon(
+        args.watch,
+        args.output or os.path.normpath(args.watch) + '_decrypted',
+        workers=args.jobs or min(4, os.cpu_count() or 1),
+        queue_size=args.queue_size,
+        archive_dir=args.archive_dir,
+        defaults={
+            'keystream_file': args.keystream_file,
+            'keystream_hex': args.keystream_hex,
+            'decode_key': args.decode_key,
+        },
+        backend=args.watch_backend,
+        poll_interval=args.poll_interval,
+        chunk_size=args.chunk_size,
+        verbose=not args.quiet,
+        metrics_format=args.metrics,
+        metrics_file=args.metrics_file,
+    )
+    # 以服务方式运行时，收到 SIGTERM 也要处理完队列中的任务再退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
+        print("\n🛑 已停止监视")
+
+
+def cli_mode(args):
+    """命令行模式"""
+    print("=" * 70)
+    print("🎬 微信视频号解密工具")
+    print("=" * 70)
+    print()
+
+    apply_runtime_options(args)
+
+    # 读取密钥流
+    stages = StageMetrics()
+    keystream = None
+    with stages.measure('keystream') as timing:
+        if args.keystream_file:
+            keystream = read_keystream_from_file(args.keystream_file, verbose=not args.quiet)
+        elif args.keystream_hex:
+            keystream = read_keystream_from_string(args.keystream_hex, verbose=not args.quiet)
+        elif args.decode_key:
+            keystream = read_keystream_from_decode_key(args.decode_key, verbose=not args.quiet)
+        timing['bytes'] = len(keystream) if keystream else 0
 
     if not keystream:
         print("❌ 无法读取密钥流")
@@ -276,13 +1509,37 @@ def cli_mode(args):
     if len(keystream) != 131072 and not args.quiet:
         print(f"⚠️  警告: 密钥流大小不是 131072 bytes (实际: {len(keystream):,} bytes)")
 
+    digest = digest_options(args)
+    digest['digest_source'] = digest['digest_source'] or 'output'
+
     # 解密文件
-    success = decrypt_video(
-        args.input,
-        keystream,
-        args.output,
-        verbose=not args.quiet
-    )
+    if args.in_place:
+        success = decrypt_video_inplace(
+            args.input,
+            keystream,
+            rename_to=args.output,
+            verbose=not args.quiet,
+            metrics=stages,
+            **digest
+        )
+        if not args.output:
+            args.output = args.input
+    else:
+        success = decrypt_video(
+            args.input,
+            keystream,
+            args.output,
+            verbose=not args.quiet,
+            chunk_size=args.chunk_size,
+            faststart=args.faststart,
+            metrics=stages,
+            **digest
+        )
+
+    if args.metrics:
+        registry = MetricsRegistry()
+        registry.observe(success.stages, bool(success))
+        registry.write(args.metrics, args.metrics_file)
 
     if success:
         if not args.quiet:
@@ -295,6 +1552,8 @@ def cli_mode(args):
             print(f"📍 完整路径: {os.path.abspath(args.output)}")
             print()
     else:
+        if args.quiet and success.error:
+            print(f"❌ {success.error}")
         if not args.quiet:
             print()
             print("⚠️  解密完成，但可能存在问题")
@@ -318,6 +1577,62 @@ def main():
   # 使用十六进制字符串解密
   %(prog)s -i encrypted.mp4 -H "0a1b2c3d..." -o decrypted.mp4
 
+  # 直接使用 decode_key 解密（内置 Isaac64，无需浏览器）
+  %(prog)s -i wx_encrypted.mp4 -d 2136343393 -o wx_decrypted.mp4
+
+  # 解密结果直接写到标准输出（交给 ffmpeg 等，不写出解密副本）
+  %(prog)s -i wx_encrypted.mp4 -d 2136343393 -o - | ffmpeg -i pipe:0 -c copy out.mkv
+
+  # 解密的同时把 moov 移到文件开头（网页播放器可以立即开始播放）
+  %(prog)s -i wx_encrypted.mp4 -d 2136343393 -o wx_decrypted.mp4 --faststart
+
+  # 原地解密（不写出第二份副本），完成后重命名
+  %(prog)s -i encrypted.mp4 -k keystream.txt --in-place -o decrypted.mp4
+
+  # 批量模式：按清单并行解密（每行指定 input / output / keystream_file|keystream_hex|decode_key）
+  %(prog)s --batch manifest.jsonl --jobs 8 -o decrypted/
+
+  # 直接读取 fetch_video_detail 的 API 响应（自动取 decode_key，并按 file_size 检查文件是否完整）
+  %(prog)s --response wx_response.json -i wx_encrypted.mp4 -o wx_decrypted.mp4
+  %(prog)s --response responses/ -i downloads/ -o decrypted/ --jobs 8
+
+  # 边下载边解密（不保存加密文件）；或对响应中的所有视频直接下载
+  %(prog)s --url "https://finder.video.qq.com/...&encfilekey=..." --url-token "&token=..." -d 2136343393 -o out.mp4
+  %(prog)s --response responses/ --download -o decrypted/ -j 4
+
+  # 按 spec 选择符合预算的版本（只要 h264、单个不超过 10 MB、整批不超过 2 GB），先查看规划再下载
+  %(prog)s --response responses/ --plan --codec h264 --max-size 10 --budget 2000
+  %(prog)s --response responses/ --download -o decrypted/ --codec h264 --max-size 10 --budget 2000
+
+  # 解密时顺带计算并校验摘要（不再额外读取输出文件）
+  %(prog)s -i encrypted.mp4 -d 2136343393 -o decrypted.mp4 --hash sha256 --verify md5:a4087c1f46961fc4165c67c508ce0506
+
+  # 使用任务账本：中断后重新运行只处理未完成或已变化的任务
+  %(prog)s --batch manifest.jsonl --jobs 8 -o decrypted/ --ledger decrypted/ledger.db
+
+  # 流水线执行：密钥流生成、下载、解密分阶段并发，吞吐取决于最慢的资源
+  %(prog)s --response responses/ --download -o decrypted/ --executor pipeline --stage-workers 1,8,2
+
+  # 内容去重：同一视频每次抓取的 url / decode_key 都不同，输出库按明文内容只保存一份
+  %(prog)s --response responses/ --download -o decrypted/ --store decrypted/.store
+
+  # 输出各阶段耗时（判断瓶颈在磁盘、CPU 还是密钥流生成）；监视模式持续更新 Prometheus 指标文件
+  %(prog)s --batch manifest.jsonl --jobs 8 -o decrypted/ -q --metrics json
+  %(prog)s --watch downloads/ -d 2136343393 --metrics prometheus --metrics-file /var/lib/node_exporter/wx_decrypt.prom
+
+  # 配对模式：视频与 decode_key 对不上时，按文件头从密钥池中找出正确的密钥（不做完整解密）
+  %(prog)s --match downloads/ --keys responses/ old_keys.key --manifest matched.jsonl
+  %(prog)s --match downloads/ --keys responses/ -o decrypted/ -j 8
+
+  # 检查模式：并行检查输出目录中所有视频的 box 结构（截断、moov 损坏等），只读取 box 头部
+  %(prog)s --audit decrypted/ -j 16
+
+  # 监视模式：自动解密投放目录中的新视频（旁路文件 video.json / video.key / video.ksb 提供密钥）
+  %(prog)s --watch spool/ -o decrypted/ --jobs 4
+
+  # 流媒体服务：播放器直接打开 http://127.0.0.1:8000/video/<文件名>，边播边解密，可拖动进度
+  %(prog)s --serve archive/ --port 8000
+
   # 静默模式
   %(prog)s -i encrypted.mp4 -k keystream.txt -o decrypted.mp4 -q
 
@@ -333,7 +1648,7 @@ def main():
 
     parser.add_argument(
         '-o', '--output',
-        help='输出文件路径（默认: wx_decrypted.mp4）'
+        help='输出文件路径（默认: wx_decrypted.mp4；为 - 时边解密边写到标准输出）'
     )
 
     parser.add_argument(
@@ -346,6 +1661,294 @@ def main():
         help='直接提供十六进制密钥流字符串'
     )
 
+    parser.add_argument(
+        '-d', '--decode-key',
+        help='直接提供 decode_key，使用内置 Isaac64 生成密钥流（无需浏览器）'
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        help='密钥流缓存目录（默认: ~/.cache/wechat-video-decrypt/keystreams，'
+             '也可用环境变量 WX_KEYSTREAM_CACHE_DIR 指定）'
+    )
+
+    parser.add_argument(
+        '--cache-size',
+        type=float,
+        help='密钥流缓存容量上限，单位 MB（默认: 64，超出后按 LRU 淘汰）'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='不读写密钥流缓存'
+    )
+
+    parser.add_argument(
+        '--in-place',
+        action='store_true',
+        help='原地解密：直接修改输入文件的文件头（提供 -o 时解密后重命名为该路径）'
+    )
+
+    parser.add_argument(
+        '--faststart',
+        action='store_true',
+        help='moov 位于 mdat 之后时，在解密的同一次写入中把 moov 移到前面（修正 stco/co64 偏移），'
+             '网页播放器无需先下载文件末尾即可开始播放（不适用于 --in-place 和边下载边解密）'
+    )
+
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'复制未加密部分（或下载时每次读取）的块大小，单位字节（默认: {DEFAULT_CHUNK_SIZE}）'
+    )
+
+    parser.add_argument(
+        '--xor-backend',
+        choices=['auto'] + sorted(XOR_BACKENDS),
+        help=f'XOR 运算后端（默认自动选择，当前: {XOR_BACKEND}）'
+    )
+
+    parser.add_argument(
+        '--url',
+        help='边下载边解密：视频地址（API 响应中的 url），明文直接写入 -o，不保存加密文件'
+    )
+
+    parser.add_argument(
+        '--url-token',
+        help='与 --url 一起使用：API 响应中的 url_token（追加在 url 之后）'
+    )
+
+    parser.add_argument(
+        '--download',
+        action='store_true',
+        help='响应模式下直接从响应中的 url 边下载边解密（此时无需 -i）'
+    )
+
+    parser.add_argument(
+        '--variant',
+        metavar='auto|original|smallest|FORMAT',
+        help='响应模式下载的版本：auto 符合预算的最高画质、original 原始文件（默认）、smallest 符合预算的最小版本，'
+             '或 spec 中的 file_format（如 xWT111）'
+    )
+
+    parser.add_argument(
+        '--max-size',
+        type=float,
+        metavar='MB',
+        help='下载版本的单个视频大小上限，单位 MB（按 spec 的 bit_rate × 时长估算）'
+    )
+
+    parser.add_argument(
+        '--max-bitrate',
+        type=int,
+        metavar='KBPS',
+        help='下载版本的码率上限，单位 kbps'
+    )
+
+    parser.add_argument(
+        '--codec',
+        help='只下载该编码的版本（spec 中的 coding_format，如 h264 / h265）'
+    )
+
+    parser.add_argument(
+        '--budget',
+        type=float,
+        metavar='MB',
+        help='整批下载量上限，单位 MB：超出时从最大的视频开始逐级换成更小的版本，仍超出时放弃末尾的任务'
+    )
+
+    parser.add_argument(
+        '--bandwidth',
+        type=float,
+        default=DEFAULT_BANDWIDTH_MBPS,
+        metavar='MB/S',
+        help=f'估算下载耗时使用的带宽，单位 MB/s（默认: {DEFAULT_BANDWIDTH_MBPS:g}）'
+    )
+
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='响应模式下只输出每个视频选中的版本和整批的下载量、耗时估算，不下载也不解密'
+    )
+
+    parser.add_argument(
+        '--hash',
+        action='append',
+        metavar='ALGO',
+        help=f'解密时顺带计算摘要（可重复，可用: {", ".join(HASH_ALGORITHMS)}），无需再次读取输出文件'
+    )
+
+    parser.add_argument(
+        '--verify',
+        action='append',
+        metavar='[ALGO:]HEX',
+        help='校验预期摘要（可重复；只给十六进制时按长度推断算法），不匹配时视为失败'
+    )
+
+    parser.add_argument(
+        '--digest-of',
+        choices=DIGEST_SOURCES,
+        help='摘要对象：output 解密结果（默认）、input 加密文件、both 两者（任一匹配即通过；'
+             '响应模式下 API 的 md5sum 默认按 both 校验）'
+    )
+
+    parser.add_argument(
+        '--batch',
+        metavar='MANIFEST',
+        help='批量模式：清单文件（.jsonl 或 .csv），此时 -o 表示默认输出目录'
+    )
+
+    parser.add_argument(
+        '--response',
+        metavar='FILE|DIR',
+        help='读取 fetch_video_detail API 响应（单个文件、目录或多个响应的 JSON/JSONL 转储），'
+             '此时 -i 为加密视频文件或所在目录（默认: 响应文件所在目录下的 <feed_id>.mp4），-o 为输出目录'
+    )
+
+    parser.add_argument(
+        '--match',
+        nargs='+',
+        metavar='FILE|DIR',
+        help='配对模式：为这些加密视频从密钥池（--keys 与 -k/-H/-d）中找出对应的密钥，'
+             '给出 -o 时直接解密到该目录'
+    )
+
+    parser.add_argument(
+        '--keys',
+        nargs='+',
+        metavar='FILE|DIR',
+        help='配对模式的密钥池：API 响应（.json/.jsonl）、密钥流文件（.ksb/.keystream.txt）、'
+             '.key 文件（每行一个 decode_key）或包含它们的目录'
+    )
+
+    parser.add_argument(
+        '--manifest',
+        metavar='FILE',
+        help='配对模式下将配对成功的任务写为 JSONL 清单（可用 --batch 执行）'
+    )
+
+    parser.add_argument(
+        '--audit',
+        nargs='+',
+        metavar='FILE|DIR',
+        help='检查模式：并行检查已解密视频的 MP4 box 结构（ftyp/moov/mdat、box 大小与文件大小），'
+             '报告吞吐量和所有异常文件'
+    )
+
+    parser.add_argument(
+        '--ledger',
+        metavar='DB',
+        help='批量/响应模式的任务账本（SQLite）：记录已完成的任务，重新运行时跳过未变化的输入；'
+             '多个进程或共享文件系统的多台主机可以同时使用同一个账本'
+    )
+
+    parser.add_argument(
+        '--store',
+        metavar='DIR',
+        help='批量/响应模式的内容寻址输出库：按明文 SHA-256 只保存一份内容，重复的输出改为链接；'
+             'feed_id 或 md5sum 已登记的视频直接链接，不再下载和解密（库目录应与输出目录在同一文件系统）'
+    )
+
+    parser.add_argument(
+        '--store-link',
+        choices=LINK_MODES,
+        default='hardlink',
+        help='输出库的链接方式：hardlink 硬链接（默认）、reflink 写时复制克隆、copy 复制；不支持时自动退回'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        help='批量/响应/检查模式的并发数（默认: CPU 核数）'
+    )
+
+    parser.add_argument(
+        '--executor',
+        choices=['process', 'thread', 'pipeline'],
+        default='process',
+        help='批量/响应/检查模式使用进程池或线程池（默认: process）；pipeline 为三段流水线（密钥流、下载、解密各自并发，'
+             '阶段之间有界队列背压，结束时报告各阶段利用率），检查模式下等同 thread'
+    )
+
+    parser.add_argument(
+        '--stage-workers',
+        metavar='K,F,D',
+        help='流水线各阶段（keystream,fetch,decrypt）的并发数（默认: 1,<-j 或 4>,2）'
+    )
+
+    parser.add_argument(
+        '--stage-queue',
+        metavar='K,F,D',
+        help='流水线各阶段输入队列的容量，队列满时上游阶段等待（默认: 各阶段并发数的 2 倍）'
+    )
+
+    parser.add_argument(
+        '--watch',
+        metavar='DIR',
+        help='监视模式：持续监视目录，自动解密新写入的视频（此时 -o 表示输出目录，默认 DIR_decrypted）'
+    )
+
+    parser.add_argument(
+        '--serve',
+        metavar='DIR',
+        help='流媒体服务模式：通过 HTTP 提供 DIR 中视频的实时解密播放（GET /video/<id>，支持 Range）'
+    )
+
+    parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='流媒体服务监听地址（默认: 127.0.0.1）'
+    )
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=8000,
+        help='流媒体服务端口（默认: 8000）'
+    )
+
+    parser.add_argument(
+        '--archive-dir',
+        help='监视模式下，解密成功后将加密文件及旁路文件移动到该目录'
+    )
+
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=16,
+        help='监视模式的待解密队列上限（默认: 16）'
+    )
+
+    parser.add_argument(
+        '--watch-backend',
+        choices=['auto', 'inotify', 'poll'],
+        default='auto',
+        help='监视方式（默认: auto，Linux 使用 inotify，其他平台轮询）'
+    )
+
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=1.0,
+        help='监视模式的轮询间隔，单位秒（默认: 1.0）'
+    )
+
+    parser.add_argument(
+        '--metrics',
+        choices=METRICS_FORMATS,
+        help='输出各阶段（keystream/read/xor/write/fsync/verify）耗时与字节数：单文件、批量、响应、配对模式在结束时输出，'
+             '监视模式在退出时输出（多个文件汇总为直方图）'
+    )
+
+    parser.add_argument(
+        '--metrics-file',
+        metavar='PATH',
+        help='将 --metrics 写入文件而不是标准输出（原子替换）；监视模式每完成一个任务更新一次，'
+             '可供 node_exporter 的 textfile 收集器读取'
+    )
+
     parser.add_argument(
         '-q', '--quiet',
         action='store_true',
@@ -360,18 +1963,75 @@ def main():
 
     args = parser.parse_args()
 
+    if args.faststart and args.in_place:
+        parser.error("--faststart 不能与 --in-place 同时使用（移动 moov 需要写出新文件）")
+    if args.metrics_file and not args.metrics:
+        parser.error("--metrics-file 需要同时指定 --metrics json|prometheus")
+    if args.faststart and (args.url or args.download):
+        parser.error("--faststart 不适用于边下载边解密（moov 在文件末尾，需要先收到整个文件）")
+    if (args.stage_workers or args.stage_queue) and args.executor != 'pipeline':
+        parser.error("--stage-workers / --stage-queue 需要同时指定 --executor pipeline")
+    if args.executor == 'pipeline':
+        from pipeline import parse_stage_values
+        try:
+            args.stage_workers = parse_stage_values(args.stage_workers) if args.stage_workers else None
+            args.stage_queue = parse_stage_values(args.stage_queue) if args.stage_queue else None
+        except ValueError as e:
+            parser.error(f"--stage-workers / --stage-queue: {e}")
+    if _variant_requested(args) and not args.response:
+        parser.error("--variant / --max-size / --max-bitrate / --codec / --budget / --plan 只适用于响应模式（--response）")
+    if _variant_requested(args) and not (args.download or args.plan):
+        parser.error("选择下载版本需要同时指定 --download（或用 --plan 只查看规划）")
+
+    if args.batch:
+        batch_mode(args)
+        return
+
+    if args.response:
+        response_mode(args)
+        return
+
+    if args.match:
+        match_mode(args)
+        return
+
+    if args.audit:
+        audit_mode(args)
+        return
+
+    if args.url:
+        if not args.keystream_file and not args.keystream_hex and not args.decode_key:
+            parser.error("--url 需要同时提供 -k / -H / -d 之一")
+        url_mode(args)
+        return
+
+    if args.watch:
+        watch_mode(args)
+        return
+
+    if args.serve:
+        serve_mode(args)
+        return
+
     # 如果没有提供任何参数，进入交互模式
-    if not args.input and not args.keystream_file and not args.keystream_hex:
+    if not args.input and not args.keystream_file and not args.keystream_hex and not args.decode_key:
         interactive_mode()
     else:
         # 验证必要参数
         if not args.input:
             parser.error("请提供加密视频文件路径 (-i/--input)")
 
-        if not args.keystream_file and not args.keystream_hex:
-            parser.error("请提供密钥流文件 (-k/--keystream-file) 或十六进制字符串 (-H/--keystream-hex)")
+        if not args.keystream_file and not args.keystream_hex and not args.decode_key:
+            parser.error("请提供密钥流文件 (-k/--keystream-file)、十六进制字符串 (-H/--keystream-hex) "
+                         "或 decode_key (-d/--decode-key)")
 
-        if not args.output:
+        if args.output == '-':
+            if args.in_place:
+                parser.error("-o - 不能与 --in-place 同时使用")
+            stdout_mode(args)
+            return
+
+        if not args.output and not args.in_place:
             args.output = "wx_decrypted.mp4"
             if not args.quiet:
                 print(f"ℹ️  未指定输出文件，使用默认: {args.output}")
@@ -380,6 +2040,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # 让批量等模块 import 到的就是当前模块，而不是再加载一份
+    sys.modules.setdefault('decrypt_wechat_video_cli', sys.modules[__name__])
     try:
         main()
     except KeyboardInterrupt:
@@ -7,8 +7,10 @@ Author: Evil0ctal
 GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
 """
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
+from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 import threading
+import queue
+import collections
 import os
 import sys
 from pathlib import Path
@@ -17,8 +19,38 @@ from pathlib import Path
 from decrypt_wechat_video_cli import (
     read_keystream_from_file,
     read_keystream_from_string,
+    read_keystream_from_decode_key,
     decrypt_video
 )
+from keystream_library import KeystreamLibrary, describe_entry
+
+# 工作线程不直接操作 Tk 组件，界面更新都放入消息队列，由主线程定时取出处理
+UI_POLL_MS = 50
+UI_MAX_MESSAGES = 500      # 每次最多处理的消息数，避免一次占用主线程太久
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+MAX_WORKERS = 16
+
+
+class DecryptJob:
+    """队列中的一个解密任务"""
+
+    PENDING = '等待中'
+    RUNNING = '解密中'
+    DONE = '完成'
+    FAILED = '失败'
+
+    def __init__(self, job_id, input_file, output_file, keystream):
+        self.job_id = job_id
+        self.input_file = input_file
+        self.output_file = output_file
+        self.keystream = keystream
+        self.status = self.PENDING
+        self.percent = 0
+        self.row = None  # (frame, 进度条, 状态标签)
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
 
 
 class DecryptionGUI:
@@ -27,7 +59,7 @@ class DecryptionGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("微信视频号解密工具")
-        self.root.geometry("800x700")
+        self.root.geometry("860x940")
         self.root.resizable(True, True)
 
         # 设置应用图标（如果有的话）
@@ -42,13 +74,31 @@ class DecryptionGUI:
         self.encrypted_file_var = tk.StringVar(value="wx_encrypted.mp4")
         self.output_file_var = tk.StringVar(value="wx_decrypted.mp4")
         self.keystream_data = None
-        self.is_decrypting = False
+        self.keystream_decode_key = None  # 当前密钥流对应的 decode_key（已知时）
+        self.keystream_token = 0          # 只采用最近一次加载请求的结果
+        self.decode_key_var = tk.StringVar(value="")
+        self.library = KeystreamLibrary()
+        self.library_entries = []
+        self.workers_var = tk.IntVar(value=DEFAULT_WORKERS)
+        self.output_dir_var = tk.StringVar(value="")
+
+        # 任务队列（只在主线程中访问）
+        self.ui_queue = queue.Queue()
+        self.jobs = []
+        self.pending = collections.deque()
+        self.running = 0
+        self.next_job_id = 1
+        self.run_stats = {'total': 0, 'succeeded': 0, 'failed': 0}
+        self.last_output_file = None
 
         # 创建 UI
         self.create_widgets()
+        self.root.after(UI_POLL_MS, self.process_ui_queue)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        # 检查默认密钥流文件
+        # 检查默认密钥流文件，并在后台读取密钥流库索引
         self.check_default_keystream()
+        self.refresh_library()
 
     def create_widgets(self):
         """创建界面组件"""
@@ -97,11 +147,12 @@ class DecryptionGUI:
         ttk.Label(main_frame, text="或粘贴密钥流:", font=("Arial", 11)).grid(
             row=row, column=0, sticky=tk.W, pady=5
         )
+        # 256 KB 的十六进制是一个超长“单词”，按字符换行避免 Tk 逐词排版造成卡顿
         self.hex_input = scrolledtext.ScrolledText(
             main_frame,
             height=3,
             width=50,
-            wrap=tk.WORD,
+            wrap=tk.CHAR,
             font=("Courier", 9)
         )
         self.hex_input.grid(row=row, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=5, padx=5)
@@ -111,7 +162,40 @@ class DecryptionGUI:
             main_frame,
             text="从文本加载密钥流",
             command=self.load_keystream_from_text
-        ).grid(row=row, column=1, sticky=tk.W, pady=(0, 15))
+        ).grid(row=row, column=1, sticky=tk.W, pady=(0, 10))
+
+        # 或者由 decode_key 生成（内置 Isaac64），生成后自动加入密钥库
+        row += 1
+        ttk.Label(main_frame, text="或 decode_key:", font=("Arial", 11)).grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        ttk.Entry(main_frame, textvariable=self.decode_key_var, width=50).grid(
+            row=row, column=1, sticky=(tk.W, tk.E), pady=5, padx=5
+        )
+        ttk.Button(main_frame, text="生成密钥流", command=self.load_keystream_from_decode_key).grid(
+            row=row, column=2, pady=5
+        )
+
+        # 密钥库：按 decode_key 列出已保存的密钥流，双击即可切换
+        row += 1
+        ttk.Label(main_frame, text="密钥库:", font=("Arial", 11)).grid(
+            row=row, column=0, sticky=(tk.W, tk.N), pady=5
+        )
+        library_frame = ttk.Frame(main_frame)
+        library_frame.grid(row=row, column=1, sticky=(tk.W, tk.E), pady=5, padx=5)
+        library_frame.columnconfigure(0, weight=1)
+        self.library_listbox = tk.Listbox(library_frame, height=4, font=("Courier", 9), exportselection=False)
+        library_scrollbar = ttk.Scrollbar(library_frame, orient=tk.VERTICAL, command=self.library_listbox.yview)
+        self.library_listbox.configure(yscrollcommand=library_scrollbar.set)
+        self.library_listbox.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        library_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.library_listbox.bind("<Double-Button-1>", lambda e: self.use_library_entry())
+
+        library_buttons = ttk.Frame(main_frame)
+        library_buttons.grid(row=row, column=2, sticky=tk.N, pady=5)
+        ttk.Button(library_buttons, text="使用所选", command=self.use_library_entry).pack(fill=tk.X)
+        ttk.Button(library_buttons, text="加入当前", command=self.add_to_library).pack(fill=tk.X, pady=2)
+        ttk.Button(library_buttons, text="删除", command=self.remove_library_entry).pack(fill=tk.X)
 
         # 分隔线
         row += 1
@@ -178,6 +262,45 @@ class DecryptionGUI:
             width=15
         ).grid(row=0, column=2, padx=5)
 
+        # 任务队列
+        row += 1
+        ttk.Label(main_frame, text="任务队列:", font=("Arial", 11)).grid(
+            row=row, column=0, sticky=tk.W, pady=(10, 5)
+        )
+        queue_controls = ttk.Frame(main_frame)
+        queue_controls.grid(row=row, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 5))
+        ttk.Button(queue_controls, text="➕ 添加文件", command=self.add_files).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(queue_controls, text="📁 输出目录", command=self.browse_output_dir).pack(side=tk.LEFT, padx=5)
+        ttk.Button(queue_controls, text="🧹 清除已完成", command=self.clear_finished).pack(side=tk.LEFT, padx=5)
+        ttk.Label(queue_controls, text="并发数:").pack(side=tk.LEFT, padx=(15, 2))
+        ttk.Spinbox(
+            queue_controls, from_=1, to=MAX_WORKERS, textvariable=self.workers_var, width=4,
+            command=self.dispatch_jobs
+        ).pack(side=tk.LEFT)
+        self.queue_summary_label = ttk.Label(queue_controls, text="", foreground="gray")
+        self.queue_summary_label.pack(side=tk.LEFT, padx=10)
+
+        row += 1
+        list_frame = ttk.Frame(main_frame, relief=tk.SUNKEN, borderwidth=1)
+        list_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        list_frame.columnconfigure(0, weight=1)
+        self.queue_canvas = tk.Canvas(list_frame, height=160, highlightthickness=0)
+        queue_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.queue_canvas.yview)
+        self.queue_canvas.configure(yscrollcommand=queue_scrollbar.set)
+        self.queue_canvas.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        queue_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.queue_inner = ttk.Frame(self.queue_canvas)
+        self.queue_inner.columnconfigure(0, weight=1)
+        queue_window = self.queue_canvas.create_window((0, 0), window=self.queue_inner, anchor=tk.NW)
+        self.queue_inner.bind(
+            "<Configure>",
+            lambda e: self.queue_canvas.configure(scrollregion=self.queue_canvas.bbox("all"))
+        )
+        self.queue_canvas.bind(
+            "<Configure>",
+            lambda e: self.queue_canvas.itemconfigure(queue_window, width=e.width)
+        )
+
         # 日志输出区域
         row += 1
         ttk.Label(main_frame, text="操作日志:", font=("Arial", 11)).grid(
@@ -226,8 +349,39 @@ class DecryptionGUI:
         self.log("作者: Evil0ctal", "info")
         self.log("项目地址: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption\n", "info")
 
+    def post(self, kind, *args):
+        """从任意线程提交界面更新，由主线程在 process_ui_queue 中执行"""
+        self.ui_queue.put((kind, args))
+
+    def process_ui_queue(self):
+        """主线程定时取出界面消息并执行"""
+        handlers = {
+            'log': self.log,
+            'status': self.update_status,
+            'started': self.on_job_started,
+            'progress': self.on_job_progress,
+            'finished': self.on_job_finished,
+            'keystream': self.on_keystream_loaded,
+            'library': self.on_library_loaded,
+        }
+        try:
+            for _ in range(UI_MAX_MESSAGES):
+                kind, args = self.ui_queue.get_nowait()
+                handlers[kind](*args)
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(UI_POLL_MS, self.process_ui_queue)
+
+    @staticmethod
+    def _on_main_thread():
+        return threading.current_thread() is threading.main_thread()
+
     def log(self, message, tag=None):
-        """添加日志"""
+        """添加日志（可在任意线程中调用）"""
+        if not self._on_main_thread():
+            self.post('log', message, tag)
+            return
         self.log_text.config(state=tk.NORMAL)
         if tag:
             self.log_text.insert(tk.END, message + "\n", tag)
@@ -235,30 +389,71 @@ class DecryptionGUI:
             self.log_text.insert(tk.END, message + "\n")
         self.log_text.see(tk.END)
         self.log_text.config(state=tk.DISABLED)
-        self.root.update_idletasks()
 
     def update_status(self, message):
-        """更新状态栏"""
+        """更新状态栏（可在任意线程中调用）"""
+        if not self._on_main_thread():
+            self.post('status', message)
+            return
         self.status_label.config(text=message)
-        self.root.update_idletasks()
+
+    def load_keystream_async(self, description, loader, decode_key=None, on_loaded=None):
+        """
+        在后台线程中加载并校验密钥流，完成后由主线程更新界面
+
+        Args:
+            description: 日志中的来源描述
+            loader: 在工作线程中调用，返回密钥流（失败返回 None 或抛出异常）
+            decode_key: 密钥流对应的 decode_key（已知时）
+            on_loaded: 加载成功后在工作线程中调用 on_loaded(keystream)（如写入文件、加入密钥库）
+        """
+        self.keystream_token += 1
+        token = self.keystream_token
+        self.keystream_status_label.config(text=f"⏳ 正在加载密钥流（{description}）...", foreground="gray")
+
+        def worker():
+            keystream, error = None, None
+            try:
+                keystream = loader()
+                if not keystream:
+                    error = "密钥流格式错误"
+                elif on_loaded:
+                    on_loaded(keystream)
+            except Exception as e:
+                error = str(e)
+            self.post('keystream', token, description, keystream, decode_key, error)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_keystream_loaded(self, token, description, keystream, decode_key, error):
+        if token != self.keystream_token:
+            return  # 已被之后的加载请求取代
+        if keystream and not error:
+            self.keystream_data = keystream
+            self.keystream_decode_key = decode_key
+            size_kb = len(keystream) / 1024
+            self.keystream_status_label.config(
+                text=f"✅ 已加载密钥流 ({size_kb:.2f} KB)" + (f"  decode_key: {decode_key}" if decode_key else ""),
+                foreground="green"
+            )
+            self.log(f"✅ 加载密钥流: {description} ({size_kb:.2f} KB)", "success")
+            if len(keystream) != 131072:
+                self.log(f"⚠️  警告: 密钥流大小不是标准的 131072 bytes", "warning")
+        else:
+            self.keystream_status_label.config(
+                text=f"❌ {error or '密钥流格式错误'}",
+                foreground="red"
+            )
+            self.log(f"❌ 加载密钥流失败: {description}: {error}", "error")
 
     def check_default_keystream(self):
         """检查默认密钥流文件"""
         keystream_file = self.keystream_file_var.get()
         if os.path.exists(keystream_file):
-            self.keystream_data = read_keystream_from_file(keystream_file, verbose=False)
-            if self.keystream_data:
-                size_kb = len(self.keystream_data) / 1024
-                self.keystream_status_label.config(
-                    text=f"✅ 已加载密钥流 ({size_kb:.2f} KB)",
-                    foreground="green"
-                )
-                self.log(f"✅ 自动加载密钥流文件: {keystream_file}", "success")
-            else:
-                self.keystream_status_label.config(
-                    text="❌ 密钥流文件格式错误",
-                    foreground="red"
-                )
+            self.load_keystream_async(
+                f"自动加载 {keystream_file}",
+                lambda: read_keystream_from_file(keystream_file, verbose=False)
+            )
         else:
             self.keystream_status_label.config(
                 text="⚠️ 未找到默认密钥流文件",
@@ -269,52 +464,122 @@ class DecryptionGUI:
         """选择密钥流文件"""
         filename = filedialog.askopenfilename(
             title="选择密钥流文件",
-            filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")]
+            filetypes=[("文本文件", "*.txt"), ("二进制密钥流", "*.ksb"), ("所有文件", "*.*")]
         )
         if filename:
             self.keystream_file_var.set(filename)
-            self.keystream_data = read_keystream_from_file(filename, verbose=False)
-            if self.keystream_data:
-                size_kb = len(self.keystream_data) / 1024
-                self.keystream_status_label.config(
-                    text=f"✅ 已加载密钥流 ({size_kb:.2f} KB)",
-                    foreground="green"
-                )
-                self.log(f"✅ 加载密钥流文件: {filename}", "success")
-            else:
-                self.keystream_status_label.config(
-                    text="❌ 密钥流文件格式错误",
-                    foreground="red"
-                )
-                self.log(f"❌ 加载密钥流失败: {filename}", "error")
+            self.load_keystream_async(filename, lambda: read_keystream_from_file(filename, verbose=False))
 
     def load_keystream_from_text(self):
-        """从文本框加载密钥流"""
+        """从文本框加载密钥流（解析与保存在后台线程中进行）"""
         hex_string = self.hex_input.get("1.0", tk.END).strip()
         if not hex_string:
             messagebox.showwarning("警告", "请粘贴十六进制密钥流！")
             return
 
-        self.keystream_data = read_keystream_from_string(hex_string, verbose=False)
-        if self.keystream_data:
-            size_kb = len(self.keystream_data) / 1024
-            self.keystream_status_label.config(
-                text=f"✅ 已加载密钥流 ({size_kb:.2f} KB)",
-                foreground="green"
-            )
-            self.log(f"✅ 从文本加载密钥流成功 ({size_kb:.2f} KB)", "success")
-
+        def save(keystream):
             # 保存到文件
             save_file = "keystream_131072_bytes.txt"
             with open(save_file, 'w') as f:
                 f.write(hex_string)
             self.log(f"✅ 密钥流已保存到: {save_file}", "info")
-        else:
-            self.keystream_status_label.config(
-                text="❌ 密钥流格式错误",
-                foreground="red"
-            )
-            self.log("❌ 密钥流格式错误，请检查输入", "error")
+
+        self.load_keystream_async(
+            "文本框",
+            lambda: read_keystream_from_string(hex_string, verbose=False),
+            on_loaded=save
+        )
+
+    def load_keystream_from_decode_key(self):
+        """由 decode_key 生成密钥流，并加入密钥库"""
+        decode_key = self.decode_key_var.get().strip()
+        if not decode_key:
+            messagebox.showwarning("警告", "请输入 decode_key！")
+            return
+
+        def remember(keystream):
+            try:
+                self.library.add(keystream, decode_key)
+            except (OSError, ValueError) as e:
+                self.log(f"⚠️  无法加入密钥库: {e}", "warning")
+                return
+            self.post('library', self.library.entries())
+
+        self.load_keystream_async(
+            f"decode_key {decode_key}",
+            lambda: read_keystream_from_decode_key(decode_key, verbose=False),
+            decode_key=decode_key,
+            on_loaded=remember
+        )
+
+    def refresh_library(self):
+        """在后台读取密钥库索引（不读取任何密钥流数据）"""
+        threading.Thread(target=lambda: self.post('library', self.library.entries()), daemon=True).start()
+
+    def on_library_loaded(self, entries):
+        self.library_entries = entries
+        self.library_listbox.delete(0, tk.END)
+        for entry in entries:
+            self.library_listbox.insert(tk.END, describe_entry(entry))
+
+    def _selected_library_entry(self):
+        selection = self.library_listbox.curselection()
+        if not selection or selection[0] >= len(self.library_entries):
+            messagebox.showwarning("警告", "请先在密钥库中选择一个条目！")
+            return None
+        return self.library_entries[selection[0]]
+
+    def use_library_entry(self):
+        """切换到密钥库中选中的密钥流"""
+        entry = self._selected_library_entry()
+        if entry is None:
+            return
+        self.load_keystream_async(
+            f"密钥库 {entry['id']}",
+            lambda: self.library.load(entry['id']),
+            decode_key=entry.get('decode_key')
+        )
+        if entry.get('decode_key'):
+            self.decode_key_var.set(entry['decode_key'])
+
+    def add_to_library(self):
+        """将当前密钥流加入密钥库（decode_key 与密钥流一致时只保存 decode_key）"""
+        if not self.keystream_data:
+            messagebox.showerror("错误", "请先加载密钥流文件或粘贴密钥流！")
+            return
+        decode_key = self.keystream_decode_key or self.decode_key_var.get().strip() or None
+        label = simpledialog.askstring(
+            "加入密钥库",
+            f"decode_key: {decode_key or '（未知）'}\n备注（可留空，如视频标题）:",
+            parent=self.root
+        )
+        if label is None:
+            return
+        keystream = self.keystream_data
+
+        def worker():
+            try:
+                entry = self.library.add(keystream, decode_key, label.strip())
+            except (OSError, ValueError) as e:
+                self.log(f"❌ 加入密钥库失败: {e}", "error")
+                return
+            self.log(f"📚 已加入密钥库: {describe_entry(entry)}", "success")
+            self.post('library', self.library.entries())
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def remove_library_entry(self):
+        """从密钥库删除选中的条目"""
+        entry = self._selected_library_entry()
+        if entry is None or not messagebox.askyesno("确认删除", f"从密钥库删除 {entry['id']}？"):
+            return
+
+        def worker():
+            self.library.remove(entry['id'])
+            self.log(f"🗑️  已从密钥库删除: {entry['id']}", "info")
+            self.post('library', self.library.entries())
+
+        threading.Thread(target=worker, daemon=True).start()
 
     def browse_encrypted(self):
         """选择加密文件"""
@@ -337,12 +602,38 @@ class DecryptionGUI:
             self.output_file_var.set(filename)
             self.log(f"✅ 输出文件: {filename}", "info")
 
-    def start_decryption(self):
-        """开始解密（在线程中执行）"""
-        if self.is_decrypting:
-            messagebox.showwarning("警告", "正在解密中，请等待...")
+    def browse_output_dir(self):
+        """选择批量任务的输出目录"""
+        directory = filedialog.askdirectory(title="选择输出目录")
+        if directory:
+            self.output_dir_var.set(directory)
+            self.log(f"✅ 输出目录: {directory}", "info")
+
+    def add_files(self):
+        """添加多个加密文件到任务队列（输出为 <文件名>_decrypted.mp4）"""
+        from batch_runner import default_output_path
+
+        if not self.keystream_data:
+            messagebox.showerror("错误", "请先加载密钥流文件或粘贴密钥流！")
             return
+        filenames = filedialog.askopenfilenames(
+            title="选择加密视频文件（可多选）",
+            filetypes=[("MP4 视频", "*.mp4"), ("所有文件", "*.*")]
+        )
+        output_dir = self.output_dir_var.get() or None
+        queued = {job.input_file for job in self.jobs if not job.finished}
+        added = 0
+        for filename in filenames:
+            if filename in queued:
+                continue
+            self.enqueue(filename, default_output_path(filename, output_dir))
+            added += 1
+        if added:
+            self.log(f"➕ 已添加 {added} 个文件到任务队列", "info")
+            self.dispatch_jobs()
 
+    def start_decryption(self):
+        """将当前选择的文件加入任务队列并开始解密"""
         # 验证输入
         if not self.keystream_data:
             messagebox.showerror("错误", "请先加载密钥流文件或粘贴密钥流！")
@@ -358,96 +649,175 @@ class DecryptionGUI:
             messagebox.showerror("错误", "请指定输出文件名！")
             return
 
-        # 禁用按钮
-        self.decrypt_button.config(state=tk.DISABLED)
-        self.is_decrypting = True
-
-        # 在新线程中执行解密
-        thread = threading.Thread(target=self.decrypt_worker, args=(encrypted_file, output_file))
-        thread.daemon = True
-        thread.start()
+        if any(job.output_file == output_file and not job.finished for job in self.jobs):
+            messagebox.showwarning("警告", "该输出文件已在队列中，请等待...")
+            return
 
-    def decrypt_worker(self, encrypted_file, output_file):
-        """解密工作线程"""
+        if len(self.keystream_data) != 131072:
+            self.log(f"⚠️  警告: 密钥流大小不是标准的 131072 bytes", "warning")
+        self.enqueue(encrypted_file, output_file)
+        self.dispatch_jobs()
+
+    def enqueue(self, input_file, output_file):
+        """创建任务及其进度行（任务使用入队时的密钥流）"""
+        if self.running == 0 and not self.pending:
+            self.run_stats = {'total': 0, 'succeeded': 0, 'failed': 0}
+        job = DecryptJob(self.next_job_id, input_file, output_file, self.keystream_data)
+        self.next_job_id += 1
+
+        frame = ttk.Frame(self.queue_inner)
+        frame.grid(row=job.job_id, column=0, sticky=(tk.W, tk.E), padx=5, pady=1)
+        frame.columnconfigure(0, weight=1)
+        ttk.Label(frame, text=os.path.basename(input_file), width=40, anchor=tk.W).grid(
+            row=0, column=0, sticky=(tk.W, tk.E)
+        )
+        progress = ttk.Progressbar(frame, length=260, maximum=100, mode='determinate')
+        progress.grid(row=0, column=1, padx=5)
+        status = ttk.Label(frame, text=job.status, width=10, foreground="gray")
+        status.grid(row=0, column=2)
+        job.row = (frame, progress, status)
+
+        self.jobs.append(job)
+        self.pending.append(job)
+        self.run_stats['total'] += 1
+        self.update_queue_summary()
+        return job
+
+    def dispatch_jobs(self):
+        """按并发数启动等待中的任务（只在主线程中调用）"""
         try:
-            self.log("\n" + "=" * 70, "info")
-            self.log("🚀 开始解密...", "info")
-            self.log("=" * 70 + "\n", "info")
-            self.update_status("正在解密...")
-
-            # 验证密钥流大小
-            keystream_size = len(self.keystream_data)
-            self.log(f"📊 密钥流大小: {keystream_size:,} bytes ({keystream_size / 1024:.2f} KB)", "info")
-
-            if keystream_size != 131072:
-                self.log(f"⚠️  警告: 密钥流大小不是标准的 131072 bytes", "warning")
-
-            # 文件信息
-            file_size = os.path.getsize(encrypted_file)
-            self.log(f"📁 加密文件: {encrypted_file}", "info")
-            self.log(f"📊 文件大小: {file_size:,} bytes ({file_size / 1024 / 1024:.2f} MB)", "info")
-            self.log(f"💾 输出文件: {output_file}\n", "info")
-
-            # 调用 CLI 模块的解密函数
-            self.log("🔓 开始 XOR 解密...", "info")
-            success = decrypt_video(
-                encrypted_file,
-                self.keystream_data,
-                output_file,
-                verbose=False  # 我们自己处理日志输出
+            workers = max(1, min(MAX_WORKERS, int(self.workers_var.get())))
+        except (tk.TclError, ValueError):
+            workers = DEFAULT_WORKERS
+        while self.pending and self.running < workers:
+            job = self.pending.popleft()
+            job.status = DecryptJob.RUNNING
+            self.running += 1
+            threading.Thread(target=self.decrypt_worker, args=(job,), daemon=True).start()
+        self.update_queue_summary()
+
+    def decrypt_worker(self, job):
+        """解密工作线程：不直接访问 Tk 组件，只通过 post 提交消息"""
+        self.post('started', job)
+        last = [-1]
+
+        def on_progress(done, total):
+            percent = done * 100 // total if total else 100
+            if percent != last[0]:
+                last[0] = percent
+                self.post('progress', job, percent)
+
+        result, error = None, None
+        try:
+            result = decrypt_video(
+                job.input_file,
+                job.keystream,
+                job.output_file,
+                verbose=False,  # 我们自己处理日志输出
+                on_progress=on_progress
             )
-
-            # 验证结果
-            if success:
+        except Exception as e:
+            error = str(e)
+        self.post('finished', job, result, error)
+
+    def on_job_started(self, job):
+        _, _, status = job.row
+        status.config(text=job.status, foreground="blue")
+        file_size = os.path.getsize(job.input_file) if os.path.exists(job.input_file) else 0
+        self.log(f"🔓 [{job.job_id}] {job.input_file} ({file_size / 1024 / 1024:.2f} MB) → {job.output_file}", "info")
+        self.update_status(f"正在解密... ({self.running} 个进行中，{len(self.pending)} 个等待)")
+
+    def on_job_progress(self, job, percent):
+        job.percent = percent
+        job.row[1]['value'] = percent
+
+    def on_job_finished(self, job, result, error):
+        _, progress, status = job.row
+        self.running -= 1
+        if result:
+            job.status = DecryptJob.DONE
+            progress['value'] = 100
+            status.config(text=job.status, foreground="green")
+            self.run_stats['succeeded'] += 1
+            self.last_output_file = job.output_file
+            self.open_folder_button.config(state=tk.NORMAL)
+            self.log(f"✅ [{job.job_id}] 解密成功: {os.path.abspath(job.output_file)} "
+                     f"({result.bytes / 1024 / 1024:.2f} MB)", "success")
+        else:
+            job.status = DecryptJob.FAILED
+            status.config(text=job.status, foreground="red")
+            self.run_stats['failed'] += 1
+            reason = error or (result.error if result is not None else None) or "未知错误"
+            self.log(f"❌ [{job.job_id}] {job.input_file}: {reason}", "error")
+        job.keystream = None
+        self.dispatch_jobs()
+        if self.running == 0 and not self.pending:
+            self.on_queue_idle(job, result, error)
+
+    def on_queue_idle(self, last_job, last_result, last_error):
+        """队列中的任务全部完成"""
+        stats = self.run_stats
+        if stats['total'] == 1:
+            # 单个文件：保持原来的结果提示
+            if last_result:
                 self.log("\n" + "=" * 70, "success")
                 self.log("🎉 解密成功！", "success")
                 self.log("=" * 70 + "\n", "success")
-
-                output_size = os.path.getsize(output_file)
-                self.log(f"✅ 解密文件: {output_file}", "success")
-                self.log(f"📊 文件大小: {output_size:,} bytes ({output_size / 1024 / 1024:.2f} MB)", "success")
-                self.log(f"📍 完整路径: {os.path.abspath(output_file)}\n", "info")
-
                 self.update_status("解密完成！")
-
-                # 启用打开文件夹按钮
-                self.open_folder_button.config(state=tk.NORMAL)
-
-                # 显示成功对话框
-                result = messagebox.askyesno(
+                if messagebox.askyesno(
                     "解密成功",
-                    f"视频解密完成！\n\n文件: {output_file}\n\n是否打开文件所在文件夹？"
-                )
-                if result:
+                    f"视频解密完成！\n\n文件: {last_job.output_file}\n\n是否打开文件所在文件夹？"
+                ):
                     self.open_output_folder()
+            elif last_error:
+                self.update_status("解密失败")
+                messagebox.showerror("错误", f"解密失败:\n{last_error}")
             else:
-                self.log("\n" + "=" * 70, "warning")
-                self.log("⚠️  解密完成，但可能存在问题", "warning")
-                self.log("=" * 70 + "\n", "warning")
                 self.log("请检查：", "warning")
                 self.log("1. 密钥流是否正确", "warning")
                 self.log("2. decode_key 是否匹配此视频", "warning")
                 self.log("3. 加密文件是否完整\n", "warning")
-
                 self.update_status("解密完成（可能有问题）")
-
                 messagebox.showwarning(
                     "警告",
-                    "解密完成，但未检测到有效的 MP4 签名。\n请检查密钥流和文件是否正确。"
+                    f"解密完成，但可能存在问题:\n{last_result.error if last_result is not None else ''}\n"
+                    "请检查密钥流和文件是否正确。"
                 )
+            return
 
-        except Exception as e:
-            self.log(f"\n❌ 解密失败: {e}", "error")
-            self.update_status("解密失败")
-            messagebox.showerror("错误", f"解密失败:\n{e}")
-        finally:
-            # 恢复按钮
-            self.decrypt_button.config(state=tk.NORMAL)
-            self.is_decrypting = False
+        message = f"队列完成: 成功 {stats['succeeded']} 个，失败 {stats['failed']} 个"
+        self.log(f"\n📊 {message}\n", "success" if not stats['failed'] else "warning")
+        self.update_status(message)
+        if stats['failed']:
+            messagebox.showwarning("队列完成", f"{message}\n失败原因见操作日志。")
+        else:
+            messagebox.showinfo("队列完成", message)
+
+    def clear_finished(self):
+        """移除已完成（成功或失败）的任务行"""
+        for job in [job for job in self.jobs if job.finished]:
+            job.row[0].destroy()
+            self.jobs.remove(job)
+        self.queue_canvas.yview_moveto(0)
+        self.update_queue_summary()
+
+    def update_queue_summary(self):
+        done = sum(1 for job in self.jobs if job.finished)
+        self.queue_summary_label.config(
+            text=f"{len(self.jobs)} 个任务: {self.running} 进行中，{len(self.pending)} 等待，{done} 已结束"
+        )
+
+    def on_close(self):
+        """关闭窗口（有任务进行中时先确认）"""
+        if (self.running or self.pending) and not messagebox.askyesno(
+            "确认退出", "仍有任务在进行或等待中，确定要退出吗？"
+        ):
+            return
+        self.root.destroy()
 
     def open_output_folder(self):
         """打开输出文件所在文件夹"""
-        output_file = self.output_file_var.get()
+        output_file = self.last_output_file or self.output_file_var.get()
         if os.path.exists(output_file):
             folder = os.path.dirname(os.path.abspath(output_file))
             if sys.platform == "darwin":  # macOS
@@ -477,6 +847,14 @@ class DecryptionGUI:
    - 将密钥流十六进制字符串粘贴到文本框
    - 点击"从文本加载密钥流"
 
+   方式三：输入 decode_key
+   - 在"decode_key"中输入后点击"生成密钥流"（内置 Isaac64）
+   - 生成的密钥流会自动加入密钥库
+
+📚 密钥库：
+   - 按 decode_key 列出保存过的密钥流，双击或点击"使用所选"即可切换
+   - "加入当前"保存当前密钥流（与 decode_key 一致时只保存 decode_key）
+
 2️⃣ 选择加密文件
    - 点击"选择文件"选择加密的 MP4 视频
 
@@ -487,6 +865,11 @@ class DecryptionGUI:
    - 点击"开始解密"按钮
    - 等待解密完成
 
+📋 批量解密：
+   - 点击"添加文件"可一次选择多个加密视频（输出为 <文件名>_decrypted.mp4）
+   - "输出目录"可指定统一的输出目录，"并发数"控制同时解密的文件数
+   - 每个文件都有独立的进度条，解密过程中窗口保持响应
+
 🔧 技术原理：
 - 加密算法：Isaac64 PRNG
 - 加密范围：视频前 128 KB
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+边读边解密的文件对象
+DecryptingReader 包装加密视频文件和密钥流，对外表现为一个可 seek 的只读二进制文件：
+每次 read/readinto 只对与加密区域（前 len(keystream) 字节）重叠的部分做 XOR，
+其余部分原样透传。ffmpeg 管道、哈希计算、上传对象存储等场景无需先写出解密副本。
+
+    with open_decrypted('wx_encrypted.mp4', keystream) as f:
+        f.seek(4)
+        print(f.read(4))  # b'ftyp'
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import io
+import os
+
+import decrypt_wechat_video_cli as core
+
+
+class DecryptingReader(io.RawIOBase):
+    """
+    解密视图（io.RawIOBase 子类）
+
+    Args:
+        source: 加密文件路径，或以二进制模式打开、支持 seek 的文件对象
+        keystream: 密钥流数据（bytes-like，不会被复制）
+        closefd: 关闭时是否同时关闭 source（传入路径时总是关闭）
+    """
+
+    def __init__(self, source, keystream, closefd=True):
+        super().__init__()
+        if isinstance(source, (str, bytes, os.PathLike)):
+            self._file = open(source, 'rb', buffering=0)
+            self._closefd = True
+            self.name = os.fspath(source)
+        else:
+            self._file = source
+            self._closefd = closefd
+            self.name = getattr(source, 'name', None)
+        self._keystream = memoryview(keystream).cast('B')
+        self._pos = self._file.seek(0, io.SEEK_CUR)
+        self.size = self._file.seek(0, io.SEEK_END)
+        self._file.seek(self._pos)
+
+    @property
+    def keystream_length(self):
+        """加密区域的长度"""
+        return min(len(self._keystream), self.size)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        # 底层描述符读出的是密文，不能交给 sendfile 等绕过 readinto 的调用
+        raise io.UnsupportedOperation("DecryptingReader 不提供底层文件描述符")
+
+    def readinto(self, b):
+        """读取并解密到缓冲区 b，返回读取的字节数（0 表示文件结束）"""
+        self._check_closed()
+        view = memoryview(b).cast('B')
+        if self._file.tell() != self._pos:
+            self._file.seek(self._pos)
+        n = self._file.readinto(view) or 0
+
+        # 只 XOR 本次读取与加密区域的重叠部分，尾部原样透传
+        key_len = len(self._keystream)
+        if n and self._pos < key_len:
+            overlap = min(n, key_len - self._pos)
+            core.xor_inplace(view[:overlap], self._keystream[self._pos:self._pos + overlap])
+        self._pos += n
+        return n
+
+    def readall(self):
+        self._check_closed()
+        buf = bytearray(max(self.size - self._pos, 0))
+        view = memoryview(buf)
+        got = 0
+        while got < len(buf):
+            n = self.readinto(view[got:])
+            if not n:
+                break
+            got += n
+        del view
+        del buf[got:]
+        return bytes(buf)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._check_closed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"无效的 whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"无效的偏移: {pos}")
+        self._pos = pos
+        return pos
+
+    def tell(self):
+        self._check_closed()
+        return self._pos
+
+    def close(self):
+        if not self.closed and self._closefd:
+            self._file.close()
+        super().close()
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+
+def open_decrypted(source, keystream, buffering=io.DEFAULT_BUFFER_SIZE):
+    """
+    打开加密视频的解密视图
+
+    Args:
+        source: 加密文件路径或二进制文件对象
+        keystream: 密钥流数据
+        buffering: 缓冲区大小，0 表示返回不带缓冲的 DecryptingReader
+
+    Returns:
+        io.BufferedReader 或 DecryptingReader
+    """
+    raw = DecryptingReader(source, keystream)
+    if buffering == 0:
+        return raw
+    return io.BufferedReader(raw, buffer_size=buffering)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+批量任务账本（SQLite）
+记录每个任务的输入身份（大小、修改时间、文件头哈希）、密钥流标识、输出路径和状态。
+批量运行中断后重新执行时，已完成且输入未变化的任务会直接跳过。
+
+多个工作进程、甚至共享同一文件系统的多台主机可以使用同一个账本：
+认领任务在 BEGIN IMMEDIATE 事务中完成，正在运行的任务带有租约，
+持有者崩溃（同一主机上进程已不存在，或租约过期）后其他进程才能接手。
+租约按每次认领区分（主机:进程:认领标识），同一进程的多个线程不会互相接手对方正在处理的任务。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import time
+import uuid
+import socket
+import hashlib
+import threading
+
+from keystream_cache import decode_key_cache_key, file_cache_key
+from sqlite_connection import connect
+
+# 文件头哈希覆盖的长度（即加密部分的长度）
+HEADER_HASH_BYTES = 131072
+DEFAULT_LEASE_SECONDS = 1800
+
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# claim() 的返回值
+CLAIMED = 'claimed'
+SKIP_DONE = 'done'
+SKIP_BUSY = 'busy'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key        TEXT PRIMARY KEY,
+    input          TEXT NOT NULL,
+    output         TEXT,
+    input_size     INTEGER,
+    input_mtime_ns INTEGER,
+    header_hash    TEXT,
+    keystream_id   TEXT,
+    status         TEXT NOT NULL,
+    owner          TEXT,
+    lease_until    REAL,
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    output_size    INTEGER,
+    output_mtime_ns INTEGER,
+    error          TEXT,
+    updated_at     REAL NOT NULL
+)
+"""
+
+
+def header_hash(path, length=HEADER_HASH_BYTES):
+    """文件前 length 字节的 SHA-256（十六进制）"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(length)).hexdigest()
+
+
+def input_identity(path):
+    """
+    输入文件的身份信息
+
+    Returns:
+        dict: input_size / input_mtime_ns / header_hash，文件不存在时返回 None
+    """
+    try:
+        st = os.stat(path)
+        digest = header_hash(path)
+    except OSError:
+        return None
+    return {'input_size': st.st_size, 'input_mtime_ns': st.st_mtime_ns, 'header_hash': digest}
+
+
+def keystream_id(job):
+    """
+    任务使用的密钥流标识（decode_key、密钥流文件身份或十六进制字符串的哈希）
+
+    Returns:
+        str: 标识，任务未指定密钥流时返回 None
+    """
+    if job.get('decode_key'):
+        try:
+            return decode_key_cache_key(job['decode_key'])
+        except ValueError:
+            return f"key-{job['decode_key']}"
+    if job.get('keystream_file'):
+        return file_cache_key(job['keystream_file']) or f"file-{os.path.abspath(job['keystream_file'])}"
+    if job.get('keystream_hex'):
+        return f"hex-{hashlib.sha1(''.join(job['keystream_hex'].split()).lower().encode('ascii')).hexdigest()}"
+    return None
+
+
+def job_key(job):
+    """任务在账本中的主键：输出文件的绝对路径（原地解密且不重命名时为输入文件）"""
+    return os.path.abspath(job.get('output') or job['input'])
+
+
+def _new_owner():
+    """一次认领的租约持有者：主机:进程:认领标识"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+
+
+def _owner_process(owner):
+    """(主机, 进程号)；兼容旧版本账本中的 主机:进程 格式"""
+    parts = (owner or '').split(':')
+    if len(parts) == 3:
+        return parts[0], parts[1]
+    return parts[0], parts[-1]
+
+
+def _owner_is_dead(owner):
+    """持有者是否为本机上已经退出的进程（其他主机的持有者只能等租约过期）"""
+    host, pid = _owner_process(owner)
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+class JobLedger:
+    """
+    SQLite 任务账本
+
+    每次操作使用独立的短连接，因此可以在进程池、线程池中直接使用。
+    使用回滚日志而不是 WAL，以便在网络文件系统上由多台主机共享。
+
+    Args:
+        path: 账本文件路径
+        lease_seconds: 任务租约时长，超过后视为持有者已失效
+    """
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._claims = {}  # 本进程持有的租约 {job_key: owner}
+        self._claims_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return connect(self.path)
+
+    def claim(self, job):
+        """
+        认领任务
+
+        Returns:
+            tuple: (CLAIMED / SKIP_DONE / SKIP_BUSY, 账本记录 dict 或 None)
+        """
+        key = job_key(job)
+        owner = _new_owner()
+        # 文件头哈希在事务外计算，避免持有写锁时读盘
+        identity = None if job.get('download') else input_identity(job['input'])
+        ks_id = keystream_id(job)
+        now = time.time()
+
+        with self._connect() as conn:
+            row = conn.fetchone("SELECT * FROM jobs WHERE job_key = ?", (key,))
+
+            if row is not None and row['status'] == STATUS_DONE and self._is_current(row, job, identity, ks_id):
+                return SKIP_DONE, row
+            if (row is not None and row['status'] == STATUS_RUNNING
+                    and (row['lease_until'] or 0) > now and not self._is_stale(row['owner'])):
+                return SKIP_BUSY, row
+
+            if identity is None:
+                identity = {'input_size': None, 'input_mtime_ns': None, 'header_hash': None}
+            source = job['input'] if job.get('download') else os.path.abspath(job['input'])
+            conn.execute(
+                """
+                INSERT INTO jobs (job_key, input, output, input_size, input_mtime_ns, header_hash, keystream_id,
+                                  status, owner, lease_until, attempts, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT(job_key) DO UPDATE SET
+                    input = excluded.input, output = excluded.output,
+                    input_size = excluded.input_size, input_mtime_ns = excluded.input_mtime_ns,
+                    header_hash = excluded.header_hash, keystream_id = excluded.keystream_id,
+                    status = excluded.status, owner = excluded.owner, lease_until = excluded.lease_until,
+                    attempts = jobs.attempts + 1, error = NULL, updated_at = excluded.updated_at
+                """,
+                (key, source, job.get('output'), identity['input_size'], identity['input_mtime_ns'],
+                 identity['header_hash'], ks_id, STATUS_RUNNING, owner, now + self.lease_seconds, now)
+            )
+            # 在提交前登记，其他线程随后读到这条记录时不会把它当作失效的租约
+            with self._claims_lock:
+                self._claims[key] = owner
+            return CLAIMED, None
+
+    def _is_stale(self, owner):
+        """租约持有者是否已失效：本进程中已不再持有的认领（例如上次运行中断），或本机上已退出的进程"""
+        host, pid = _owner_process(owner)
+        if host == socket.gethostname() and pid == str(os.getpid()):
+            with self._claims_lock:
+                return owner not in self._claims.values()
+        return _owner_is_dead(owner)
+
+    def _is_current(self, row, job, identity, ks_id):
+        """已完成的记录是否仍然有效：输出未被改动，输入与密钥流未变化"""
+        output = row['output'] or row['input']
+        try:
+            st = os.stat(output)
+        except OSError:
+            return False
+        if st.st_size != row['output_size'] or st.st_mtime_ns != row['output_mtime_ns']:
+            return False
+        if row['keystream_id'] != ks_id:
+            return False
+        if job.get('in_place') or job.get('download'):
+            return True  # 输入已被改写（或不在本地），以输出为准
+        if identity is None:
+            return False
+        return (identity['input_size'], identity['input_mtime_ns'], identity['header_hash']) == \
+            (row['input_size'], row['input_mtime_ns'], row['header_hash'])
+
+    def complete(self, job, ok, error=None):
+        """
+        记录任务结果（成功时同时记录输出文件的大小和修改时间）；可在认领任务之外的线程中调用
+        """
+        key = job_key(job)
+        with self._claims_lock:
+            owner = self._claims.pop(key, None)
+        output_size = output_mtime_ns = None
+        if ok:
+            try:
+                st = os.stat(job.get('output') or job['input'])
+                output_size, output_mtime_ns = st.st_size, st.st_mtime_ns
+            except OSError as e:
+                ok, error = False, f"输出文件不可读: {e}"
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, output_size = ?,
+                                output_mtime_ns = ?, error = ?, updated_at = ?
+                WHERE job_key = ? AND (owner = ? OR owner IS NULL)
+                """,
+                (STATUS_DONE if ok else STATUS_FAILED, output_size, output_mtime_ns, error, time.time(),
+                 key, owner)
+            )
+
+    def counts(self):
+        """
+        Returns:
+            dict: 各状态的任务数
+        """
+        with self._connect() as conn:
+            rows = conn.fetchall("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        return {row['status']: row['n'] for row in rows}
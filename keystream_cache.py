@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+密钥流磁盘缓存
+以 decode_key（或密钥流文件的身份信息）为键，将密钥流以二进制密钥流格式（见 keystream_format.py）保存到缓存目录，
+超过容量上限时按最近使用时间（LRU）淘汰。写入使用临时文件 + 原子重命名，多个进程可同时使用。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import time
+import hashlib
+import tempfile
+
+from keystream_format import pack_keystream, load_keystream_binary, BINARY_KEYSTREAM_SUFFIX
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，淘汰时不加锁（写入本身是原子的）
+    fcntl = None
+
+# 默认缓存目录与容量上限
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'wechat-video-decrypt', 'keystreams')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_ENTRY_SUFFIX = BINARY_KEYSTREAM_SUFFIX
+_TMP_PREFIX = '.tmp-'
+_STALE_TMP_SECONDS = 3600
+
+
+def decode_key_cache_key(decode_key):
+    """decode_key 对应的缓存键"""
+    return f"key-{int(str(decode_key).strip())}"
+
+
+def file_cache_key(filename):
+    """
+    密钥流文件对应的缓存键（由真实路径、大小和修改时间决定，文件变化后自动失效）
+
+    Returns:
+        str: 缓存键，文件不存在时返回 None
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    identity = f"{os.path.realpath(filename)}|{st.st_size}|{st.st_mtime_ns}"
+    return f"file-{hashlib.sha1(identity.encode('utf-8')).hexdigest()}"
+
+
+class KeystreamCache:
+    """密钥流磁盘缓存（LRU 淘汰，多进程安全）"""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def get(self, key):
+        """
+        读取缓存条目
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            memoryview: 映射在缓存条目上的密钥流，未命中或条目损坏时返回 None
+        """
+        path = self._path(key)
+        try:
+            keystream = load_keystream_binary(path)
+        except OSError:
+            self.misses += 1
+            return None
+        except ValueError:
+            # 损坏的条目直接删除，下次重新生成
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # 刷新修改时间，作为 LRU 的最近使用时间
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return keystream
+
+    def put(self, key, keystream, decode_key=None):
+        """
+        写入缓存条目（临时文件 + 原子重命名）
+
+        Args:
+            key: 缓存键
+            keystream: 密钥流数据
+            decode_key: 对应的 decode_key（可选，写入条目头）
+
+        Returns:
+            bool: 是否写入成功
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=_TMP_PREFIX, dir=self.directory)
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pack_keystream(keystream, decode_key))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            self._remove(tmp_path)
+            return False
+        self.evict()
+        return True
+
+    def evict(self):
+        """
+        按 LRU 淘汰条目直到总大小不超过上限
+
+        Returns:
+            int: 删除的条目数
+        """
+        lock = self._acquire_lock()
+        if lock is False:
+            return 0  # 其他进程正在淘汰
+        try:
+            entries = []
+            total = 0
+            now = time.time()
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if entry.name.startswith(_TMP_PREFIX):
+                        if now - st.st_mtime > _STALE_TMP_SECONDS:
+                            self._remove(entry.path)
+                        continue
+                    if entry.name.endswith(_ENTRY_SUFFIX):
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+
+            removed = 0
+            entries.sort()
+            for _mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if self._remove(path):
+                    removed += 1
+                total -= size
+            return removed
+        except OSError:
+            return 0
+        finally:
+            if lock:
+                lock.close()
+
+    def clear(self):
+        """删除所有缓存条目"""
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(_ENTRY_SUFFIX):
+                        self._remove(entry.path)
+        except OSError:
+            pass
+
+    def _acquire_lock(self):
+        """获取淘汰锁；不支持加锁时返回 None，锁被占用时返回 False"""
+        if fcntl is None:
+            return None
+        try:
+            lock = open(os.path.join(self.directory, '.lock'), 'a')
+        except OSError:
+            return None
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        return lock
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+_default_cache = None
+_default_cache_disabled = os.environ.get('WX_KEYSTREAM_CACHE', '1').lower() in ('0', 'off', 'no', 'false')
+
+
+def get_default_cache():
+    """
+    返回默认缓存（目录可由环境变量 WX_KEYSTREAM_CACHE_DIR 指定）
+
+    Returns:
+        KeystreamCache: 默认缓存，已禁用时返回 None
+    """
+    global _default_cache
+    if _default_cache_disabled:
+        return None
+    if _default_cache is None:
+        _default_cache = KeystreamCache(os.environ.get('WX_KEYSTREAM_CACHE_DIR') or DEFAULT_CACHE_DIR)
+    return _default_cache
+
+
+def configure_default_cache(directory=None, max_bytes=None, enabled=True):
+    """
+    配置默认缓存
+
+    Args:
+        directory: 缓存目录（None 保持不变）
+        max_bytes: 容量上限（None 保持不变）
+        enabled: 是否启用
+
+    Returns:
+        KeystreamCache: 配置后的默认缓存，禁用时返回 None
+    """
+    global _default_cache, _default_cache_disabled
+    _default_cache_disabled = not enabled
+    if not enabled:
+        return None
+    cache = get_default_cache()
+    if directory:
+        cache.directory = directory
+    if max_bytes is not None:
+        cache.max_bytes = max_bytes
+    return cache
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+二进制密钥流格式
+文件头（56 字节）+ 原始密钥流：
+
+    magic 'WXKS' | 版本 u8 | 标志 u8 | 保留 u16 | 长度 u64 | decode_key u64 | SHA-256
+
+相比十六进制文本体积减半且无需解析，可通过 mmap 零拷贝加载。
+直接运行本文件可将已有的十六进制密钥流文件转换为二进制格式。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import argparse
+
+KEYSTREAM_MAGIC = b'WXKS'
+KEYSTREAM_VERSION = 1
+BINARY_KEYSTREAM_SUFFIX = '.ksb'
+
+_FLAG_HAS_DECODE_KEY = 0x01
+_HEADER = struct.Struct('>4sBBHQQ32s')
+HEADER_SIZE = _HEADER.size
+
+
+def pack_keystream(keystream, decode_key=None):
+    """
+    打包为二进制密钥流格式
+
+    Args:
+        keystream: 密钥流数据
+        decode_key: 对应的 decode_key（可选）
+
+    Returns:
+        bytes: 文件头 + 密钥流
+    """
+    flags = _FLAG_HAS_DECODE_KEY if decode_key is not None else 0
+    header = _HEADER.pack(
+        KEYSTREAM_MAGIC, KEYSTREAM_VERSION, flags, 0, len(keystream),
+        int(decode_key or 0), hashlib.sha256(keystream).digest()
+    )
+    return header + bytes(keystream)
+
+
+def parse_keystream_header(data):
+    """
+    解析文件头
+
+    Args:
+        data: 至少包含文件头的数据
+
+    Returns:
+        dict: length / decode_key / sha256，格式错误时返回 None
+    """
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, flags, _reserved, length, decode_key, digest = _HEADER.unpack_from(data)
+    if magic != KEYSTREAM_MAGIC or version != KEYSTREAM_VERSION:
+        return None
+    return {
+        'length': length,
+        'decode_key': decode_key if flags & _FLAG_HAS_DECODE_KEY else None,
+        'sha256': digest,
+    }
+
+
+def unpack_keystream(data, verify=True):
+    """
+    从内存中的二进制数据取出密钥流（返回 memoryview，不复制）
+
+    Raises:
+        ValueError: 格式、长度或校验和错误
+    """
+    header = parse_keystream_header(data)
+    if header is None:
+        raise ValueError("不是有效的二进制密钥流（magic/版本不匹配）")
+    payload = memoryview(data)[HEADER_SIZE:]
+    if len(payload) != header['length']:
+        raise ValueError(f"密钥流长度不匹配: 文件头 {header['length']}，实际 {len(payload)}")
+    if verify and hashlib.sha256(payload).digest() != header['sha256']:
+        raise ValueError("密钥流校验和不匹配，文件可能已损坏")
+    return payload
+
+
+def is_binary_keystream(filename):
+    """判断文件是否为二进制密钥流格式（只读取 magic）"""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(KEYSTREAM_MAGIC)) == KEYSTREAM_MAGIC
+    except OSError:
+        return False
+
+
+def load_keystream_binary(filename, verify=True):
+    """
+    通过 mmap 零拷贝加载二进制密钥流
+
+    Args:
+        filename: 二进制密钥流文件路径
+        verify: 是否校验 SHA-256
+
+    Returns:
+        memoryview: 映射在文件上的只读密钥流视图
+
+    Raises:
+        ValueError: 格式、长度或校验和错误
+        OSError: 文件无法读取
+    """
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER_SIZE:
+            raise ValueError("文件过小，不是有效的二进制密钥流")
+        # 映射在关闭文件后依然有效，并由返回的 memoryview 保持存活
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return unpack_keystream(mm, verify)
+
+
+def write_keystream_binary(filename, keystream, decode_key=None):
+    """
+    写入二进制密钥流文件（临时文件 + 原子重命名）
+
+    Args:
+        filename: 输出文件路径
+        keystream: 密钥流数据
+        decode_key: 对应的 decode_key（可选）
+    """
+    tmp_path = f"{filename}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(pack_keystream(keystream, decode_key))
+        os.replace(tmp_path, filename)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def convert_hex_keystream(hex_file, binary_file=None, decode_key=None):
+    """
+    将十六进制文本密钥流转换为二进制格式
+
+    Args:
+        hex_file: 十六进制密钥流文件
+        binary_file: 输出路径（默认与输入同名，扩展名为 .ksb）
+        decode_key: 对应的 decode_key（可选）
+
+    Returns:
+        str: 输出文件路径
+
+    Raises:
+        ValueError: 输入不是有效的十六进制字符串
+    """
+    with open(hex_file, 'r', encoding='utf-8') as f:
+        keystream = bytes.fromhex(''.join(f.read().split()))
+    if binary_file is None:
+        binary_file = os.path.splitext(hex_file)[0] + BINARY_KEYSTREAM_SUFFIX
+    write_keystream_binary(binary_file, keystream, decode_key)
+    return binary_file
+
+
+def main():
+    """转换工具入口"""
+    parser = argparse.ArgumentParser(
+        description="将十六进制密钥流文件转换为二进制密钥流格式（.ksb）"
+    )
+    parser.add_argument('inputs', nargs='+', help='十六进制密钥流文件')
+    parser.add_argument('-o', '--output', help='输出文件路径（仅单个输入时可用）')
+    parser.add_argument('-d', '--decode-key', help='写入文件头的 decode_key（可选）')
+    args = parser.parse_args()
+
+    if args.output and len(args.inputs) > 1:
+        parser.error("多个输入文件时不能指定 -o/--output")
+
+    failed = 0
+    for hex_file in args.inputs:
+        try:
+            output = convert_hex_keystream(hex_file, args.output, args.decode_key)
+            print(f"✅ {hex_file} → {output} ({os.path.getsize(output):,} bytes)")
+        except (OSError, ValueError) as e:
+            print(f"❌ {hex_file}: {e}")
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
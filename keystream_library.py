@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+密钥流库
+按 decode_key 保存常用的密钥流，切换视频时直接选用，无需重新粘贴十六进制文本。
+
+条目只记录在一个很小的索引文件（index.json）中，列出条目时不读取任何密钥流数据：
+
+    - 与 decode_key 的 Isaac64 输出一致的密钥流只保存 decode_key，使用时再生成（经密钥流缓存，通常无需重新计算）
+    - 其他密钥流（例如浏览器导出、没有 decode_key 的）保存为二进制密钥流文件（.ksb，见 keystream_format.py），
+      使用时通过 mmap 加载
+
+索引与密钥流文件都以临时文件 + 原子重命名的方式写入。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+from isaac64 import generate_keystream, parse_decode_key
+from keystream_format import load_keystream_binary, write_keystream_binary, BINARY_KEYSTREAM_SUFFIX
+
+DEFAULT_LIBRARY_DIR = os.path.join(os.path.expanduser('~'), '.local', 'share', 'wechat-video-decrypt', 'library')
+INDEX_NAME = 'index.json'
+INDEX_VERSION = 1
+
+
+def default_library_dir():
+    """默认密钥流库目录（可由环境变量 WX_KEYSTREAM_LIBRARY_DIR 指定）"""
+    return os.environ.get('WX_KEYSTREAM_LIBRARY_DIR') or DEFAULT_LIBRARY_DIR
+
+
+def _keystream_id(keystream):
+    return 'sha-' + hashlib.sha256(keystream).hexdigest()[:16]
+
+
+class KeystreamLibrary:
+    """
+    密钥流库（线程安全；多个进程同时写入时以最后一次写入的索引为准）
+
+    条目字典字段:
+        id          条目标识：decode_key，没有 decode_key 时为 'sha-<密钥流 SHA-256 前 16 位>'
+        decode_key  decode_key（可选）
+        label       备注（如视频标题、feed_id）
+        length      密钥流长度
+        file        .ksb 文件名（只保存 decode_key 时为 None）
+        added       加入时间（Unix 时间戳）
+        last_used   最近使用时间
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_library_dir()
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def _load_index(self):
+        if self._entries is not None:
+            return self._entries
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entries = data.get('entries', []) if isinstance(data, dict) else []
+        except FileNotFoundError:
+            entries = []
+        except (OSError, ValueError):
+            entries = []  # 索引损坏时视为空库，下次写入时重建
+        self._entries = {entry['id']: entry for entry in entries if isinstance(entry, dict) and entry.get('id')}
+        return self._entries
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        data = {'version': INDEX_VERSION, 'entries': list(self._entries.values())}
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def entries(self):
+        """
+        列出所有条目（只读取索引），最近使用的在前
+
+        Returns:
+            list: 条目字典的副本
+        """
+        with self._lock:
+            entries = [dict(entry) for entry in self._load_index().values()]
+        return sorted(entries, key=lambda e: e.get('last_used') or e.get('added') or 0, reverse=True)
+
+    def get(self, entry_id):
+        """按 id（通常就是 decode_key）查找条目，不存在时返回 None"""
+        with self._lock:
+            entry = self._load_index().get(str(entry_id).strip())
+        return dict(entry) if entry else None
+
+    def add(self, keystream, decode_key=None, label=None):
+        """
+        加入密钥流（已存在的同一 id 会被覆盖）
+
+        Args:
+            keystream: 密钥流数据；为 None 且提供 decode_key 时直接由 decode_key 生成
+            decode_key: 对应的 decode_key（可选）
+            label: 备注（可选）
+
+        Returns:
+            dict: 新条目
+
+        Raises:
+            ValueError: decode_key 无效，或两者都未提供
+            OSError: 无法写入库目录
+        """
+        seed = parse_decode_key(decode_key) if decode_key not in (None, '') else None
+        if keystream is None:
+            if seed is None:
+                raise ValueError("需要提供密钥流或 decode_key")
+            keystream = generate_keystream(seed)
+        keystream = bytes(keystream)
+
+        # 与 decode_key 的 Isaac64 输出一致时只保存 decode_key
+        derivable = seed is not None and generate_keystream(seed, len(keystream)) == keystream
+        entry_id = str(seed) if seed is not None else _keystream_id(keystream)
+        entry = {
+            'id': entry_id,
+            'decode_key': str(seed) if seed is not None else None,
+            'label': label or '',
+            'length': len(keystream),
+            'file': None if derivable else entry_id + BINARY_KEYSTREAM_SUFFIX,
+            'added': time.time(),
+            'last_used': time.time(),
+        }
+        if entry['file']:
+            os.makedirs(self.directory, exist_ok=True)
+            write_keystream_binary(os.path.join(self.directory, entry['file']), keystream, seed)
+
+        with self._lock:
+            entries = self._load_index()
+            old = entries.get(entry_id)
+            entries[entry_id] = entry
+            self._save_index()
+        if old and old.get('file') and old['file'] != entry['file']:
+            self._remove_file(old['file'])
+        return dict(entry)
+
+    def load(self, entry_id, use_cache=True):
+        """
+        加载条目的密钥流
+
+        Args:
+            entry_id: 条目 id（decode_key 或 'sha-...'）
+            use_cache: 只保存 decode_key 的条目是否经过密钥流缓存
+
+        Returns:
+            bytes | memoryview: 密钥流数据
+
+        Raises:
+            KeyError: 条目不存在
+            ValueError / OSError: .ksb 文件损坏或无法读取
+        """
+        entry = self.get(entry_id)
+        if entry is None:
+            raise KeyError(entry_id)
+        if entry.get('file'):
+            keystream = load_keystream_binary(os.path.join(self.directory, entry['file']))
+        else:
+            import decrypt_wechat_video_cli as core
+            keystream = core.read_keystream_from_decode_key(entry['decode_key'], verbose=False, use_cache=use_cache)
+            if keystream is None:
+                raise ValueError(f"无效的 decode_key: {entry['decode_key']}")
+            if len(keystream) != entry['length']:
+                keystream = generate_keystream(entry['decode_key'], entry['length'])
+        self.touch(entry['id'])
+        return keystream
+
+    def touch(self, entry_id):
+        """更新最近使用时间"""
+        with self._lock:
+            entry = self._load_index().get(entry_id)
+            if entry is None:
+                return
+            entry['last_used'] = time.time()
+            try:
+                self._save_index()
+            except OSError:
+                pass
+
+    def remove(self, entry_id):
+        """
+        删除条目
+
+        Returns:
+            bool: 条目是否存在
+        """
+        with self._lock:
+            entry = self._load_index().pop(str(entry_id).strip(), None)
+            if entry is None:
+                return False
+            self._save_index()
+        if entry.get('file'):
+            self._remove_file(entry['file'])
+        return True
+
+    def _remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def disk_usage(self):
+        """库目录占用的字节数（索引 + .ksb 文件）"""
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name == INDEX_NAME or entry.name.endswith(BINARY_KEYSTREAM_SUFFIX):
+                        total += entry.stat().st_size
+        except OSError:
+            pass
+        return total
+
+
+def describe_entry(entry):
+    """条目的单行描述"""
+    key = entry.get('decode_key') or entry['id']
+    storage = '仅 decode_key' if not entry.get('file') else f"{entry['length'] / 1024:.0f} KB .ksb"
+    label = f"  {entry['label']}" if entry.get('label') else ''
+    return f"{key}  ({storage}){label}"
+
+
+def main():
+    """命令行入口：查看和维护密钥流库"""
+    parser = argparse.ArgumentParser(description="微信视频号解密工具 - 密钥流库")
+    parser.add_argument('--dir', help=f'密钥流库目录（默认: {DEFAULT_LIBRARY_DIR}，或环境变量 WX_KEYSTREAM_LIBRARY_DIR）')
+    parser.add_argument('-d', '--decode-key', action='append', default=[], help='加入 decode_key（可重复）')
+    parser.add_argument('-k', '--keystream-file', help='加入密钥流文件（十六进制文本或 .ksb），可配合一个 -d')
+    parser.add_argument('--label', help='加入时的备注')
+    parser.add_argument('--remove', action='append', default=[], metavar='ID', help='删除条目（可重复）')
+    args = parser.parse_args()
+
+    library = KeystreamLibrary(args.dir)
+    failed = 0
+    try:
+        if args.keystream_file:
+            import decrypt_wechat_video_cli as core
+            keystream = core.read_keystream_from_file(args.keystream_file, verbose=False)
+            if not keystream:
+                print(f"❌ 无法读取密钥流: {args.keystream_file}")
+                return 1
+            decode_key = args.decode_key.pop(0) if args.decode_key else None
+            print(f"✅ 已加入: {describe_entry(library.add(keystream, decode_key, args.label))}")
+        for decode_key in args.decode_key:
+            try:
+                print(f"✅ 已加入: {describe_entry(library.add(None, decode_key, args.label))}")
+            except ValueError as e:
+                print(f"❌ {decode_key}: {e}")
+                failed += 1
+        for entry_id in args.remove:
+            if library.remove(entry_id):
+                print(f"🗑️  已删除: {entry_id}")
+            else:
+                print(f"❌ 条目不存在: {entry_id}")
+                failed += 1
+    except OSError as e:
+        print(f"❌ 无法写入密钥流库: {e}")
+        return 1
+
+    entries = library.entries()
+    print(f"📚 密钥流库: {library.directory}  ({len(entries)} 个条目, {library.disk_usage():,} bytes)")
+    for entry in entries:
+        print(f"   {describe_entry(entry)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
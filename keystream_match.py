@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+密钥流与加密视频的配对
+每次调用 API 都会得到新的 url 和 decode_key，视频与密钥对不上是最常见的失败原因。
+本模块只用文件头的前几十个字节完成配对，不做任何完整解密：
+
+MP4 文件以 ftyp box 开头（4 字节大小 + 'ftyp' + 主品牌 + 兼容品牌），
+因此 密文[4:8] XOR 'ftyp' 就是对应密钥流的 [4:8] 字节。先按密钥流的这 4 个字节建立哈希索引，
+每个文件只需查一次索引，再用 box 大小、品牌和下一个 box 类型确认候选，
+N 个文件对 M 个密钥流的配对代价约为 O(N + M)，而不是 O(N × M) 次完整解密。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+
+import decrypt_wechat_video_cli as core
+from isaac64 import generate_keystream, parse_decode_key
+from api_response import RESPONSE_EXTENSIONS, iter_media_records
+from watch_folder import VIDEO_EXTENSIONS, KEYSTREAM_SIDECARS, DECODE_KEY_SIDECARS
+
+# 配对时读取的文件头长度（足以覆盖 ftyp 和下一个 box 的头部）
+PROBE_BYTES = 64
+FTYP = b'ftyp'
+MAX_FTYP_SIZE = 4096
+
+# 结果状态
+MATCHED = 'matched'
+AMBIGUOUS = 'ambiguous'
+UNMATCHED = 'unmatched'
+
+
+def _is_fourcc(data):
+    """box 类型 / 品牌：4 个可打印 ASCII 字符"""
+    return len(data) == 4 and all(0x20 <= b < 0x7f for b in data)
+
+
+def check_mp4_header(plain):
+    """
+    检查解密后的文件头是否为合理的 ftyp box
+
+    Args:
+        plain: 解密后的前 PROBE_BYTES 字节
+
+    Returns:
+        str: 主品牌（如 'isom'），不合理时返回 None
+    """
+    if len(plain) < 12 or plain[4:8] != FTYP:
+        return None
+    size = int.from_bytes(plain[0:4], 'big')
+    if size < 16 or size > MAX_FTYP_SIZE or size % 4:
+        return None
+    brand = bytes(plain[8:12])
+    if not _is_fourcc(brand):
+        return None
+    # 兼容品牌与 ftyp 之后的 box 类型（在读取范围内时）同样必须是可打印的四字符码
+    for offset in range(16, min(size, len(plain) - 3), 4):
+        if not _is_fourcc(plain[offset:offset + 4]):
+            return None
+    if size + 8 <= len(plain) and not _is_fourcc(plain[size + 4:size + 8]):
+        return None
+    return brand.decode('ascii')
+
+
+def read_probe(path, size=PROBE_BYTES):
+    """读取文件头，失败返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(size)
+    except OSError:
+        return None
+
+
+def key_label(entry):
+    """密钥来源的简短描述"""
+    if entry.get('decode_key'):
+        label = f"decode_key {entry['decode_key']}"
+    elif entry.get('keystream_file'):
+        label = os.path.basename(entry['keystream_file'])
+    else:
+        label = "十六进制密钥流"
+    if entry.get('feed_id'):
+        label += f" (feed {entry['feed_id']})"
+    return label
+
+
+def key_prefix(entry):
+    """
+    读取密钥流的前 PROBE_BYTES 字节
+
+    decode_key 只生成第一轮 Isaac64 输出（约 1 ms），不生成完整的 128 KB 密钥流。
+
+    Returns:
+        bytes: 密钥流前缀，无法读取时返回 None
+    """
+    if entry.get('decode_key'):
+        try:
+            return generate_keystream(parse_decode_key(entry['decode_key']), PROBE_BYTES)
+        except ValueError:
+            return None
+    try:
+        if entry.get('keystream_file'):
+            keystream = core.read_keystream_from_file(entry['keystream_file'], verbose=False)
+        elif entry.get('keystream_hex'):
+            keystream = core.read_keystream_from_string(entry['keystream_hex'], verbose=False)
+        else:
+            return None
+    except (OSError, ValueError):
+        return None
+    return bytes(keystream[:PROBE_BYTES]) if keystream else None
+
+
+def _iter_decode_key_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                yield {'decode_key': line, 'source': path}
+
+
+def _iter_key_file(path, explicit):
+    lower = path.lower()
+    if lower.endswith(RESPONSE_EXTENSIONS):
+        for record in iter_media_records(path):
+            if record.get('decode_key'):
+                yield {'decode_key': record['decode_key'], 'source': record['source'],
+                       'feed_id': record.get('feed_id'), 'expected_size': record.get('file_size')}
+    elif lower.endswith(DECODE_KEY_SIDECARS):
+        yield from _iter_decode_key_file(path)
+    elif lower.endswith(KEYSTREAM_SIDECARS) or explicit:
+        # 直接给出的其他文件按密钥流文件（十六进制文本或 .ksb）处理
+        yield {'keystream_file': path, 'source': path}
+
+
+def iter_key_entries(paths, defaults=None):
+    """
+    列出密钥池中的所有密钥
+
+    Args:
+        paths: 文件或目录列表；目录中识别 API 响应（.json/.jsonl/.ndjson）、
+               .ksb / .keystream.txt 密钥流文件、.key / .decode_key（每行一个 decode_key）
+        defaults: 命令行给出的 -k / -H / -d
+
+    Yields:
+        dict: decode_key / keystream_file / keystream_hex 之一，以及 source、feed_id、expected_size
+    """
+    for field in ('keystream_file', 'keystream_hex', 'decode_key'):
+        if (defaults or {}).get(field):
+            yield {field: defaults[field], 'source': '命令行'}
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    yield from _iter_key_file(os.path.join(dirpath, name), explicit=False)
+        else:
+            yield from _iter_key_file(path, explicit=True)
+
+
+def iter_video_files(paths):
+    """列出加密视频（目录时递归查找 .mp4，跳过 *_decrypted.mp4）"""
+    from batch_runner import DEFAULT_OUTPUT_SUFFIX
+
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                stem, ext = os.path.splitext(name)
+                if ext.lower() in VIDEO_EXTENSIONS and not stem.endswith(DEFAULT_OUTPUT_SUFFIX) \
+                        and not name.startswith('.'):
+                    yield os.path.join(dirpath, name)
+
+
+class KeystreamIndex:
+    """
+    按密钥流 [4:8] 字节建立的哈希索引
+
+    同一个密钥流可能来自多个来源（如同一 decode_key 出现在多个响应中），按前缀去重，
+    保留所有来源以便用 expected_size 区分。
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self.keys = 0
+        self.errors = []
+
+    def add(self, entry):
+        """加入一个密钥，无法读取时记入 errors 并返回 False"""
+        prefix = key_prefix(entry)
+        if not prefix or len(prefix) < 12:
+            self.errors.append(f"无法读取密钥流: {key_label(entry)} ({entry.get('source')})")
+            return False
+        bucket = self._buckets.setdefault(prefix[4:8], {})
+        bucket.setdefault(prefix, []).append(entry)
+        self.keys += 1
+        return True
+
+    def candidates(self, header):
+        """
+        查找与文件头匹配的密钥流
+
+        Returns:
+            list: [(密钥流前缀, 来源列表, 主品牌)]，已通过 ftyp 结构检查
+        """
+        if len(header) < 12:
+            return []
+        tag = bytes(a ^ b for a, b in zip(header[4:8], FTYP))
+        found = []
+        for prefix, entries in self._buckets.get(tag, {}).items():
+            n = min(len(prefix), len(header))
+            plain = bytes(a ^ b for a, b in zip(header[:n], prefix[:n]))
+            brand = check_mp4_header(plain)
+            if brand:
+                found.append((prefix, entries, brand))
+        return found
+
+
+def _pick_entry(entries, file_size):
+    """同一密钥流有多个来源时，优先选择 expected_size 与文件大小一致的来源"""
+    for entry in entries:
+        if entry.get('expected_size') == file_size:
+            return entry
+    return entries[0]
+
+
+def match_file(path, index):
+    """
+    为单个加密视频查找密钥
+
+    Returns:
+        dict: input / status / key（匹配的密钥来源）/ brand / candidates / error
+    """
+    result = {'input': path, 'status': UNMATCHED, 'key': None, 'brand': None, 'candidates': []}
+    header = read_probe(path)
+    if header is None:
+        result['error'] = "无法读取文件"
+        return result
+    if len(header) >= 8 and header[4:8] == FTYP:
+        result['error'] = "文件未加密（已包含 ftyp 签名）"
+        return result
+
+    found = index.candidates(header)
+    if not found:
+        return result
+    try:
+        file_size = os.path.getsize(path)
+    except OSError:
+        file_size = None
+
+    if len(found) > 1:
+        # 不同的密钥流都通过了结构检查（极少见），用 file_size 区分
+        sized = [c for c in found if any(e.get('expected_size') == file_size for e in c[1])]
+        if len(sized) == 1:
+            found = sized
+    result['candidates'] = [_pick_entry(entries, file_size) for _, entries, _ in found]
+    if len(found) > 1:
+        result['status'] = AMBIGUOUS
+        return result
+
+    _, entries, brand = found[0]
+    result.update(status=MATCHED, key=_pick_entry(entries, file_size), brand=brand)
+    return result
+
+
+def match_files(video_paths, key_paths, defaults=None):
+    """
+    配对加密视频与密钥池
+
+    Args:
+        video_paths: 加密视频文件或目录列表
+        key_paths: 密钥池文件或目录列表（见 iter_key_entries）
+        defaults: 命令行给出的 -k / -H / -d
+
+    Returns:
+        tuple: (配对结果列表, KeystreamIndex)
+    """
+    index = KeystreamIndex()
+    for entry in iter_key_entries(key_paths, defaults):
+        index.add(entry)
+    results = [match_file(path, index) for path in iter_video_files(video_paths)]
+    return results, index
+
+
+def result_to_job(result, output_dir=None):
+    """将配对成功的结果转换为批量任务（字段见 batch_runner.normalize_job）"""
+    from batch_runner import default_output_path, KEYSTREAM_FIELDS
+
+    key = result['key']
+    job = {'input': result['input'], 'output': default_output_path(result['input'], output_dir)}
+    for field in KEYSTREAM_FIELDS:
+        if key.get(field):
+            job[field] = key[field]
+            break
+    if key.get('expected_size'):
+        job['expected_size'] = key['expected_size']
+    return job
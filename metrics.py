@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+解密各阶段的耗时与字节数统计
+单个文件的各阶段（密钥流加载、下载、读取、XOR、写入、fsync、校验）由 StageMetrics 记录，
+批量与监视模式用 MetricsRegistry 汇总为直方图，可输出为 JSON 或 Prometheus 文本格式。
+
+    keystream   加载密钥流（文件 / 十六进制字符串 / decode_key 生成，含缓存命中）
+    fetch       下载加密文件（只有流水线执行器单独计时；本地文件为发起预读）
+    read        读取文件头
+    xor         XOR 解密文件头（原地解密时包含 mmap 缺页读取）
+    write       写出文件头和复制未加密的尾部（copy_file_range / sendfile 时读写都在内核中完成）
+    fsync       将输出刷新到磁盘
+    verify      MP4 结构检查与摘要计算
+
+钩子函数 hook(stage, seconds, nbytes) 在每个阶段结束时调用，可用 add_hook 全局注册，
+也可通过 StageMetrics(hook=...) 只作用于单次解密。进程池中的工作进程不会继承主进程注册的钩子，
+批量模式请使用 run_batch 的 on_result 回调读取每个任务的 stages。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+STAGES = ('keystream', 'fetch', 'read', 'xor', 'write', 'fsync', 'verify')
+METRICS_FORMATS = ('json', 'prometheus')
+PROMETHEUS_PREFIX = 'wx_decrypt'
+
+# 直方图的桶上限（秒）
+DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_hooks = []
+
+
+def add_hook(hook):
+    """注册全局钩子 hook(stage, seconds, nbytes)"""
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """移除全局钩子"""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+class StageMetrics:
+    """
+    单个文件各阶段的耗时与字节数
+
+    同一阶段多次计时（如 faststart 时的两次结构检查）会累加。
+    """
+
+    def __init__(self, hook=None):
+        """
+        Args:
+            hook: 只作用于本实例的钩子 hook(stage, seconds, nbytes)
+        """
+        self.hook = hook
+        self.stages = {}
+
+    def add(self, stage, seconds, nbytes=0):
+        """记录一次阶段耗时"""
+        entry = self.stages.setdefault(stage, {'seconds': 0.0, 'bytes': 0, 'count': 0})
+        entry['seconds'] += seconds
+        entry['bytes'] += nbytes
+        entry['count'] += 1
+        for hook in ([self.hook] if self.hook else []) + _hooks:
+            hook(stage, seconds, nbytes)
+
+    @contextmanager
+    def measure(self, stage, nbytes=0):
+        """
+        计时上下文
+
+            with metrics.measure('read', len(head)):
+                ...
+
+        字节数在进入时未知时，可对 yield 出的 dict 设置 bytes。
+        """
+        info = {'bytes': nbytes}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.add(stage, time.perf_counter() - start, info['bytes'])
+
+    def merge(self, stages):
+        """并入另一个 StageMetrics 或其 to_dict() 结果（不触发钩子）"""
+        if isinstance(stages, StageMetrics):
+            stages = stages.stages
+        for stage, values in (stages or {}).items():
+            entry = self.stages.setdefault(stage, {'seconds': 0.0, 'bytes': 0, 'count': 0})
+            entry['seconds'] += values.get('seconds', 0.0)
+            entry['bytes'] += values.get('bytes', 0)
+            entry['count'] += values.get('count', 1)
+
+    @property
+    def seconds(self):
+        return sum(entry['seconds'] for entry in self.stages.values())
+
+    def to_dict(self):
+        """{阶段: {seconds, bytes, count}}，按 STAGES 的顺序"""
+        order = list(STAGES) + sorted(set(self.stages) - set(STAGES))
+        return {stage: dict(self.stages[stage]) for stage in order if stage in self.stages}
+
+    def __bool__(self):
+        return bool(self.stages)
+
+    def __repr__(self):
+        parts = ', '.join(f"{stage}={entry['seconds'] * 1000:.2f}ms" for stage, entry in self.to_dict().items())
+        return f"StageMetrics({parts})"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.bytes = 0
+
+    def observe(self, seconds, nbytes):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.bytes += nbytes
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            yield bound, total
+
+
+class MetricsRegistry:
+    """
+    多个文件的阶段统计汇总（线程安全）
+
+    每个文件的每个阶段计入一次直方图观测，另外统计各阶段的字节总数与成功 / 失败文件数。
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._files = {'ok': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, stages, ok=True):
+        """
+        记录一个文件的结果
+
+        Args:
+            stages: StageMetrics 或其 to_dict() 结果
+            ok: 该文件是否解密成功
+        """
+        if isinstance(stages, StageMetrics):
+            stages = stages.to_dict()
+        with self._lock:
+            self._files['ok' if ok else 'failed'] += 1
+            for stage, values in (stages or {}).items():
+                histogram = self._histograms.get(stage)
+                if histogram is None:
+                    histogram = self._histograms[stage] = _Histogram(self.buckets)
+                histogram.observe(values.get('seconds', 0.0), values.get('bytes', 0))
+
+    def _ordered(self):
+        order = list(STAGES) + sorted(set(self._histograms) - set(STAGES))
+        return [(stage, self._histograms[stage]) for stage in order if stage in self._histograms]
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: files / seconds_total / stages {阶段: count / seconds / bytes / mb_per_sec / mean_seconds / buckets}
+        """
+        with self._lock:
+            stages = {}
+            for stage, h in self._ordered():
+                stages[stage] = {
+                    'count': h.count,
+                    'seconds': h.sum,
+                    'bytes': h.bytes,
+                    'mean_seconds': h.sum / h.count if h.count else 0.0,
+                    'mb_per_sec': h.bytes / 1024 / 1024 / h.sum if h.sum > 0 and h.bytes else None,
+                    'buckets': {_format_bound(bound): n for bound, n in h.cumulative()},
+                }
+            return {
+                'files': dict(self._files),
+                'seconds_total': sum(h.sum for h in self._histograms.values()),
+                'uptime': time.time() - self.started,
+                'stages': stages,
+            }
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """Prometheus 文本格式（可用于 node_exporter 的 textfile 收集器）"""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each decrypt stage per file.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            ordered = self._ordered()
+            for stage, h in ordered:
+                for bound, n in h.cumulative():
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{_format_bound(bound)}"}} {n}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {h.sum:.9f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+            lines.append(f"# HELP {prefix}_stage_bytes_total Bytes processed in each decrypt stage.")
+            lines.append(f"# TYPE {prefix}_stage_bytes_total counter")
+            for stage, h in ordered:
+                lines.append(f'{prefix}_stage_bytes_total{{stage="{stage}"}} {h.bytes}')
+            lines.append(f"# HELP {prefix}_files_total Files processed, by outcome.")
+            lines.append(f"# TYPE {prefix}_files_total counter")
+            for status, n in self._files.items():
+                lines.append(f'{prefix}_files_total{{status="{status}"}} {n}')
+        return '\n'.join(lines) + '\n'
+
+    def render(self, fmt):
+        """按 'json' / 'prometheus' 输出文本"""
+        if fmt == 'prometheus':
+            return self.to_prometheus()
+        if fmt == 'json':
+            return json.dumps(self.to_dict(), ensure_ascii=False, indent=2) + '\n'
+        raise ValueError(f"未知的指标格式: {fmt} (可用: {', '.join(METRICS_FORMATS)})")
+
+    def write(self, fmt, path=None):
+        """
+        输出指标：path 为 None 时写到标准输出，否则原子写入文件（先写临时文件再重命名，
+        textfile 收集器不会读到一半的内容）
+        """
+        text = self.render(fmt)
+        if not path:
+            print(text, end='', flush=True)
+            return
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def _format_bound(bound):
+    return f"{bound:g}"
+
+
+def print_stages(stages):
+    """打印单个文件各阶段的耗时（verbose 输出用）"""
+    if isinstance(stages, StageMetrics):
+        stages = stages.to_dict()
+    if not stages:
+        return
+    print(f"   ⏱️  各阶段耗时:")
+    for stage, values in stages.items():
+        line = f"      {stage:<9} {values['seconds'] * 1000:10.3f} ms"
+        if values.get('bytes'):
+            line += f"  {values['bytes']:>14,} bytes"
+            if values['seconds'] > 0:
+                line += f"  {values['bytes'] / 1024 / 1024 / values['seconds']:10.1f} MB/s"
+        print(line)
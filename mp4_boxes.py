@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+MP4 顶层 box 结构检查
+只读取每个 box 的头部（8 或 16 字节）并按 box 大小跳到下一个，不读取任何负载，
+检查 ftyp / moov / mdat 是否齐全、box 大小是否与文件大小一致，以及 moov 的直接子 box
+（mvhd、trak）。下载中断（mdat 被截断）或 moov 损坏的文件都会被发现，
+而不仅仅是检查文件头里有没有 'ftyp'。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import mmap
+import time
+import struct
+
+_BOX_HEADER = struct.Struct('>I4s')
+_LARGE_SIZE = struct.Struct('>Q')
+
+# moov 内部只检查直接子 box，这个深度足以发现截断和大小错乱
+REQUIRED_BOXES = (b'ftyp', b'moov', b'mdat')
+REQUIRED_MOOV_CHILDREN = (b'mvhd', b'trak')
+MAX_BOXES = 100000
+
+
+def _is_fourcc(data):
+    return len(data) == 4 and all(0x20 <= b < 0x7f for b in data)
+
+
+def _fourcc(box_type):
+    return box_type.decode('latin-1')
+
+
+class Box:
+    """box 头部信息：type（bytes）、offset、size（含头部）、header（头部长度）"""
+
+    __slots__ = ('type', 'offset', 'size', 'header')
+
+    def __init__(self, box_type, offset, size, header):
+        self.type = box_type
+        self.offset = offset
+        self.size = size
+        self.header = header
+
+    @property
+    def end(self):
+        return self.offset + self.size
+
+    def __repr__(self):
+        return f"{_fourcc(self.type)}@{self.offset}+{self.size}"
+
+
+def iter_boxes(read_at, start, end, errors):
+    """
+    逐个读取 [start, end) 范围内的 box 头部
+
+    Args:
+        read_at: read_at(offset, n) -> bytes，读取任意位置的数据
+        start / end: 范围
+        errors: 结构错误追加到该列表，遇到错误时停止遍历
+
+    Yields:
+        Box
+    """
+    offset = start
+    count = 0
+    while offset < end:
+        if end - offset < 8:
+            errors.append(f"偏移 {offset} 处剩余 {end - offset} 字节，不足一个 box 头部")
+            return
+        size, box_type = _BOX_HEADER.unpack(read_at(offset, 8))
+        header = 8
+        if not _is_fourcc(box_type):
+            errors.append(f"偏移 {offset} 处的 box 类型无效: {box_type!r}")
+            return
+        if size == 1:
+            if end - offset < 16:
+                errors.append(f"'{_fourcc(box_type)}' @ {offset}: 64 位大小字段被截断")
+                return
+            size = _LARGE_SIZE.unpack(read_at(offset + 8, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset  # 延伸到末尾
+        if size < header:
+            errors.append(f"'{_fourcc(box_type)}' @ {offset}: 无效的 box 大小 {size}")
+            return
+        if offset + size > end:
+            errors.append(f"'{_fourcc(box_type)}' @ {offset}: 需要 {size:,} 字节，"
+                          f"实际只有 {end - offset:,} 字节（文件可能被截断）")
+            return
+        yield Box(box_type, offset, size, header)
+        offset += size
+        count += 1
+        if count >= MAX_BOXES:
+            errors.append(f"box 数量超过 {MAX_BOXES}")
+            return
+
+
+def check_structure(read_at, file_size):
+    """
+    检查 MP4 的顶层结构
+
+    Args:
+        read_at: read_at(offset, n) -> bytes
+        file_size: 文件大小
+
+    Returns:
+        tuple: (顶层 Box 列表, 错误列表)；错误列表为空表示结构完整
+    """
+    errors = []
+    if file_size < 8:
+        return [], ["文件过小，不是 MP4"]
+    boxes = list(iter_boxes(read_at, 0, file_size, errors))
+
+    if boxes and boxes[0].type != b'ftyp':
+        errors.append(f"第一个 box 不是 ftyp，而是 '{_fourcc(boxes[0].type)}'")
+    types = {box.type for box in boxes}
+    for required in REQUIRED_BOXES:
+        if required not in types and not errors:
+            errors.append(f"缺少 '{_fourcc(required)}' box")
+
+    for box in boxes:
+        if box.type == b'moov':
+            moov_errors = []
+            children = {child.type for child in
+                        iter_boxes(read_at, box.offset + box.header, box.end, moov_errors)}
+            errors.extend(f"moov: {e}" for e in moov_errors)
+            for required in REQUIRED_MOOV_CHILDREN:
+                if required not in children and not moov_errors:
+                    errors.append(f"moov 中缺少 '{_fourcc(required)}'")
+    return boxes, errors
+
+
+# ============================================================
+# faststart：把 moov 移到 mdat 之前
+# ============================================================
+#
+# 输出布局为 ftyp + moov' + (ftyp 与 moov 之间的 box) + (moov 之后的 box)。
+# moov' 中 stco / co64 的块偏移按数据移动的距离修正；32 位偏移溢出时将 stco 升级为 co64。
+
+# 通向 stco / co64 的容器 box
+_CHUNK_OFFSET_PATH = (b'moov', b'trak', b'mdia', b'minf', b'stbl')
+_FULL_BOX_HEADER = struct.Struct('>II')
+_UINT32_MAX = 0xFFFFFFFF
+
+
+class FaststartPlan:
+    """
+    faststart 的输出计划
+
+    Attributes:
+        ftyp_end: ftyp 结束的位置（输出中 moov' 从这里开始）
+        moov: 原 moov 的 Box
+        original: 原 moov 的字节
+        moov_data: 修正块偏移后的 moov 字节
+    """
+
+    def __init__(self, ftyp_end, moov, original, moov_data):
+        self.ftyp_end = ftyp_end
+        self.moov = moov
+        self.original = original
+        self.moov_data = moov_data
+
+    def relocate(self, offset):
+        """原文件中的偏移 → 输出文件中的偏移"""
+        if self.ftyp_end <= offset < self.moov.offset:
+            return offset + len(self.moov_data)
+        if offset >= self.moov.end:
+            return offset + len(self.moov_data) - self.moov.size
+        return offset
+
+
+def _box_bytes(box_type, payload):
+    size = 8 + len(payload)
+    if size > _UINT32_MAX:
+        return struct.pack('>I4sQ', 1, box_type, size + 8) + payload
+    return _BOX_HEADER.pack(size, box_type) + payload
+
+
+def _patch_chunk_offsets(data, box_type, relocate, force_co64):
+    """修正一个 stco / co64 box 的负载，返回 (新类型, 新负载)"""
+    version_flags, count = _FULL_BOX_HEADER.unpack_from(data, 0)
+    width = 4 if box_type == b'stco' else 8
+    if 8 + count * width > len(data):
+        raise ValueError(f"'{_fourcc(box_type)}' 的条目数与大小不符")
+    offsets = struct.unpack_from(f'>{count}{"I" if width == 4 else "Q"}', data, 8)
+    offsets = [relocate(offset) for offset in offsets]
+    if box_type == b'stco' and not force_co64 and all(o <= _UINT32_MAX for o in offsets):
+        return b'stco', _FULL_BOX_HEADER.pack(version_flags, count) + struct.pack(f'>{count}I', *offsets)
+    return b'co64', _FULL_BOX_HEADER.pack(version_flags, count) + struct.pack(f'>{count}Q', *offsets)
+
+
+def _rebuild(data, box_type, depth, relocate, force_co64):
+    """递归重建容器 box，只修改 stco / co64，其余子 box 原样保留"""
+    if box_type in (b'stco', b'co64'):
+        return _box_bytes(*_patch_chunk_offsets(data, box_type, relocate, force_co64))
+    if depth >= len(_CHUNK_OFFSET_PATH) or box_type != _CHUNK_OFFSET_PATH[depth]:
+        return _box_bytes(box_type, data)
+
+    errors = []
+    children = list(iter_boxes(lambda offset, n: data[offset:offset + n], 0, len(data), errors))
+    if errors:
+        raise ValueError(f"'{_fourcc(box_type)}': {errors[0]}")
+    payload = b''.join(
+        _rebuild(data[child.offset + child.header:child.end], child.type, depth + 1, relocate, force_co64)
+        for child in children
+    )
+    return _box_bytes(box_type, payload)
+
+
+def plan_faststart(boxes, read_at):
+    """
+    为 moov 位于 mdat 之后的文件生成 faststart 计划
+
+    Args:
+        boxes: check_structure 返回的顶层 Box 列表（结构需完整）
+        read_at: read_at(offset, n) -> bytes（读取明文）
+
+    Returns:
+        FaststartPlan，已经是 faststart、分片 MP4（moof）或没有 moov 时返回 None
+
+    Raises:
+        ValueError: moov 内部结构异常，无法修正块偏移
+    """
+    types = [box.type for box in boxes]
+    if b'moov' not in types or b'mdat' not in types or b'moof' in types or boxes[0].type != b'ftyp':
+        return None
+    moov = boxes[types.index(b'moov')]
+    if moov.offset < boxes[types.index(b'mdat')].offset:
+        return None
+
+    original = read_at(moov.offset, moov.size)
+    if len(original) != moov.size:
+        raise ValueError("无法读取完整的 moov")
+    payload = original[moov.header:]
+    plan = FaststartPlan(boxes[0].end, moov, original, b'')
+
+    # moov' 的长度决定数据移动的距离，而 stco 溢出升级为 co64 又会改变 moov' 的长度：
+    # 先按原长度计算，长度变化时重新计算（升级只会发生一次，很快收敛）
+    force_co64 = False
+    plan.moov_data = original
+    for _ in range(4):
+        rebuilt = _rebuild(payload, b'moov', 0, plan.relocate, force_co64)
+        if len(rebuilt) == len(plan.moov_data):
+            plan.moov_data = rebuilt
+            return plan
+        force_co64 = force_co64 or len(rebuilt) > len(plan.moov_data)
+        plan.moov_data = rebuilt
+    raise ValueError("无法确定 moov 的长度")
+
+
+def describe(boxes):
+    """顶层 box 的简短描述，如 ftyp(32) moov(1,234) mdat(5,678,900)"""
+    return ' '.join(f"{_fourcc(box.type)}({box.size:,})" for box in boxes)
+
+
+def file_reader(f):
+    """基于文件对象的 read_at（seek + read）"""
+    def read_at(offset, n):
+        f.seek(offset)
+        return f.read(n)
+    return read_at
+
+
+def overlay_reader(head, f):
+    """
+    内存中的文件头 + 文件其余部分的 read_at
+
+    解密时文件头已在内存中解密，而未加密的尾部与输出相同，因此无需写出文件即可检查结构。
+    """
+    head_len = len(head)
+
+    def read_at(offset, n):
+        if offset + n <= head_len:
+            return bytes(head[offset:offset + n])
+        data = bytes(head[offset:head_len]) if offset < head_len else b''
+        f.seek(offset + len(data))
+        return data + f.read(n - len(data))
+    return read_at
+
+
+def check_file(path):
+    """
+    检查单个文件（通过只读 mmap 读取 box 头部，只有被访问的页才会读盘）
+
+    Returns:
+        dict: path / size / ok / boxes（描述）/ errors / seconds
+    """
+    start = time.perf_counter()
+    result = {'path': path, 'size': 0, 'ok': False, 'boxes': '', 'errors': []}
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            result['size'] = size
+            if size == 0:
+                result['errors'] = ["文件为空"]
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    boxes, errors = check_structure(lambda offset, n: mm[offset:offset + n], size)
+                result['boxes'] = describe(boxes)
+                result['errors'] = errors
+                result['ok'] = not errors
+    except (OSError, ValueError) as e:
+        result['errors'] = [f"无法读取: {e}"]
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def iter_mp4_files(paths, extensions=('.mp4', '.m4v', '.mov')):
+    """列出待检查的文件（目录时递归查找，跳过隐藏文件和 .part 临时文件）"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(extensions) and not name.startswith('.'):
+                    yield os.path.join(dirpath, name)
+
+
+def audit(paths, workers=None, executor='process', on_result=None):
+    """
+    并行检查大量输出文件的 box 结构
+
+    每个文件只读取 box 头部所在的页，几千个文件也只需很少的 I/O。
+
+    Args:
+        paths: 文件或目录列表
+        workers: 并发数（默认 CPU 核数）
+        executor: 'process' 或 'thread'
+        on_result: 每检查完一个文件调用 on_result(result)
+
+    Returns:
+        dict: files / ok / failed（失败结果列表）/ bytes / seconds / files_per_sec / mb_per_sec
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    files = list(iter_mp4_files(paths))
+    workers = max(1, workers or os.cpu_count() or 1)
+    start = time.perf_counter()
+    failed = []
+    total_bytes = 0
+
+    pool_cls = ProcessPoolExecutor if executor == 'process' and len(files) > 1 else ThreadPoolExecutor
+    with pool_cls(max_workers=workers) as pool:
+        # 文件很多时按批分发，减少进程间通信
+        chunksize = max(1, min(256, len(files) // (workers * 8) or 1))
+        for result in pool.map(check_file, files, chunksize=chunksize):
+            total_bytes += result['size']
+            if not result['ok']:
+                failed.append(result)
+            if on_result:
+                on_result(result)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'files': len(files),
+        'ok': len(files) - len(failed),
+        'failed': failed,
+        'bytes': total_bytes,
+        'seconds': elapsed,
+        'workers': workers,
+        'files_per_sec': len(files) / elapsed if elapsed > 0 else 0.0,
+        'mb_per_sec': total_bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+三段流水线执行器
+进程池 / 线程池中的每个任务依次完成密钥流加载、下载、解密，CPU、网络和磁盘轮流空闲。
+流水线把它们拆成三个独立的阶段，每个阶段有自己的并发数和输入队列，不同任务的不同阶段同时进行，
+整体吞吐由最慢的资源决定，而不是三者耗时之和：
+
+    keystream   认领账本任务、查找输出库、加载密钥流（CPU：Isaac64 生成或读取缓存）
+    fetch       下载并在接收时解密到输出目录的临时文件，摘要边收边算，密钥不匹配立即停止（网络）；
+                本地文件只发起预读（posix_fadvise WILLNEED），由内核在后台读入页缓存
+    decrypt     下载的文件只校验摘要、原子重命名；本地文件解密写出输出；最后登记输出库（磁盘）
+
+下载的任务与 download_and_decrypt 一样不在磁盘上留下加密副本，也不为校验再读一遍文件。
+
+阶段之间是有界队列：下游处理不过来时上游阻塞在 put 上（背压），不会无限制地预取密钥流或下载文件。
+每个阶段统计忙碌时间（利用率 = 忙碌时间 / (并发数 × 总耗时)）、等待输入的时间、因下游队列已满而阻塞的时间
+和输入队列的峰值，用来判断瓶颈在哪个资源上。
+
+所有阶段都使用线程（网络、磁盘 I/O 与 XOR 运算期间不持有 GIL），与 run_batch 的 'pipeline' 执行器对应。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import time
+import queue
+import threading
+
+import decrypt_wechat_video_cli as core
+import batch_runner
+from content_store import store_digest_options
+from metrics import StageMetrics
+
+PIPELINE_STAGES = ('keystream', 'fetch', 'decrypt')
+DEFAULT_FETCH_WORKERS = 4
+DEFAULT_DECRYPT_WORKERS = 2
+
+_STOP = object()
+
+
+def parse_stage_values(text):
+    """
+    解析 '1,4,2' 形式的三个阶段的取值（只给一个数时三个阶段相同）
+
+    Returns:
+        tuple: (keystream, fetch, decrypt)
+
+    Raises:
+        ValueError: 格式错误或不是正整数
+    """
+    parts = [p.strip() for p in str(text).split(',')]
+    if len(parts) == 1:
+        parts *= len(PIPELINE_STAGES)
+    if len(parts) != len(PIPELINE_STAGES):
+        raise ValueError(f"需要 {len(PIPELINE_STAGES)} 个值（{','.join(PIPELINE_STAGES)}）: {text}")
+    try:
+        values = tuple(int(p) for p in parts)
+    except ValueError:
+        raise ValueError(f"不是整数: {text}") from None
+    if min(values) < 1:
+        raise ValueError(f"必须为正整数: {text}")
+    return values
+
+
+def default_stage_workers(jobs=None):
+    """默认并发：密钥流 1（受 GIL 限制，且有缓存）、下载 jobs（默认 4）、解密 2"""
+    return (1, jobs or DEFAULT_FETCH_WORKERS, DEFAULT_DECRYPT_WORKERS)
+
+
+class StageStats:
+    """单个阶段的统计（线程安全）"""
+
+    def __init__(self, name, workers, queue_depth):
+        self.name = name
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.max_queue = 0
+        self._lock = threading.Lock()
+
+    def record(self, busy=0.0, starved=0.0, blocked=0.0, items=0):
+        with self._lock:
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+            self.items += items
+
+    def observe_queue(self, size):
+        with self._lock:
+            self.max_queue = max(self.max_queue, size)
+
+    def to_dict(self, elapsed):
+        """
+        Returns:
+            dict: workers / queue_depth / items / busy_seconds / starved_seconds / blocked_seconds / max_queue /
+                  utilization（忙碌时间占 并发数 × 总耗时 的比例）
+        """
+        capacity = self.workers * elapsed
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue_depth,
+            'items': self.items,
+            'busy_seconds': self.busy,
+            'starved_seconds': self.starved,
+            'blocked_seconds': self.blocked,
+            'max_queue': self.max_queue,
+            'utilization': self.busy / capacity if capacity > 0 else 0.0,
+        }
+
+
+class PipelineExecutor:
+    """
+    三段流水线执行器
+
+    Args:
+        workers: 各阶段并发数 (keystream, fetch, decrypt)，默认见 default_stage_workers
+        queue_depths: 各阶段输入队列的容量（默认为该阶段并发数的 2 倍）
+        chunk_size: 下载与复制的块大小
+        ledger / store / store_link: 同 batch_runner.run_job
+    """
+
+    def __init__(self, workers=None, queue_depths=None, chunk_size=core.DEFAULT_CHUNK_SIZE,
+                 ledger=None, store=None, store_link='hardlink'):
+        self.workers = tuple(workers or default_stage_workers())
+        self.queue_depths = tuple(queue_depths or (2 * n for n in self.workers))
+        self.chunk_size = chunk_size
+        self.ledger = ledger
+        self.store = store
+        self.store_link = store_link
+        self.stats = [StageStats(name, n, depth)
+                      for name, n, depth in zip(PIPELINE_STAGES, self.workers, self.queue_depths)]
+        self._funcs = (self._keystream_stage, self._fetch_stage, self._decrypt_stage)
+        self._queues = None
+        self._results = None
+        self._remaining = None
+        self._lock = threading.Lock()
+
+    def run(self, jobs):
+        """
+        执行任务
+
+        Yields:
+            dict: 每完成一个任务产出其结果（字段见 batch_runner.run_job），顺序为完成顺序
+        """
+        self._queues = [queue.Queue(maxsize=depth) for depth in self.queue_depths]
+        self._results = queue.Queue()
+        self._remaining = list(self.workers)
+        threads = [threading.Thread(target=self._feed, args=(jobs,), name='pipeline-feed', daemon=True)]
+        for index, name in enumerate(PIPELINE_STAGES):
+            for n in range(self.workers[index]):
+                threads.append(threading.Thread(target=self._work, args=(index,),
+                                                name=f'pipeline-{name}-{n}', daemon=True))
+        for thread in threads:
+            thread.start()
+        while True:
+            result = self._results.get()
+            if result is _STOP:
+                break
+            yield result
+        for thread in threads:
+            thread.join()
+
+    def stage_stats(self, elapsed):
+        """{阶段: StageStats.to_dict(elapsed)}"""
+        return {stats.name: stats.to_dict(elapsed) for stats in self.stats}
+
+    def _feed(self, jobs):
+        inbox = self._queues[0]
+        for job in jobs:
+            task = {'job': job, 'result': batch_runner.new_result(job), 'stages': StageMetrics(),
+                    'start': time.perf_counter(), 'book': None, 'store': None, 'keystream': None,
+                    'temp': None, 'outcome': None, 'digests': None}
+            inbox.put(task)
+            self.stats[0].observe_queue(inbox.qsize())
+        for _ in range(self.workers[0]):
+            inbox.put(_STOP)
+
+    def _work(self, index):
+        stats = self.stats[index]
+        inbox = self._queues[index]
+        outbox = self._queues[index + 1] if index + 1 < len(self._queues) else None
+        func = self._funcs[index]
+        while True:
+            waited = time.perf_counter()
+            task = inbox.get()
+            began = time.perf_counter()
+            if task is _STOP:
+                break
+            try:
+                proceed = func(task)
+            except Exception as e:
+                task['result'].update(ok=False, error=f"{type(e).__name__}: {e}")
+                proceed = False
+            if proceed and outbox is not None:
+                ended = time.perf_counter()
+                outbox.put(task)  # 下游队列已满时在此阻塞（背压）
+                self.stats[index + 1].observe_queue(outbox.qsize())
+            else:
+                self._finish(task)
+                ended = time.perf_counter()
+            stats.record(busy=ended - began, starved=began - waited, blocked=time.perf_counter() - ended, items=1)
+
+        with self._lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+        if last:
+            if outbox is not None:
+                for _ in range(self.workers[index + 1]):
+                    outbox.put(_STOP)
+            else:
+                self._results.put(_STOP)
+
+    def _finish(self, task):
+        result = task['result']
+        if task['temp'] and not (task['outcome'] and task['outcome'].saved):
+            core.discard_temp(task['temp'])  # 只清理本任务下载后未发布的临时文件
+        if result['stages'] is None and task['stages']:
+            result['stages'] = task['stages'].to_dict()
+        batch_runner.finish_job(task['job'], result, task['book'], task['start'])
+        self._results.put(result)
+
+    def _keystream_stage(self, task):
+        job, result = task['job'], task['result']
+        proceed, task['book'], task['store'] = batch_runner.begin_job(job, result, self.ledger, self.store,
+                                                                      self.store_link)
+        if not proceed:
+            return False
+        if not job.get('download') and not batch_runner.check_input(job, result):
+            return False
+        with task['stages'].measure('keystream') as info:
+            keystream = batch_runner.load_job_keystream(job)
+            info['bytes'] = len(keystream) if keystream else 0
+        if not keystream:
+            result['error'] = "无法读取密钥流"
+            return False
+        task['keystream'] = keystream
+        return True
+
+    def _fetch_stage(self, task):
+        job, result = task['job'], task['result']
+        if not job.get('download'):
+            with task['stages'].measure('fetch', result['bytes']):
+                _prefetch(job['input'])
+            return True
+
+        from stream_download import receive_decrypted
+
+        os.makedirs(os.path.dirname(os.path.abspath(job['output'])), exist_ok=True)
+        digest = batch_runner.job_digest_options(job)
+        if task['store'] is not None:
+            digest = store_digest_options(digest)
+        if digest['hashes'] or digest['expected']:
+            task['digests'] = core.DigestSet(digest['hashes'], digest['expected'], digest['digest_source'])
+        outcome = task['outcome'] = core.DecryptResult(job['output'])
+        outcome.stages = task['stages']
+        task['temp'] = core.temp_output_path(job['output'])
+        with task['stages'].measure('fetch') as info:
+            received = receive_decrypted(
+                job['url'], task['keystream'], task['temp'], outcome, task['digests'],
+                url_token=job.get('url_token') or '', chunk_size=self.chunk_size,
+                expected_size=job.get('expected_size'), fsync=task['book'] is not None
+            )
+            info['bytes'] = outcome.bytes
+        result['bytes'] = outcome.bytes
+        if not received:
+            result['error'] = outcome.error
+        return received
+
+    def _decrypt_stage(self, task):
+        job, result = task['job'], task['result']
+        if not job.get('download'):
+            batch_runner.decrypt_job(job, task['keystream'], result, task['stages'], self.chunk_size,
+                                     fsync=task['book'] is not None, store=task['store'])
+            return True
+
+        from stream_download import publish_download
+
+        # 数据已在下载阶段解密并算好摘要，这里只校验、重命名、登记输出库
+        outcome = task['outcome']
+        publish_download(outcome, task['digests'], task['temp'], job['output'])
+        result.update(ok=bool(outcome), digests=outcome.digests or None, verified=outcome.verified,
+                      error=None if outcome else outcome.error)
+        if outcome and task['store'] is not None:
+            batch_runner.ingest_output(job, result, task['store'], outcome)
+        return True
+
+
+def _prefetch(path):
+    """通知内核预读整个文件（不支持 posix_fadvise 的平台上什么也不做）"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def print_pipeline_stats(stats):
+    """打印各阶段的利用率、等待与背压（利用率最高的阶段即瓶颈）"""
+    if not stats:
+        return
+    print("   🏭 流水线各阶段:")
+    for name, values in stats.items():
+        print(f"      {name:<9} 并发 {values['workers']:>2}, 利用率 {values['utilization']:6.1%}, "
+              f"忙碌 {values['busy_seconds']:8.3f} s, 等待输入 {values['starved_seconds']:8.3f} s, "
+              f"下游阻塞 {values['blocked_seconds']:8.3f} s, 队列峰值 {values['max_queue']}/{values['queue_depth']}")
+    bottleneck = max(stats, key=lambda name: stats[name]['utilization'])
+    print(f"      瓶颈: {bottleneck}（可提高该阶段的并发数，见 --stage-workers）")
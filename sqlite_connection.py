@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+SQLite 短连接
+任务账本（job_ledger.py）与输出库索引（content_store.py）共用：每次操作打开一个独立的连接，
+进入时开始 IMMEDIATE 事务，退出时提交或回滚并关闭，因此可以在进程池、线程池中直接使用。
+使用回滚日志而不是 WAL，以便在网络文件系统上由多台主机共享。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import sqlite3
+
+# 等待其他进程释放写锁的最长时间（秒）
+BUSY_TIMEOUT_SECONDS = 60
+
+
+def connect(path):
+    """
+    打开 path 的短连接
+
+    Returns:
+        Connection: 用作上下文管理器，在 with 块内执行语句
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return Connection(conn)
+
+
+class Connection:
+    """短连接：进入时开始 IMMEDIATE 事务（立即获取写锁），退出时提交或回滚并关闭"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._conn.close()
+
+    def execute(self, sql, params=()):
+        return self._conn.execute(sql, params)
+
+    def fetchone(self, sql, params=()):
+        row = self._conn.execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def fetchall(self, sql, params=()):
+        return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
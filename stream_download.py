@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+边下载边解密
+直接流式读取视频号 CDN 的 HTTP 响应：前 131072 字节到达时即用密钥流 XOR，
+明文直接写入目标文件（先写 .part，完成后原子重命名），不在磁盘上留下加密副本。
+连接按主机复用（HTTP/1.1 keep-alive），批量下载时无需反复握手。
+receive_decrypted / publish_download 把下载解密与校验、发布拆开，供流水线执行器（pipeline.py）分两个阶段调用。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import time
+import threading
+import http.client
+from urllib.parse import urlsplit, urljoin
+
+import decrypt_wechat_video_cli as core
+from mp4_boxes import file_reader
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Accept': '*/*',
+}
+MAX_REDIRECTS = 5
+
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# 复用的空闲连接可能已被服务器关闭，这些错误会用新连接重试一次
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                            ConnectionResetError, BrokenPipeError)
+
+
+def build_media_url(url, url_token=''):
+    """拼接 API 响应中的 url 与 url_token（url_token 以 & 开头，直接追加）"""
+    if not url_token:
+        return url
+    if url_token.startswith(('&', '?')) or url.endswith(('&', '?')):
+        return url + url_token
+    return url + ('&' if '?' in url else '?') + url_token
+
+
+class ConnectionPool:
+    """
+    按 (scheme, host, port) 复用的 HTTP 连接池（线程安全）
+
+    Args:
+        max_per_host: 每个主机保留的空闲连接数上限
+        timeout: 连接与读取超时（秒）
+    """
+
+    def __init__(self, max_per_host=4, timeout=DEFAULT_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scheme, host, port):
+        """
+        取出一个连接（优先复用空闲连接）
+
+        Returns:
+            tuple: (连接, 是否为复用的连接)
+        """
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout), False
+
+    def release(self, scheme, host, port, conn):
+        """归还连接；响应未读完或连接已关闭时直接丢弃"""
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if conn.sock is not None and len(idle) < self.max_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """返回进程内共享的默认连接池"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
+
+
+def _open(url, pool, headers):
+    """
+    发起 GET 请求并跟随重定向
+
+    Returns:
+        tuple: (响应, 连接, 连接池键, 最终 URL)
+
+    Raises:
+        OSError: 网络错误或非 200 状态码
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise OSError(f"不支持的 URL 协议: {parts.scheme or url}")
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for attempt in range(2):
+            conn, reused = pool.acquire(*key)
+            try:
+                conn.request('GET', path, headers=headers)
+                resp = conn.getresponse()
+                break
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+
+        if resp.status in _REDIRECT_STATUSES and resp.getheader('Location'):
+            resp.read()
+            pool.release(*key, conn)
+            url = urljoin(url, resp.getheader('Location'))
+            continue
+        if resp.status != 200:
+            resp.read()
+            pool.release(*key, conn)
+            raise OSError(f"HTTP {resp.status} {resp.reason}")
+        return resp, conn, key, url
+    raise OSError(f"重定向次数超过 {MAX_REDIRECTS}")
+
+
+def download_and_decrypt(url, keystream, output_file, url_token='', verbose=True,
+                         chunk_size=core.DEFAULT_CHUNK_SIZE, pool=None, headers=None, expected_size=None,
+                         hashes=(), expected=None, digest_source='output', on_progress=None, fsync=False):
+    """
+    流式下载并解密视频（不写出加密副本）
+
+    Args:
+        url: 视频地址（API 响应中的 url）
+        keystream: 密钥流数据
+        output_file: 输出文件路径
+        url_token: API 响应中的 url_token（追加在 url 之后）
+        verbose: 是否显示详细信息
+        chunk_size: 每次从网络读取的块大小
+        pool: ConnectionPool（默认使用进程内共享的连接池）
+        headers: 额外的请求头
+        expected_size: 预期文件大小（API 响应中的 file_size），不符时视为失败
+        hashes / expected / digest_source: 同 decrypt_video，摘要在接收数据时顺带计算
+        on_progress: 进度回调 on_progress(已接收字节数, 总字节数或 None)
+        fsync: 重命名前是否将输出刷新到磁盘
+
+    Returns:
+        DecryptResult: 解密结果（可直接当作 bool 使用）
+    """
+    result = core.DecryptResult(output_file)
+    digests = core.DigestSet(hashes, expected, digest_source) if (hashes or expected) else None
+    full_url = build_media_url(url, url_token)
+    if verbose:
+        print(f"\n🌐 下载并解密: {urlsplit(full_url).netloc}{urlsplit(full_url).path}")
+
+    tmp_path = core.temp_output_path(output_file)
+    start = time.perf_counter()
+    if receive_decrypted(full_url, keystream, tmp_path, result, digests, chunk_size=chunk_size, pool=pool,
+                         headers=headers, expected_size=expected_size, on_progress=on_progress, fsync=fsync,
+                         verbose=verbose):
+        publish_download(result, digests, tmp_path, output_file, verbose)
+    elapsed = time.perf_counter() - start
+
+    if result.saved:
+        if verbose:
+            speed = result.bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0.0
+            print(f"   ✅ 已保存: {output_file} ({result.bytes:,} bytes, {elapsed:.2f} s, {speed:.2f} MB/s)")
+    elif verbose and result.verified is not False:  # 摘要不匹配已由 record_digests 打印
+        print(f"   ❌ {result.error}")
+    return result
+
+
+def receive_decrypted(url, keystream, tmp_path, result, digests=None, url_token='',
+                      chunk_size=core.DEFAULT_CHUNK_SIZE, pool=None, headers=None, expected_size=None,
+                      on_progress=None, fsync=False, verbose=False):
+    """
+    下载并在接收时解密到临时文件（不重命名）：前 len(keystream) 字节边收边 XOR，摘要边收边算，
+    收到前 32 字节即检查签名，密钥不匹配立即停止下载。download_and_decrypt 与流水线执行器的下载阶段共用。
+
+    Args:
+        tmp_path: 写入的临时文件（失败时删除），成功后交给 publish_download 校验并重命名
+        result: DecryptResult，写入 valid_mp4 / bytes / boxes / structure_errors / copy_method / error
+        digests: DigestSet（可选），在接收数据时更新
+        其余参数同 download_and_decrypt
+
+    Returns:
+        bool: 下载完整且是结构有效的 MP4
+    """
+    pool = pool or get_default_pool()
+    request_headers = dict(DEFAULT_HEADERS)
+    request_headers.update(headers or {})
+
+    try:
+        resp, conn, key, _ = _open(build_media_url(url, url_token), pool, request_headers)
+    except (OSError, http.client.HTTPException) as e:
+        result.error = f"下载失败: {e}"
+        return False
+
+    total = resp.length
+    if verbose and total is not None:
+        print(f"   文件大小: {total:,} bytes ({total / 1024 / 1024:.2f} MB)")
+    if expected_size and total is not None and total != expected_size:
+        resp.close()
+        conn.close()
+        result.error = f"服务器返回的大小与 file_size 不符: {total:,} / {expected_size:,} bytes"
+        return False
+
+    keystream = memoryview(keystream)
+    key_len = len(keystream)
+    received = 0
+    complete = False
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+
+    try:
+        with open(tmp_path, 'wb') as dst:
+            signature = bytearray()
+            while True:
+                # 文件头部分按密钥流边界读取，密钥流之后的数据原样写出
+                want = min(chunk_size, key_len - received) if received < key_len else chunk_size
+                n = resp.readinto(view[:want])
+                if not n:
+                    break
+                chunk = view[:n]
+                if received < key_len:
+                    if digests:
+                        digests.update_head('input', chunk)
+                    core.xor_inplace(chunk, keystream[received:received + n])
+                    if digests:
+                        digests.update_head('output', chunk)
+                elif digests:
+                    digests.update(chunk)
+                dst.write(chunk)
+                received += n
+                if on_progress:
+                    on_progress(received, total)
+
+                if len(signature) < 32:
+                    signature += chunk[:32 - len(signature)]
+                    if len(signature) == 32 or received == total:
+                        result.valid_mp4 = b'ftyp' in signature
+                        if not result.valid_mp4:
+                            # 密钥不匹配时立即停止，不再浪费带宽
+                            break
+            if fsync:
+                dst.flush()
+                os.fsync(dst.fileno())
+
+        if len(signature) < 32:
+            result.valid_mp4 = b'ftyp' in signature  # 文件不足 32 字节
+
+        result.bytes = received
+        if not result.valid_mp4:
+            result.error = ("未找到 'ftyp' 签名（密钥流可能与视频不匹配）" if received
+                            else "服务器返回了空文件")
+        elif total is not None and received != total:
+            result.error = f"连接中断，数据不完整: {received:,} / {total:,} bytes"
+        elif expected_size and received != expected_size:
+            result.error = f"文件大小与 file_size 不符: {received:,} / {expected_size:,} bytes"
+        else:
+            complete = True
+            result.copy_method = 'http'
+            # 写入的就是明文，直接检查 box 结构（下载完整但文件本身损坏时不保留输出）
+            with open(tmp_path, 'rb') as f:
+                result.check_structure(file_reader(f), received)
+    except (OSError, http.client.HTTPException) as e:
+        result.error = f"下载失败: {e}"
+    finally:
+        # 只有完整读完的响应才能复用连接
+        if complete and resp.isclosed():
+            pool.release(*key, conn)
+        else:
+            resp.close()
+            conn.close()
+
+    ok = complete and result.error is None and not result.structure_errors
+    if not ok:
+        core.discard_temp(tmp_path)
+    return ok
+
+
+def publish_download(result, digests, tmp_path, output_file, verbose=False):
+    """
+    校验 receive_decrypted 算好的摘要，通过（或未要求校验）时把临时文件原子重命名为输出；
+    摘要不匹配时删除临时文件，不发布输出
+
+    Returns:
+        bool: 是否已保存
+    """
+    result.output = output_file
+    result.record_digests(digests, verbose)
+    if result.verified is False:
+        core.discard_temp(tmp_path)
+        return False
+    try:
+        os.replace(tmp_path, output_file)
+    except OSError as e:
+        core.discard_temp(tmp_path)
+        result.error = f"保存失败: {e}"
+        return False
+    result.saved = True
+    return True
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+本地解密流媒体服务
+基于 asyncio 的 HTTP 服务，GET /video/<id> 直接返回解密后的视频，不写出任何解密副本：
+只有与前 128 KB 加密区域重叠的字节范围会在内存中 XOR，其余部分通过 sendfile 零拷贝发送。
+支持 Range / 206，播放器可以任意拖动进度条。
+
+<id> 为视频相对于根目录的路径（不含 .mp4），密钥来源与监视模式相同：
+同名旁路文件 <id>.ksb / <id>.keystream.txt / <id>.key / <id>.json，或启动时给出的默认 -k / -H / -d。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import json
+import asyncio
+from email.utils import formatdate
+from urllib.parse import unquote, urlsplit
+
+import batch_runner
+import decrypt_wechat_video_cli as core
+from watch_folder import find_sidecar, VIDEO_EXTENSIONS
+
+MAX_HEADER_BYTES = 64 * 1024
+KEEPALIVE_TIMEOUT = 30.0
+
+HTTP_REASONS = {
+    200: 'OK', 204: 'No Content', 206: 'Partial Content', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large',
+    416: 'Range Not Satisfiable', 500: 'Internal Server Error',
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=''):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_request_head(head):
+    """
+    解析请求行与请求头
+
+    Returns:
+        tuple: (method, target, version, headers)，请求头名称为小写
+
+    Raises:
+        ValueError: 请求格式错误
+    """
+    lines = head.decode('latin-1').split('\r\n')
+    method, target, version = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+def wants_keep_alive(version, headers):
+    """HTTP/1.1 默认保持连接，HTTP/1.0 需要显式 keep-alive"""
+    connection = headers.get('connection', '').lower()
+    return (connection != 'close') if version == 'HTTP/1.1' else (connection == 'keep-alive')
+
+
+def write_response_head(writer, status, headers, keep_alive):
+    """写出状态行与响应头"""
+    lines = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}", f"Date: {formatdate(usegmt=True)}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+
+async def send_json(writer, status, obj, keep_alive, method='GET', headers=None):
+    """发送 JSON 响应（HEAD 请求只发送响应头，Content-Length 仍为正文长度）"""
+    body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    response_headers = {'Content-Type': 'application/json; charset=utf-8', 'Content-Length': len(body)}
+    response_headers.update(headers or {})
+    write_response_head(writer, status, response_headers, keep_alive)
+    if method != 'HEAD':
+        writer.write(body)
+    await writer.drain()
+
+
+def parse_range(header, size):
+    """
+    解析单个 Range 请求头
+
+    Args:
+        header: Range 请求头的值（如 "bytes=0-1023"、"bytes=1024-"、"bytes=-500"）
+        size: 文件大小
+
+    Returns:
+        tuple: (start, end)，end 为包含在内的最后一个字节；不是单一字节范围或语法无效（如 "bytes=500-100"）时
+               返回 None，按 RFC 9110 忽略 Range，以 200 返回整个文件
+
+    Raises:
+        HTTPError: 416，语法有效但范围超出文件
+    """
+    unit, _, spec = (header or '').partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.strip().partition('-'))
+    if not sep or (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        return None
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = int(last) if last else size - 1
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            raise HTTPError(416)
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size:
+        raise HTTPError(416)
+    return start, min(end, size - 1)
+
+
+class VideoServer:
+    """
+    解密流媒体服务
+
+    Args:
+        root: 加密视频所在目录
+        defaults: 没有旁路文件时使用的密钥流来源（keystream_file / keystream_hex / decode_key）
+        chunk_size: 读取加密区域时的块大小
+        verbose: 是否输出访问日志
+    """
+
+    def __init__(self, root, defaults=None, chunk_size=core.DEFAULT_CHUNK_SIZE, verbose=True):
+        self.root = os.path.abspath(root)
+        self.defaults = {k: v for k, v in (defaults or {}).items() if v}
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        self.stats = {'requests': 0, 'active': 0, 'bytes_xor': 0, 'bytes_sendfile': 0}
+
+    def log(self, message):
+        if self.verbose:
+            print(message, flush=True)
+
+    # ------------------------------------------------------------
+    # 视频与密钥流查找
+    # ------------------------------------------------------------
+
+    def resolve(self, video_id):
+        """<id> → 视频路径（拒绝根目录之外的路径）"""
+        video_id = unquote(video_id).strip('/')
+        if not video_id or '\0' in video_id:
+            raise HTTPError(404, "视频不存在")
+        path = os.path.abspath(os.path.join(self.root, video_id))
+        if not path.lower().endswith(VIDEO_EXTENSIONS):
+            path += VIDEO_EXTENSIONS[0]
+        if os.path.commonpath([path, self.root]) != self.root or not os.path.isfile(path):
+            raise HTTPError(404, "视频不存在")
+        return path
+
+    def keystream_for(self, path):
+        """读取视频对应的密钥流（进程内有缓存，见 batch_runner.load_job_keystream）"""
+        source = find_sidecar(path) or self.defaults
+        if not source:
+            raise HTTPError(404, "缺少密钥（没有旁路文件，也没有默认的 -k / -H / -d）")
+        job = {k: source[k] for k in batch_runner.KEYSTREAM_FIELDS if source.get(k)}
+        keystream = batch_runner.load_job_keystream(job)
+        if not keystream:
+            raise HTTPError(500, "无法读取密钥流")
+        return keystream
+
+    def list_videos(self):
+        videos = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(VIDEO_EXTENSIONS) and not name.startswith('.'):
+                    rel = os.path.relpath(os.path.join(dirpath, name), self.root)
+                    videos.append(os.path.splitext(rel)[0].replace(os.sep, '/'))
+        return videos
+
+    # ------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------
+
+    async def handle(self, reader, writer):
+        """处理一个连接（HTTP/1.1 keep-alive）"""
+        self.stats['active'] += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send_error(writer, HTTPError(400, "请求头过大"), False)
+                    break
+                keep_alive = await self._handle_request(head, writer)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.stats['active'] -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(self, head, writer):
+        self.stats['requests'] += 1
+        try:
+            method, target, version, headers = parse_request_head(head)
+        except ValueError:
+            await self._send_error(writer, HTTPError(400, "无效的请求"), False)
+            return False
+
+        keep_alive = wants_keep_alive(version, headers)
+
+        try:
+            if method not in ('GET', 'HEAD'):
+                raise HTTPError(405)
+            path = urlsplit(target).path
+            if path in ('/', '/video', '/video/'):
+                await send_json(writer, 200, {'videos': self.list_videos()}, keep_alive, method)
+            elif path.startswith('/video/'):
+                await self._send_video(writer, path[len('/video/'):], method, headers, keep_alive)
+            else:
+                raise HTTPError(404)
+        except HTTPError as e:
+            await self._send_error(writer, e, keep_alive, method)
+        except ConnectionError:
+            return False
+        except Exception as e:
+            await self._send_error(writer, HTTPError(500, f"{type(e).__name__}: {e}"), False, method)
+            return False
+        return keep_alive
+
+    async def _send_error(self, writer, error, keep_alive, method='GET'):
+        """发送 JSON 错误响应（HEAD 请求只发送响应头）"""
+        await send_json(writer, error.status, {'error': error.message or HTTP_REASONS.get(error.status, '')},
+                        keep_alive, method)
+
+    async def _send_video(self, writer, video_id, method, headers, keep_alive):
+        loop = asyncio.get_running_loop()
+        path = self.resolve(video_id)
+        keystream = await loop.run_in_executor(None, self.keystream_for, path)
+
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            etag = f'"{size:x}-{st.st_mtime_ns:x}"'
+            response_headers = {
+                'Content-Type': 'video/mp4',
+                'Accept-Ranges': 'bytes',
+                'ETag': etag,
+                'Last-Modified': formatdate(st.st_mtime, usegmt=True),
+            }
+
+            byte_range = None
+            if 'range' in headers and headers.get('if-range', etag) == etag:
+                try:
+                    byte_range = parse_range(headers['range'], size)
+                except HTTPError:
+                    response_headers['Content-Range'] = f"bytes */{size}"
+                    response_headers['Content-Length'] = 0
+                    write_response_head(writer, 416, response_headers, keep_alive)
+                    await writer.drain()
+                    return
+
+            if byte_range is None:
+                status, start, end = 200, 0, size - 1
+            else:
+                status, (start, end) = 206, byte_range
+                response_headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+            length = max(end - start + 1, 0)
+            response_headers['Content-Length'] = length
+
+            write_response_head(writer, status, response_headers, keep_alive)
+            if method != 'HEAD' and length:
+                await self._send_range(writer, f, keystream, start, length)
+            await writer.drain()
+
+        self.log(f"📤 {method} /video/{video_id} {status} {start}-{end}/{size}")
+
+    async def _send_range(self, writer, f, keystream, start, length):
+        """发送 [start, start+length)：加密区域内读取并 XOR，其余部分 sendfile"""
+        loop = asyncio.get_running_loop()
+        key_len = min(len(keystream), os.fstat(f.fileno()).st_size)
+        pos, end = start, start + length
+
+        while pos < min(end, key_len):
+            n = min(self.chunk_size, key_len - pos, end - pos)
+            data = await loop.run_in_executor(None, self._read_decrypted, f, keystream, pos, n)
+            if not data:
+                raise ConnectionError("文件在发送过程中被截断")
+            writer.write(data)
+            await writer.drain()
+            pos += len(data)
+            self.stats['bytes_xor'] += len(data)
+
+        if pos < end:
+            await writer.drain()
+            # 尾部未加密：交给内核零拷贝发送（不支持时 asyncio 会自动回退为读写）
+            sent = await loop.sendfile(writer.transport, f, pos, end - pos)
+            self.stats['bytes_sendfile'] += sent
+
+    @staticmethod
+    def _read_decrypted(f, keystream, pos, n):
+        # 每个请求独占自己的文件对象，seek + read 不会与其他请求冲突
+        f.seek(pos)
+        data = bytearray(f.read(n))
+        core.xor_inplace(data, memoryview(keystream)[pos:pos + len(data)])
+        return data
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        """启动服务（阻塞直到被取消）"""
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        addresses = ', '.join(f"http://{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+        self.log(f"🎞️  解密流媒体服务: {addresses}/video/<id>")
+        self.log(f"📂 视频目录: {self.root}")
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(root, host='127.0.0.1', port=8000, defaults=None, chunk_size=core.DEFAULT_CHUNK_SIZE, verbose=True):
+    """启动解密流媒体服务（Ctrl+C 退出）"""
+    server = VideoServer(root, defaults, chunk_size, verbose)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    return server
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+视频版本（spec）规划
+API 响应的每个媒体除了原始文件（url / file_size / md5sum / bitrate / width / height / video_play_len）外，
+还在 spec 中列出服务器转码的其他版本（file_format 如 xWT111，以及 bit_rate / first_load_bytes /
+width / height / coding_format / duration_ms 等）。下载时在 url 后追加 X-snsvideoflag=<file_format> 即可取得对应版本，
+使用的 decode_key 不变。
+
+规划器为每个下载任务选出符合预算的版本，并在运行前估算整批的下载量和耗时：
+
+    - 单个任务的存储预算（max_bytes）与码率上限（max_kbps），可限定编码（如只要 h264）
+    - 整批的总量预算（budget）：超出时从最大的任务开始逐级换成更小的版本，仍然超出时放弃排在最后的任务
+
+spec 中的 bit_rate 单位为 KiB/s，版本大小按 bit_rate × 时长估算（原始版本使用 file_size，是精确值）。
+选中转码版本时，响应中的 file_size / md5sum 描述的是原始文件，不再用于校验。
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import heapq
+
+VARIANT_ORIGINAL = 'original'
+VARIANT_AUTO = 'auto'
+VARIANT_SMALLEST = 'smallest'
+VARIANT_CHOICES = (VARIANT_AUTO, VARIANT_ORIGINAL, VARIANT_SMALLEST)
+
+# Web 端播放器请求转码版本时使用的查询参数
+VARIANT_URL_PARAM = 'X-snsvideoflag'
+
+DEFAULT_BANDWIDTH_MBPS = 10.0
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def parse_variants(media):
+    """
+    列出媒体的所有版本
+
+    Args:
+        media: api_response 的媒体记录或由其生成的任务（file_size 或 expected_size / bitrate / width / height /
+               video_play_len / spec）
+
+    Returns:
+        list: 每个版本为 dict：format（原始版本为 'original'）/ width / height / codec / kbps /
+              bytes（估算或精确大小）/ exact / first_load_bytes / duration，按画质从高到低排列
+    """
+    duration = _number(media.get('video_play_len'))
+    variants = []
+    size = _number(media.get('file_size') or media.get('expected_size'))
+    if size or not media.get('spec'):
+        bitrate = _number(media.get('bitrate'))
+        if not bitrate and size and duration:
+            bitrate = size * 8 / duration
+        variants.append({
+            'format': VARIANT_ORIGINAL,
+            'width': int(_number(media.get('width')) or 0),
+            'height': int(_number(media.get('height')) or 0),
+            'codec': None,
+            'kbps': int(bitrate / 1000) if bitrate else None,
+            'bytes': int(size) if size else None,
+            'exact': bool(size),
+            'first_load_bytes': None,
+            'duration': duration,
+        })
+
+    for spec in media.get('spec') or []:
+        if not isinstance(spec, dict) or not spec.get('file_format'):
+            continue
+        seconds = (_number(spec.get('duration_ms')) or 0) / 1000 or duration
+        kib_per_sec = _number(spec.get('bit_rate'))
+        kbps = (_number(spec.get('video_bitrate')) or 0) + (_number(spec.get('audio_bitrate')) or 0)
+        if not kbps and kib_per_sec:
+            kbps = kib_per_sec * 1024 * 8 / 1000
+        if kib_per_sec and seconds:
+            estimate = int(kib_per_sec * 1024 * seconds)
+        elif kbps and seconds:
+            estimate = int(kbps * 1000 / 8 * seconds)
+        else:
+            estimate = None
+        variants.append({
+            'format': str(spec['file_format']),
+            'width': int(_number(spec.get('width')) or 0),
+            'height': int(_number(spec.get('height')) or 0),
+            'codec': spec.get('coding_format') or None,
+            'kbps': int(kbps) if kbps else None,
+            'bytes': estimate,
+            'exact': False,
+            'first_load_bytes': spec.get('first_load_bytes'),
+            'duration': seconds,
+        })
+
+    variants.sort(key=_quality, reverse=True)
+    return variants
+
+
+def _quality(variant):
+    """画质排序键：分辨率优先；分辨率相同时原始版本（未经转码）优先，其次比较码率"""
+    return (variant['width'] * variant['height'], variant['format'] == VARIANT_ORIGINAL, variant['kbps'] or 0)
+
+
+def fitting_variants(variants, max_bytes=None, max_kbps=None, codec=None):
+    """
+    符合单个任务预算的版本（顺序同 parse_variants）
+
+    Args:
+        max_bytes: 单个视频的大小上限（字节）；大小未知的版本视为不符合
+        max_kbps: 码率上限（kbps）；码率未知的版本视为不符合
+        codec: 只保留该编码（如 'h264'）；原始版本的编码未知，指定时不会被选中
+    """
+    fitting = []
+    for variant in variants:
+        if max_bytes is not None and (variant['bytes'] is None or variant['bytes'] > max_bytes):
+            continue
+        if max_kbps is not None and (variant['kbps'] is None or variant['kbps'] > max_kbps):
+            continue
+        if codec and (variant['codec'] or '').lower() != codec.lower():
+            continue
+        fitting.append(variant)
+    return fitting
+
+
+def choose_variant(variants, variant=VARIANT_AUTO, max_bytes=None, max_kbps=None, codec=None):
+    """
+    选出一个版本
+
+    Args:
+        variants: parse_variants 的结果
+        variant: 'auto'（符合预算的最高画质）/ 'smallest'（符合预算的最小版本）/
+                 'original'（原始版本）/ 具体的 file_format（如 'xWT111'）
+
+    Returns:
+        tuple: (版本 dict 或 None, 未选中时的原因)
+    """
+    if variant not in (VARIANT_AUTO, VARIANT_SMALLEST):
+        for candidate in variants:
+            if candidate['format'].lower() == variant.lower():
+                return candidate, None
+        available = ', '.join(v['format'] for v in variants) or '无'
+        return None, f"响应中没有版本 {variant}（可用: {available}）"
+
+    fitting = fitting_variants(variants, max_bytes, max_kbps, codec)
+    if not fitting:
+        sizes = [v['bytes'] for v in variants if v['bytes']]
+        smallest = f"，最小版本约 {min(sizes) / 1024 / 1024:.2f} MB" if sizes else ''
+        return None, f"没有符合预算或编码要求的版本{smallest}"
+    if variant == VARIANT_SMALLEST:
+        return min(fitting, key=lambda v: (v['bytes'] is None, v['bytes'] or 0)), None
+    return fitting[0], None
+
+
+def variant_url(url, variant_format):
+    """请求指定版本的 url（原始版本原样返回）"""
+    if not variant_format or variant_format == VARIANT_ORIGINAL:
+        return url
+    separator = '&' if '?' in url else '?'
+    return f"{url}{separator}{VARIANT_URL_PARAM}={variant_format}"
+
+
+def apply_variant(job, chosen):
+    """把选中的版本写入任务：下载地址、估算大小；转码版本不再使用原始文件的 file_size / md5sum 校验"""
+    if 'original_url' not in job:
+        job['original_url'] = job['url']
+    job['variant'] = chosen['format']
+    job['estimated_bytes'] = chosen['bytes']
+    job['url'] = variant_url(job['original_url'], chosen['format'])
+    if chosen['format'] != VARIANT_ORIGINAL:
+        job['expected_size'] = None
+        job['md5sum'] = None
+
+
+def plan_jobs(jobs, variant=VARIANT_AUTO, max_bytes=None, max_kbps=None, codec=None, budget=None):
+    """
+    为下载任务选择版本（直接修改任务），并在整批超出总量预算时逐级降低画质
+
+    只处理带 url 的任务；已有 error 的任务保持不变，没有符合预算的版本时写入 error。
+
+    Args:
+        jobs: 任务列表（api_response.build_jobs 的结果）
+        variant / max_bytes / max_kbps / codec: 见 choose_variant
+        budget: 整批的下载量上限（字节，可选）
+
+    Returns:
+        dict: 规划结果 planned / bytes / unknown（大小未知的任务数）/ rejected / downgraded / dropped /
+              formats {版本: 任务数}
+    """
+    plan = {'planned': 0, 'bytes': 0, 'unknown': 0, 'rejected': 0, 'downgraded': 0, 'dropped': 0, 'formats': {}}
+    options = {}
+    for job in jobs:
+        if job.get('error') or not job.get('url'):
+            continue
+        variants = parse_variants(job)
+        chosen, error = choose_variant(variants, variant, max_bytes, max_kbps, codec)
+        if chosen is None:
+            job['error'] = error
+            plan['rejected'] += 1
+            continue
+        apply_variant(job, chosen)
+        if variant in (VARIANT_AUTO, VARIANT_SMALLEST):
+            # 可供降级的更小版本（大小已知且符合单任务预算）
+            smaller = [v for v in fitting_variants(variants, max_bytes, max_kbps, codec)
+                       if v['bytes'] is not None and chosen['bytes'] is not None and v['bytes'] < chosen['bytes']]
+            options[id(job)] = sorted(smaller, key=lambda v: v['bytes'], reverse=True)
+
+    planned = [job for job in jobs if job.get('variant') and not job.get('error')]
+    if budget is not None:
+        _fit_budget(planned, options, budget, plan)
+
+    for job in planned:
+        if job.get('error'):
+            continue
+        plan['planned'] += 1
+        plan['formats'][job['variant']] = plan['formats'].get(job['variant'], 0) + 1
+        if job.get('estimated_bytes') is None:
+            plan['unknown'] += 1
+        else:
+            plan['bytes'] += job['estimated_bytes']
+    return plan
+
+
+def _fit_budget(planned, options, budget, plan):
+    """整批超出预算时，每次把当前最大的任务换成它的下一个更小版本；无法再降级时从末尾放弃任务"""
+    total = sum(job['estimated_bytes'] or 0 for job in planned)
+    heap = [(-(job['estimated_bytes'] or 0), index) for index, job in enumerate(planned) if options.get(id(job))]
+    heapq.heapify(heap)
+    downgraded = set()
+    while total > budget and heap:
+        _, index = heapq.heappop(heap)
+        job = planned[index]
+        smaller = options[id(job)].pop(0)
+        total -= job['estimated_bytes'] - smaller['bytes']
+        apply_variant(job, smaller)
+        downgraded.add(index)
+        if options[id(job)]:
+            heapq.heappush(heap, (-job['estimated_bytes'], index))
+    plan['downgraded'] = len(downgraded)
+
+    for job in reversed(planned):
+        if total <= budget:
+            break
+        total -= job['estimated_bytes'] or 0
+        job['error'] = f"超出批次预算 {budget / 1024 / 1024:.0f} MB，未下载"
+        plan['dropped'] += 1
+
+
+def estimate_seconds(nbytes, bandwidth_mbps=DEFAULT_BANDWIDTH_MBPS):
+    """按带宽（MB/s）估算下载耗时"""
+    return nbytes / (bandwidth_mbps * 1024 * 1024) if bandwidth_mbps else None
+
+
+def describe_variant(variant):
+    """版本的单行描述"""
+    size = f"{variant['bytes'] / 1024 / 1024:.2f} MB" if variant['bytes'] else '大小未知'
+    approx = '' if variant['exact'] or not variant['bytes'] else '≈'
+    resolution = f"{variant['width']}x{variant['height']}" if variant['width'] and variant['height'] else '?'
+    kbps = f"{variant['kbps']} kbps" if variant['kbps'] else '? kbps'
+    codec = f" {variant['codec']}" if variant['codec'] else ''
+    return f"{variant['format']:<9} {resolution:>10} {kbps:>10}{codec:<6} {approx}{size}"
+
+
+def print_plan(plan, bandwidth_mbps=DEFAULT_BANDWIDTH_MBPS, budget=None):
+    """打印整批的规划与估算"""
+    print("🧮 下载规划:")
+    formats = ', '.join(f"{name} × {count}" for name, count in sorted(plan['formats'].items()))
+    print(f"   任务: {plan['planned']} 个（{formats or '无'}）")
+    total = plan['bytes']
+    line = f"   预计下载: {total:,} bytes ({total / 1024 / 1024:.2f} MB)"
+    if budget is not None:
+        line += f"，预算 {budget / 1024 / 1024:.0f} MB"
+    print(line)
+    if plan['unknown']:
+        print(f"   ⚠️  {plan['unknown']} 个任务的大小未知，未计入估算")
+    seconds = estimate_seconds(total, bandwidth_mbps)
+    if seconds is not None:
+        print(f"   预计耗时: {seconds:.1f} s（按 {bandwidth_mbps:g} MB/s 带宽）")
+    if plan['downgraded']:
+        print(f"   ⬇️  为满足预算降低了画质: {plan['downgraded']} 个任务")
+    if plan['rejected']:
+        print(f"   ❌ 没有符合条件的版本: {plan['rejected']} 个任务")
+    if plan['dropped']:
+        print(f"   ❌ 超出批次预算而放弃: {plan['dropped']} 个任务")
+    print()
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+监视目录 - 自动解密新下载的视频
+持续监视投放目录（Linux 上使用 inotify，其他平台回退为轮询），发现写入完成的加密视频后，
+与同名的密钥流 / decode_key / API 响应旁路文件配对，交给有界工作线程池解密，并写入输出目录树。
+
+旁路文件（以 video.mp4 为例）:
+    video.ksb / video.keystream.txt   密钥流文件
+    video.key / video.decode_key      内容为 decode_key 的文本文件
+    video.json                        fetch_video_detail API 响应
+
+Author: Evil0ctal
+GitHub: https://github.com/Evil0ctal/WeChat-Channels-Video-File-Decryption
+"""
+import os
+import sys
+import json
+import time
+import queue
+import select
+import struct
+import threading
+import collections
+
+import batch_runner
+from metrics import MetricsRegistry
+from api_response import first_decode_key
+
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+VIDEO_EXTENSIONS = ('.mp4',)
+KEYSTREAM_SIDECARS = ('.ksb', '.keystream.txt')
+DECODE_KEY_SIDECARS = ('.key', '.decode_key')
+RESPONSE_SIDECARS = ('.json',)
+SIDECAR_SUFFIXES = KEYSTREAM_SIDECARS + DECODE_KEY_SIDECARS + RESPONSE_SIDECARS
+
+# 已处理文件记录的上限（长时间运行时避免无限增长）
+_SEEN_LIMIT = 100000
+
+# inotify 常量
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_EVENT = struct.Struct('iIII')
+
+
+def _is_temporary(name):
+    return name.startswith('.') or name.endswith(('.part', '.tmp', '.crdownload', '.download'))
+
+
+def _is_within(path, directory):
+    if not directory:
+        return False
+    directory = os.path.abspath(directory)
+    return os.path.commonpath([os.path.abspath(path), directory]) == directory
+
+
+def _sidecar_stem(video_path):
+    return os.path.splitext(video_path)[0]
+
+
+def _is_settled(path, min_age):
+    try:
+        return time.time() - os.path.getmtime(path) >= min_age
+    except OSError:
+        return False
+
+
+def find_sidecar(video_path, min_age=0.0):
+    """
+    查找视频对应的密钥流来源
+
+    Args:
+        video_path: 视频路径
+        min_age: 旁路文件至少静止多少秒才使用（避免读到尚未写完的文件）
+
+    Returns:
+        dict: keystream_file / decode_key 之一，以及 sidecars（旁路文件列表）；未找到返回 None
+    """
+    stem = _sidecar_stem(video_path)
+    for suffix in KEYSTREAM_SIDECARS:
+        path = stem + suffix
+        if _is_settled(path, min_age):
+            return {'keystream_file': path, 'sidecars': [path]}
+    for suffix in DECODE_KEY_SIDECARS:
+        path = stem + suffix
+        if _is_settled(path, min_age):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    decode_key = f.read().strip()
+            except (OSError, UnicodeDecodeError, ValueError):
+                continue  # 已被删除或内容无效，跳过这个旁路文件
+            if decode_key:
+                return {'decode_key': decode_key, 'sidecars': [path]}
+    for suffix in RESPONSE_SIDECARS:
+        path = stem + suffix
+        if _is_settled(path, min_age):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    decode_key = first_decode_key(json.load(f))
+            except (OSError, ValueError):
+                continue  # 可能仍在写入，稍后重试
+            if decode_key:
+                return {'decode_key': str(decode_key), 'sidecars': [path]}
+    return None
+
+
+class InotifyWatcher:
+    """基于 inotify 的目录监视（Linux，通过 ctypes 调用 libc，无额外依赖）"""
+
+    MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+    def __init__(self, root, exclude=()):
+        libc_name = ctypes.util.find_library('c') if ctypes else None
+        if not libc_name:
+            raise OSError("无法加载 libc")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("当前系统不支持 inotify")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.root = root
+        self.exclude = exclude
+        self._dirs = {}
+        self._add_tree(root)
+
+    def _add_tree(self, directory):
+        for dirpath, dirnames, _ in os.walk(directory):
+            dirnames[:] = [d for d in dirnames
+                           if not any(_is_within(os.path.join(dirpath, d), e) for e in self.exclude)]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), self.MASK)
+            if wd >= 0:
+                self._dirs[wd] = dirpath
+
+    def events(self, timeout):
+        """
+        等待事件
+
+        Returns:
+            tuple: (写入完成的文件路径列表, 是否需要全量重扫)
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return [], False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return [], False
+
+        paths, rescan = [], False
+        offset = 0
+        while offset + _IN_EVENT.size <= len(data):
+            wd, mask, _cookie, length = _IN_EVENT.unpack_from(data, offset)
+            offset += _IN_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and not any(_is_within(path, e) for e in self.exclude):
+                    self._add_tree(path)
+                    rescan = True  # 新目录中可能已有文件
+            elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                paths.append(path)
+        return paths, rescan
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """轮询方式的目录监视：文件大小和修改时间在 settle_seconds 内不再变化即视为写入完成"""
+
+    def __init__(self, root, exclude=(), settle_seconds=2.0):
+        self.root = root
+        self.exclude = exclude
+        self.settle_seconds = settle_seconds
+        self._state = {}
+
+    def events(self, timeout):
+        time.sleep(timeout)
+        now = time.monotonic()
+        current = {}
+        ready = []
+        for path in iter_files(self.root, self.exclude):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            previous = self._state.get(path)
+            if previous and previous[0] == signature:
+                since, reported = previous[1], previous[2]
+                if not reported and now - since >= self.settle_seconds:
+                    ready.append(path)
+                    reported = True
+                current[path] = (signature, since, reported)
+            else:
+                current[path] = (signature, now, False)
+        self._state = current
+        return ready, False
+
+    def close(self):
+        pass
+
+
+def iter_files(root, exclude=()):
+    """遍历目录下的所有普通文件（跳过排除目录）"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not any(_is_within(os.path.join(dirpath, d), e) for e in exclude)]
+        for name in filenames:
+            yield os.path.join(dirpath, name)
+
+
+def create_watcher(root, exclude=(), backend='auto', settle_seconds=2.0):
+    """
+    创建目录监视器
+
+    Args:
+        backend: 'auto' / 'inotify' / 'poll'
+
+    Returns:
+        InotifyWatcher 或 PollingWatcher
+    """
+    if backend in ('auto', 'inotify') and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root, exclude)
+        except (OSError, AttributeError):
+            if backend == 'inotify':
+                raise
+    elif backend == 'inotify':
+        raise OSError("当前系统不支持 inotify")
+    return PollingWatcher(root, exclude, settle_seconds)
+
+
+class WatchDaemon:
+    """监视目录并自动解密的守护进程"""
+
+    def __init__(self, watch_dir, output_dir, workers=2, queue_size=16, archive_dir=None,
+                 defaults=None, backend='auto', poll_interval=1.0, settle_seconds=2.0,
+                 pending_timeout=600.0, chunk_size=None, verbose=True, metrics_format=None, metrics_file=None):
+        """
+        Args:
+            watch_dir: 监视的投放目录
+            output_dir: 解密结果的输出目录（保留相对目录结构）
+            workers: 解密工作线程数
+            queue_size: 待解密队列长度上限（队列满时监视线程阻塞，形成背压）
+            archive_dir: 处理成功后将加密文件及旁路文件移动到该目录（可选）
+            defaults: 没有旁路文件时使用的默认密钥流来源
+            backend: 监视方式 'auto' / 'inotify' / 'poll'
+            poll_interval: 事件等待 / 轮询间隔（秒）
+            settle_seconds: 轮询模式下判定写入完成所需的静止时间（秒）
+            pending_timeout: 视频等待旁路文件的最长时间（秒）
+            chunk_size: 复制未加密部分时的块大小
+            verbose: 是否输出日志
+            metrics_format: 各阶段耗时直方图的输出格式 'json' / 'prometheus'（可选）
+            metrics_file: 指标文件路径，每完成一个任务原子更新一次（可供 textfile 收集器读取）；
+                          未指定时在退出时输出到标准输出
+        """
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.archive_dir = os.path.abspath(archive_dir) if archive_dir else None
+        self.workers = max(1, workers)
+        self.defaults = defaults or {}
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.pending_timeout = pending_timeout
+        self.chunk_size = chunk_size or batch_runner.core.DEFAULT_CHUNK_SIZE
+        self.verbose = verbose
+
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._stop = threading.Event()
+        self._pending = {}
+        self._seen = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'queued': 0, 'succeeded': 0, 'failed': 0, 'bytes': 0}
+        self.metrics = MetricsRegistry()
+        self.metrics_format = metrics_format
+        self.metrics_file = metrics_file
+
+    def log(self, message):
+        if self.verbose:
+            print(message, flush=True)
+
+    def stop(self):
+        """请求停止（可在其他线程或信号处理函数中调用）"""
+        self._stop.set()
+
+    def output_path(self, video_path):
+        """视频在输出目录树中的路径"""
+        return os.path.join(self.output_dir, os.path.relpath(video_path, self.watch_dir))
+
+    def _signature(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _already_done(self, video_path, signature):
+        if self._seen.get(video_path) == signature:
+            return True
+        output = self.output_path(video_path)
+        try:
+            return os.path.getmtime(output) >= os.path.getmtime(video_path)
+        except OSError:
+            return False
+
+    def handle_path(self, path):
+        """处理一个写入完成的文件（视频或旁路文件）"""
+        name = os.path.basename(path)
+        if _is_temporary(name):
+            return
+        lower = name.lower()
+        if lower.endswith(SIDECAR_SUFFIXES):
+            # 旁路文件晚于视频到达：重新检查等待中的同名视频
+            stem = path[:len(path) - len(next(s for s in SIDECAR_SUFFIXES if lower.endswith(s)))]
+            for video in [v for v in self._pending if _sidecar_stem(v) == stem]:
+                self._try_enqueue(video, sidecar_min_age=0.0)
+        elif lower.endswith(VIDEO_EXTENSIONS):
+            self._try_enqueue(path)
+
+    def _try_enqueue(self, video_path, sidecar_min_age=None):
+        signature = self._signature(video_path)
+        if signature is None:
+            self._pending.pop(video_path, None)
+            return
+        if self._already_done(video_path, signature):
+            self._pending.pop(video_path, None)
+            return
+
+        # 旁路文件只有在收到写入完成事件，或已静止 settle_seconds 后才使用
+        if sidecar_min_age is None:
+            sidecar_min_age = self.settle_seconds
+        source = find_sidecar(video_path, sidecar_min_age)
+        if source is None and any(self.defaults.get(f) for f in batch_runner.KEYSTREAM_FIELDS):
+            source = {f: self.defaults[f] for f in batch_runner.KEYSTREAM_FIELDS if self.defaults.get(f)}
+            source['sidecars'] = []
+        if source is None:
+            if video_path not in self._pending:
+                self._pending[video_path] = time.monotonic()
+                self.log(f"⏳ 等待密钥流旁路文件: {video_path}")
+            return
+
+        self._pending.pop(video_path, None)
+        self._remember(video_path, signature)
+        job = dict(source, input=video_path, output=self.output_path(video_path))
+        self.stats['queued'] += 1
+        # 队列已满时在此阻塞，直到有工作线程空闲（背压）
+        while not self._stop.is_set():
+            try:
+                self._queue.put(job, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+
+    def _remember(self, video_path, signature):
+        self._seen[video_path] = signature
+        self._seen.move_to_end(video_path)
+        while len(self._seen) > _SEEN_LIMIT:
+            self._seen.popitem(last=False)
+
+    def _expire_pending(self):
+        now = time.monotonic()
+        for video, since in list(self._pending.items()):
+            if os.path.exists(video) and now - since < self.pending_timeout:
+                self._try_enqueue(video)
+                continue
+            if now - since >= self.pending_timeout:
+                self.log(f"⚠️  超时未找到密钥流，跳过: {video}")
+            self._pending.pop(video, None)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            try:
+                self._process(job)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job):
+        final_output = job['output']
+        job = dict(job, output=f"{final_output}.part")
+        result = batch_runner.run_job(job, self.chunk_size)
+        with self._lock:
+            if result['ok']:
+                os.replace(job['output'], final_output)
+                self.stats['succeeded'] += 1
+                self.stats['bytes'] += result['bytes']
+                self.log(f"✅ {job['input']} → {final_output} "
+                         f"({result['bytes'] / 1024 / 1024:.2f} MB, {result['seconds'] * 1000:.1f} ms)")
+                if self.archive_dir:
+                    self._archive(job['input'], job.get('sidecars', []))
+            else:
+                try:
+                    os.remove(job['output'])
+                except OSError:
+                    pass
+                self.stats['failed'] += 1
+                self.log(f"❌ {job['input']}: {result['error']}")
+            self.metrics.observe(result.get('stages'), result['ok'])
+            if self.metrics_format and self.metrics_file:
+                self._write_metrics()
+
+    def _write_metrics(self):
+        try:
+            self.metrics.write(self.metrics_format, self.metrics_file)
+        except OSError as e:
+            self.log(f"⚠️  无法写入指标文件 {self.metrics_file}: {e}")
+
+    def _archive(self, video_path, sidecars):
+        for path in [video_path] + list(sidecars):
+            target = os.path.join(self.archive_dir, os.path.relpath(path, self.watch_dir))
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(path, target)
+            except OSError as e:
+                self.log(f"⚠️  归档失败 {path}: {e}")
+
+    def scan_existing(self):
+        """处理启动前已存在的文件"""
+        for path in iter_files(self.watch_dir, self._excluded()):
+            if self._stop.is_set():
+                break
+            self.handle_path(path)
+
+    def _excluded(self):
+        return tuple(d for d in (self.output_dir, self.archive_dir) if d)
+
+    def run(self):
+        """启动监视（阻塞，直到调用 stop() 或收到 KeyboardInterrupt）"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        watcher = create_watcher(self.watch_dir, self._excluded(), self.backend, self.settle_seconds)
+        mode = 'inotify' if isinstance(watcher, InotifyWatcher) else '轮询'
+        self.log(f"👀 监视目录: {self.watch_dir} ({mode}, {self.workers} 个工作线程, 队列上限 {self._queue.maxsize})")
+        self.log(f"📂 输出目录: {self.output_dir}")
+
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        try:
+            if isinstance(watcher, InotifyWatcher):
+                self.scan_existing()
+            while not self._stop.is_set():
+                paths, rescan = watcher.events(self.poll_interval)
+                if rescan:
+                    self.scan_existing()
+                for path in paths:
+                    self.handle_path(path)
+                if self._pending:
+                    self._expire_pending()
+        finally:
+            watcher.close()
+            for _ in threads:
+                self._queue.put(None)
+            for t in threads:
+                t.join()
+            self.log(f"📊 已解密 {self.stats['succeeded']} 个，失败 {self.stats['failed']} 个，"
+                     f"共 {self.stats['bytes'] / 1024 / 1024:.2f} MB")
+            if self.metrics_format:
+                self._write_metrics()
+        return self.stats